@@ -0,0 +1,187 @@
+"""Command line tools.
+
+    python -m app.cli ingest <directory> [--collection NAME] [--recursive] [--reindex] [--embedding-backend SPEC]
+    python -m app.cli migrate-collection <name> [--dimensions N] [--quantization none|scalar|binary] [--profile NAME]
+    python -m app.cli migrate-to-shared [NAME ...] [--delete-source]
+"""
+import argparse
+import asyncio
+from pathlib import Path
+from typing import List
+
+from app.config import FILE_STORAGE_DIR, MAX_FILE_SIZE
+from app.services.bulk_ingestion import ingest_stored_files
+from app.services.collection_migration import migrate_collection, migrate_to_shared
+from app.services.dbservices import DBService
+from app.services.indexing_service import IndexingService, BULK_INDEXED, BULK_DUPLICATE
+from app.utils.file_storage import copy_to_storage, unique_storage_path
+from app.utils.pdf_parser import shutdown_parse_executor
+from app.utils.qdrant_client import init_qdrant_client, close_qdrant_client, get_qdrant_client
+from app.utils.vector_config import COLLECTION_PROFILES, QUANTIZATION_KINDS
+
+
+def find_pdfs(directory: Path, recursive: bool = False) -> List[Path]:
+    """PDF files in a directory, sorted by path"""
+    pattern = "**/*" if recursive else "*"
+    return sorted(
+        path for path in directory.glob(pattern)
+        if path.is_file() and path.suffix.lower() == ".pdf"
+    )
+
+
+async def ingest(args) -> int:
+    directory = Path(args.directory)
+    if not directory.is_dir():
+        print(f"Not a directory: {directory}")
+        return 2
+
+    pdfs = find_pdfs(directory, args.recursive)
+    if not pdfs:
+        print(f"No PDF files found in {directory}")
+        return 1
+
+    # Copy into file storage, like uploads, so documents do not depend on the source directory
+    FILE_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+    stored, skipped = [], []
+    for pdf in pdfs:
+        size = pdf.stat().st_size
+        if size == 0 or size > MAX_FILE_SIZE:
+            skipped.append(pdf)
+            continue
+        destination = unique_storage_path(pdf.name)
+        size, content_hash = await copy_to_storage(pdf, destination)
+        stored.append((destination, pdf.name, size, content_hash))
+
+    for pdf in skipped:
+        print(f"SKIPPED  {pdf.name}: empty or larger than {MAX_FILE_SIZE // (1024 * 1024)} MB")
+
+    db_service = DBService()
+    await db_service.init_db()
+    await init_qdrant_client()
+    try:
+        results, summary = await ingest_stored_files(
+            IndexingService(),
+            db_service,
+            stored,
+            collection_name=args.collection,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            reindex=args.reindex,
+            embedding_backend=args.embedding_backend,
+        )
+    finally:
+        await db_service.close()
+        await close_qdrant_client()
+        shutdown_parse_executor()
+
+    for result in results:
+        if result.status == BULK_INDEXED:
+            print(f"INDEXED  {result.filename} -> {result.collection_name} "
+                  f"({result.document_count} pages, {result.chunk_count} chunks, id {result.document_id})")
+        elif result.status == BULK_DUPLICATE:
+            print(f"SKIPPED  {result.filename}: already indexed in {result.collection_name} (id {result.document_id})")
+        else:
+            print(f"FAILED   {result.filename}: {result.error}")
+
+    print(
+        f"\n{summary['indexed_files']}/{summary['total_files']} files "
+        f"({summary['duplicate_files']} duplicates), {summary['total_pages']} pages, "
+        f"{summary['total_chunks']} chunks in {summary['elapsed_seconds']:.1f}s "
+        f"({summary['files_per_second']:.2f} files/s, {summary['chunks_per_second']:.1f} chunks/s)"
+    )
+    return 0 if summary["failed_files"] == 0 and not skipped else 1
+
+
+async def migrate(args) -> int:
+    if args.dimensions is None and args.quantization is None and args.profile is None:
+        print("Nothing to do: pass --dimensions, --quantization and/or --profile")
+        return 2
+
+    await init_qdrant_client()
+    try:
+        result = await migrate_collection(
+            get_qdrant_client(), args.name,
+            dimensions=args.dimensions, quantization=args.quantization, profile=args.profile,
+        )
+    except ValueError as e:
+        print(f"FAILED   {args.name}: {e}")
+        return 1
+    finally:
+        await close_qdrant_client()
+
+    before, after = result["before"], result["after"]
+    print(
+        f"MIGRATED {args.name}: {before.vector_size} -> {after.vector_size} dimensions, "
+        f"quantization {before.quantization} -> {after.quantization} ({result['points']} points)"
+    )
+    return 0
+
+
+async def migrate_shared(args) -> int:
+    await init_qdrant_client()
+    try:
+        migrated = await migrate_to_shared(IndexingService(), args.names or None, delete_source=args.delete_source)
+    except ValueError as e:
+        print(f"FAILED   {e}")
+        return 1
+    finally:
+        await close_qdrant_client()
+
+    verb = "MOVED   " if args.delete_source else "COPIED  "
+    for result in migrated:
+        print(f"{verb} {result['collection_name']} -> {result['shared_collection']} ({result['points']} points)")
+    if args.delete_source:
+        print(f"\n{len(migrated)} collections moved; set COLLECTION_MODE=shared to serve them from the shared layout")
+    else:
+        print(
+            f"\n{len(migrated)} collections copied; their per-document collections keep serving them. "
+            "Run again with --delete-source to cut over"
+        )
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Index every PDF in a directory")
+    ingest_parser.add_argument("directory")
+    ingest_parser.add_argument("--collection", default=None, help="Collection for all files (default: one per file)")
+    ingest_parser.add_argument("--recursive", action="store_true", help="Include subdirectories")
+    ingest_parser.add_argument("--reindex", action="store_true", help="Index files already in the collection again")
+    ingest_parser.add_argument("--chunk-size", type=int, default=1000)
+    ingest_parser.add_argument("--chunk-overlap", type=int, default=400)
+    ingest_parser.add_argument(
+        "--embedding-backend", default=None,
+        help="Embeddings for new collections, e.g. onnx:bge-small-en-v1.5 (default: EMBEDDING_BACKEND)"
+    )
+    ingest_parser.set_defaults(handler=ingest)
+
+    migrate_parser = commands.add_parser(
+        "migrate-collection", help="Reduce a collection's vector size, change its quantization or apply a profile"
+    )
+    migrate_parser.add_argument("name")
+    migrate_parser.add_argument("--dimensions", type=int, default=None, help="New (smaller) vector size")
+    migrate_parser.add_argument("--quantization", choices=QUANTIZATION_KINDS, default=None)
+    migrate_parser.add_argument(
+        "--profile", choices=list(COLLECTION_PROFILES), default=None,
+        help="HNSW, storage and payload-index profile to apply"
+    )
+    migrate_parser.set_defaults(handler=migrate)
+
+    shared_parser = commands.add_parser(
+        "migrate-to-shared", help="Move per-document collections into the shared multi-tenant collections"
+    )
+    shared_parser.add_argument("names", nargs="*", help="Collections to move (default: all per-document collections)")
+    shared_parser.add_argument(
+        "--delete-source", action="store_true",
+        help="Cut over: copy again, then delete the per-document collections (kept by default)"
+    )
+    shared_parser.set_defaults(handler=migrate_shared)
+
+    args = parser.parse_args(argv)
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,11 +10,129 @@ BASE_DIR = Path(__file__).parent.parent
 UPLOAD_DIR = BASE_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Uploaded PDFs are streamed straight to this directory and parsed from there
+FILE_STORAGE_DIR = Path(os.getenv("FILE_STORAGE_DIR", "/filestorage/ragchat"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB read/write chunks while streaming uploads
+
 # API Configuration
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE_MB", "50")) * 1024 * 1024  # 50 MB
+# Whole bulk upload request; larger requests are refused from their Content-Length before any is read
+MAX_BULK_UPLOAD_SIZE = int(os.getenv("MAX_BULK_UPLOAD_SIZE_MB", "1024")) * 1024 * 1024  # 1 GB
+UPLOAD_OVERHEAD_BYTES = 64 * 1024  # multipart framing allowed on top of a single upload's file
 QDRANT_URL = os.getenv("QDRANT_URL")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Qdrant connection pool configuration
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))  # seconds
+QDRANT_MAX_CONNECTIONS = int(os.getenv("QDRANT_MAX_CONNECTIONS", "100"))
+QDRANT_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("QDRANT_MAX_KEEPALIVE_CONNECTIONS", "20"))
+QDRANT_KEEPALIVE_EXPIRY = float(os.getenv("QDRANT_KEEPALIVE_EXPIRY", "30"))  # seconds
+QDRANT_GRPC_KEEPALIVE_MS = int(os.getenv("QDRANT_GRPC_KEEPALIVE_MS", "30000"))
+
+# Query embedding cache configuration
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))  # entries kept in memory
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))  # seconds
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # optional SQLite file for the on-disk tier
+# On-disk tier limits, applied oldest first when the store opens and as it grows (0: unlimited)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")) or None
+EMBEDDING_CACHE_MAX_AGE = float(os.getenv("EMBEDDING_CACHE_MAX_AGE", str(30 * 86400))) or None  # seconds
+
+# Background indexing jobs
+INDEXING_WORKERS = int(os.getenv("INDEXING_WORKERS", "2"))
+INDEXING_QUEUE_SIZE = int(os.getenv("INDEXING_QUEUE_SIZE", "100"))
+
+# Parallel PDF parsing (page ranges are split across a process pool)
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MIN_PAGES_PER_SHARD = int(os.getenv("PDF_MIN_PAGES_PER_SHARD", "16"))
+
+# Bulk ingestion: files parsed concurrently, and chunks (across files) embedded per window
+BULK_MAX_PARALLEL_FILES = int(os.getenv("BULK_MAX_PARALLEL_FILES", "8"))
+BULK_EMBED_WINDOW_CHUNKS = int(os.getenv("BULK_EMBED_WINDOW_CHUNKS", "2048"))
+
+# Content-addressed chunk embedding store used by indexing
+CHUNK_EMBEDDING_STORE_PATH = Path(
+    os.getenv("CHUNK_EMBEDDING_STORE_PATH", str(BASE_DIR / "cache" / "chunk_embeddings.sqlite3"))
+)
+# Limits of the chunk store, as for the query tier (a 3072-dimension vector takes 12 KB; 0: unlimited)
+CHUNK_EMBEDDING_STORE_MAX_ENTRIES = int(os.getenv("CHUNK_EMBEDDING_STORE_MAX_ENTRIES", "500000")) or None
+CHUNK_EMBEDDING_STORE_MAX_AGE = float(os.getenv("CHUNK_EMBEDDING_STORE_MAX_AGE", "0")) or None  # seconds
+
+# Embedding scheduler shared by all indexing jobs (set to your OpenAI account limits)
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "100000"))
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "512"))  # inputs per request
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+
+# Embedding backend for new collections: "openai:<model>" or "onnx:<model>", a local CPU model exported
+# to LOCAL_EMBEDDING_MODELS_DIR/<model>/ (model.onnx and tokenizer.json). Every point records the backend
+# it was embedded with, so a collection is always queried and extended with the same embeddings.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai:text-embedding-3-large")
+LOCAL_EMBEDDING_MODELS_DIR = Path(os.getenv("LOCAL_EMBEDDING_MODELS_DIR", str(BASE_DIR / "models")))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))  # texts per ONNX run
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "2"))  # batches run concurrently
+LOCAL_EMBEDDING_MAX_LENGTH = int(os.getenv("LOCAL_EMBEDDING_MAX_LENGTH", "512"))  # tokens per text
+
+# Collection memory: new collections store the first EMBEDDING_DIMENSIONS components of each
+# text-embedding-3-large vector (0 = all 3072) and can quantize them ("none", "scalar", "binary");
+# quantized collections keep the original vectors on disk and rescore with them at query time.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0"))
+# Seconds the in-process collection catalog (names, point counts, vector configs) is served before a
+# background refresh; indexing and deletion invalidate it immediately
+COLLECTION_CATALOG_TTL = float(os.getenv("COLLECTION_CATALOG_TTL", "30"))
+
+# HNSW, storage and payload-index profile for new collections: "default", "small-fast" or "large-on-disk"
+# (see app.utils.vector_config.COLLECTION_PROFILES)
+COLLECTION_PROFILE = os.getenv("COLLECTION_PROFILE", "default")
+
+# Collection layout: "per-document" gives every logical collection its own Qdrant collection;
+# "shared" stores logical collections as tenants (metadata.tenant) of SHARED_COLLECTION_COUNT
+# shared Qdrant collections named SHARED_COLLECTION_NAME[_<n>]
+COLLECTION_MODE = os.getenv("COLLECTION_MODE", "per-document")
+SHARED_COLLECTION_NAME = os.getenv("SHARED_COLLECTION_NAME", "shared_documents")
+SHARED_COLLECTION_COUNT = int(os.getenv("SHARED_COLLECTION_COUNT", "1"))
+
+# Retrieval: dense (embeddings), sparse (BM25 terms) or hybrid (both, fused with RRF)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", "20"))  # candidates per branch before fusion
+SPARSE_BM25_K1 = float(os.getenv("SPARSE_BM25_K1", "1.2"))
+SPARSE_BM25_B = float(os.getenv("SPARSE_BM25_B", "0.75"))
+SPARSE_AVG_DOC_TOKENS = float(os.getenv("SPARSE_AVG_DOC_TOKENS", "180"))  # ~1000-character chunks
+
+# Post-retrieval stage: over-fetch candidates, rerank locally within a budget, diversify with MMR
+RERANKER = os.getenv("RERANKER", "")  # "", "lexical" or "cross-encoder:<model name>"
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+MMR_DIVERSITY = float(os.getenv("MMR_DIVERSITY", "0.3"))  # 0 = relevance order only
+
+# Cross-collection chat: searches fan out concurrently; a collection that does not answer within
+# MULTI_SEARCH_TIMEOUT_MS is left out of the merged results
+MAX_SEARCH_COLLECTIONS = int(os.getenv("MAX_SEARCH_COLLECTIONS", "20"))
+MULTI_SEARCH_TIMEOUT_MS = float(os.getenv("MULTI_SEARCH_TIMEOUT_MS", "2000"))
+
+# Prompt context: retrieved chunks are merged into page spans and packed into a token budget per
+# chat model; CONTEXT_TOKEN_BUDGETS overrides it for given models ("gpt-4.1=8000,gpt-4.1-nano=3000")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_TOKEN_BUDGETS = os.getenv("CONTEXT_TOKEN_BUDGETS", "")
+
+# Sample questions: generated once per document in the background after indexing and stored on its
+# record; GET /chat/{collection}/sample serves them without calling OpenAI
+SAMPLE_QUESTION_COUNT = int(os.getenv("SAMPLE_QUESTION_COUNT", "5"))
+# A failed generation is retried on a read after this many seconds, doubling per failure up to the max
+SAMPLE_QUESTION_RETRY_BACKOFF = float(os.getenv("SAMPLE_QUESTION_RETRY_BACKOFF", "60"))
+SAMPLE_QUESTION_RETRY_MAX = float(os.getenv("SAMPLE_QUESTION_RETRY_MAX", "3600"))
+
+# Semantic answer cache configuration
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # seconds
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))  # per collection
+
 # Validate environment variables
 if not QDRANT_URL:
     raise ValueError("QDRANT_URL environment variable is required")
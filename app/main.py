@@ -7,14 +7,24 @@ import logging
 from app.routers import chat_router, indexing_router, filescrud_router
 from app.utils.logger import logger
 from app.services.dbservices import DBService
+from app.services.job_service import IndexingJobManager
+from app.services.sample_questions import SampleQuestionService
+from app.utils.qdrant_client import init_qdrant_client, close_qdrant_client
+from app.utils.pdf_parser import shutdown_parse_executor
 
 # Global DB service instance
 db_service = None
 
+# Global background indexing job manager
+job_manager = None
+
+# Global sample question service (questions are generated after indexing)
+sample_question_service = None
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global db_service
+    global db_service, job_manager, sample_question_service
     
     # Startup
     logger.info("🚀 Starting RagChat API server...")
@@ -26,6 +36,16 @@ async def lifespan(app: FastAPI):
         connection_ok = await db_service.test_connection()
         if not connection_ok:
             raise Exception("Database connection test failed")
+
+        # One pooled Qdrant client shared by all routers and services
+        await init_qdrant_client()
+
+        # Background indexing workers (resumes jobs interrupted by a restart)
+        sample_question_service = SampleQuestionService(db_service, chat_router.chat_service)
+        job_manager = IndexingJobManager(
+            db_service, indexing_router.indexing_service, sample_questions=sample_question_service
+        )
+        await job_manager.start()
             
         logger.info("✅ Application startup completed - Database initialized and tested")
         
@@ -41,8 +61,14 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🔄 Application shutting down...")
+    if job_manager:
+        await job_manager.stop()
+    if sample_question_service:
+        await sample_question_service.stop()
     if db_service:
         await db_service.close()
+    await close_qdrant_client()
+    shutdown_parse_executor()
     logger.info("✅ Application shutdown completed")
 
 
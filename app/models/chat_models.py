@@ -1,21 +1,61 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional,Union
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional,Union
+from app.config import RETRIEVAL_MODE, MMR_DIVERSITY, MAX_SEARCH_COLLECTIONS
 
 class ChatRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=1000, description="User's question")
-    collection_name: str = Field(..., description="Name of the PDF collection to search")
+    collection_name: Optional[str] = Field(default=None, description="Name of the PDF collection to search")
+    collection_names: Optional[List[str]] = Field(
+        default=None, min_length=1, max_length=MAX_SEARCH_COLLECTIONS,
+        description="Several collections to answer from together (instead of collection_name)"
+    )
+    collection_prefix: Optional[str] = Field(
+        default=None, min_length=1,
+        description="Answer from every collection whose name starts with this prefix, e.g. one folder's files"
+    )
     max_results: int = Field(default=4, ge=1, le=10, description="Maximum number of search results")
     model: str = Field(default="gpt-4.1", description="OpenAI model to use")
+    retrieval_mode: Literal["dense", "sparse", "hybrid"] = Field(
+        default=RETRIEVAL_MODE,
+        description="dense (embeddings), sparse (exact terms such as part numbers) or hybrid (both, rank-fused)"
+    )
+    candidates: Optional[int] = Field(
+        default=None, ge=1, le=100,
+        description="Candidates fetched before reranking and diversification (default: server setting)"
+    )
+    diversity: float = Field(
+        default=MMR_DIVERSITY, ge=0.0, le=1.0,
+        description="MMR diversity: 0 keeps relevance order, higher values skip near-duplicate chunks"
+    )
+    hnsw_ef: Optional[int] = Field(
+        default=None, ge=1, le=1024,
+        description="HNSW search width for dense retrieval: higher improves recall at some latency (default: Qdrant's)"
+    )
+
+    @model_validator(mode="after")
+    def check_one_collection_selector(self):
+        selectors = [self.collection_name, self.collection_names, self.collection_prefix]
+        if sum(selector is not None for selector in selectors) != 1:
+            raise ValueError("Provide exactly one of collection_name, collection_names or collection_prefix")
+        return self
 
 class SearchResult(BaseModel):
     page_content: str
     page_number: Optional[Union[int, str]] = None
     source: Optional[str] = None
     score: Optional[float] = None
+    collection_name: Optional[str] = None
+    document: Optional[str] = None
 
 class ChatResponse(BaseModel):
     answer: str
     query: str
     collection_name: str
+    collection_names: List[str] = Field(default_factory=list, description="Collections the answer was drawn from")
     search_results: List[SearchResult]
     model_used: str
+    cached: bool = Field(default=False, description="Whether the answer was served from the semantic cache")
+    context_tokens: Optional[int] = Field(default=None, description="Prompt context tokens sent to the model")
+    context_tokens_saved: Optional[int] = Field(
+        default=None, description="Tokens saved by merging overlapping chunks and fitting the context budget"
+    )
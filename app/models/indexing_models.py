@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 class UploadResponse(BaseModel):
     message: str
@@ -13,3 +14,54 @@ class CollectionInfo(BaseModel):
 
 class CollectionsResponse(BaseModel):
     collections: List[CollectionInfo]
+
+class JobResponse(BaseModel):
+    message: str
+    job_id: Optional[str] = None
+    status: str
+    collection_name: str
+    filename: str
+    document_id: Optional[str] = None
+
+class BulkFileResult(BaseModel):
+    filename: str
+    status: str
+    collection_name: str
+    document_id: Optional[str] = None
+    document_count: int = 0
+    chunk_count: int = 0
+    error: Optional[str] = None
+
+class BulkUploadResponse(BaseModel):
+    message: str
+    results: List[BulkFileResult]
+    total_files: int
+    indexed_files: int
+    duplicate_files: int
+    failed_files: int
+    total_pages: int
+    total_chunks: int
+    elapsed_seconds: float
+    files_per_second: float
+    chunks_per_second: float
+
+class JobStatusResponse(BaseModel):
+    id: str
+    status: str
+    stage: str
+    collection_name: str
+    filename: str
+    pages_parsed: int
+    total_chunks: int
+    chunks_embedded: int
+    chunks_upserted: int
+    attempts: int
+    document_id: Optional[str] = None
+    kind: Optional[str] = None  # "bulk" for bulk uploads
+    bulk: Optional[BulkUploadResponse] = None  # per-file results once a bulk job has finished
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
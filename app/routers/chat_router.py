@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException
-from app.models.chat_models import ChatRequest, ChatResponse
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.config import MAX_SEARCH_COLLECTIONS
+from app.models.chat_models import ChatRequest, ChatResponse, SearchResult
 from app.services.chat_service import ChatService
+from app.services.sample_questions import SampleQuestionService, current_sample_questions
+from app.utils.collection_catalog import collection_catalog
 from app.utils.qdrant_client import get_qdrant_client
 from app.utils.logger import logger
+from app.utils.semantic_cache import answer_cache, collections_key
+from qdrant_client import AsyncQdrantClient
+import asyncio
+import json
 
 router = APIRouter(
     prefix="/chat",
@@ -11,26 +20,71 @@ router = APIRouter(
 
 chat_service = ChatService()
 
-@router.post("", response_model=ChatResponse)
-async def chat_with_pdf(request: ChatRequest):
-    """Chat with a specific PDF collection"""
-    try:
-        # Check if collection exists
-        client = get_qdrant_client()
-        try:
-            client.get_collection(request.collection_name)
-        except Exception:
+
+async def get_sample_question_service() -> SampleQuestionService:
+    """Get the global sample question service"""
+    sample_questions = current_sample_questions()
+    if sample_questions is None:
+        raise HTTPException(status_code=503, detail="Sample question service not initialized")
+    return sample_questions
+
+
+def format_sse(event: str, data) -> str:
+    """Format a single Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def resolve_collections(client: AsyncQdrantClient, request: ChatRequest) -> List[str]:
+    """Collections a chat request answers from; unknown names are a 404"""
+    if request.collection_prefix is not None:
+        names = sorted(
+            collection["name"] for collection in await collection_catalog(client).list()
+            if collection["name"].startswith(request.collection_prefix)
+        )
+        if not names:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No collections found with prefix '{request.collection_prefix}'"
+            )
+        if len(names) > MAX_SEARCH_COLLECTIONS:
             raise HTTPException(
-                status_code=404, 
-                detail=f"Collection '{request.collection_name}' not found"
+                status_code=400,
+                detail=f"Prefix '{request.collection_prefix}' matches {len(names)} collections; "
+                       f"at most {MAX_SEARCH_COLLECTIONS} can be searched together"
             )
+        return names
+
+    names = [request.collection_name] if request.collection_name is not None else list(dict.fromkeys(request.collection_names))
+    catalog = collection_catalog(client)
+    exists = await asyncio.gather(*(catalog.exists(name) for name in names))
+    missing = [name for name, found in zip(names, exists) if not found]
+    if missing:
+        raise HTTPException(
+            status_code=404, 
+            detail=", ".join(f"Collection '{name}' not found" for name in missing)
+        )
+    return names
+
+
+@router.post("", response_model=ChatResponse)
+async def chat_with_pdf(
+    request: ChatRequest,
+    client: AsyncQdrantClient = Depends(get_qdrant_client)
+):
+    """Chat with a PDF collection, or with several at once (one answer citing each source document)"""
+    try:
+        collection_names = await resolve_collections(client, request)
 
         # Get answer from service
-        answer, search_results = await chat_service.get_answer(
+        answer, search_results, cached, context = await chat_service.get_answer(
             query=request.query,
-            collection_name=request.collection_name,
+            collection_name=collection_names,
             max_results=request.max_results,
-            model=request.model
+            model=request.model,
+            retrieval_mode=request.retrieval_mode,
+            candidates=request.candidates,
+            diversity=request.diversity,
+            hnsw_ef=request.hnsw_ef
         )
 
         if not answer:
@@ -42,9 +96,13 @@ async def chat_with_pdf(request: ChatRequest):
         return ChatResponse(
             answer=answer,
             query=request.query,
-            collection_name=request.collection_name,
+            collection_name=", ".join(collection_names),
+            collection_names=collection_names,
             search_results=search_results,
-            model_used=request.model
+            model_used=request.model,
+            cached=cached,
+            context_tokens=context.tokens if context else None,
+            context_tokens_saved=context.tokens_saved if context else None
         )
 
     except HTTPException:
@@ -53,22 +111,119 @@ async def chat_with_pdf(request: ChatRequest):
         logger.error(f"Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/stream")
+async def chat_with_pdf_stream(
+    request: ChatRequest,
+    client: AsyncQdrantClient = Depends(get_qdrant_client)
+):
+    """Chat with a specific PDF collection, streaming the answer as Server-Sent Events"""
+    try:
+        collection_names = await resolve_collections(client, request)
+
+        query_vector = await chat_service.embed_query(request.query)
+        cache_options = chat_service.cache_options(
+            request.retrieval_mode, request.candidates, request.diversity, request.hnsw_ef
+        )
+        cache_key = collections_key(collection_names)
+        cache_generation = answer_cache.generation(cache_key)
+        cached = answer_cache.lookup(
+            cache_key, query_vector, request.model, request.max_results,
+            options=cache_options
+        )
+
+        if cached:
+            search_results, messages, context = cached.search_results, None, None
+        else:
+            # Retrieval happens before the response starts so errors still map to status codes
+            search_results, context = await chat_service.retrieve(
+                query=request.query,
+                collection_name=collection_names,
+                max_results=request.max_results,
+                query_vector=query_vector,
+                retrieval_mode=request.retrieval_mode,
+                candidates=request.candidates,
+                diversity=request.diversity,
+                hnsw_ef=request.hnsw_ef,
+                model=request.model
+            )
+
+            if not search_results:
+                raise HTTPException(
+                    status_code=404,
+                    detail="No relevant information found for this query"
+                )
+
+            messages = chat_service.build_messages(
+                request.query, context.text, cite_documents=len(collection_names) > 1
+            )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat stream error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    async def event_stream():
+        # Send the retrieved context first so the client can render sources immediately
+        yield format_sse("search_results", [
+            SearchResult(**result).model_dump() for result in search_results
+        ])
+
+        if cached:
+            yield format_sse("token", {"token": cached.answer})
+        else:
+            tokens = []
+            try:
+                async for token in chat_service.stream_completion(messages, model=request.model):
+                    tokens.append(token)
+                    yield format_sse("token", {"token": token})
+            except Exception as e:
+                logger.error(f"Chat stream error: {str(e)}")
+                yield format_sse("error", {"detail": f"Internal server error: {str(e)}"})
+                return
+
+            answer_cache.store(
+                cache_key, query_vector, request.model,
+                request.max_results, "".join(tokens), search_results,
+                options=cache_options, generation=cache_generation
+            )
+
+        yield format_sse("done", {
+            "query": request.query,
+            "collection_name": ", ".join(collection_names),
+            "collection_names": collection_names,
+            "model_used": request.model,
+            "cached": cached is not None,
+            "context_tokens": context.tokens if context else None,
+            "context_tokens_saved": context.tokens_saved if context else None
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/{collection_name}/sample")
-async def get_sample_questions(collection_name: str, limit: int = 3):
-    """Get sample questions that can be asked about a collection"""
+async def get_sample_questions(
+    collection_name: str,
+    limit: int = 3,
+    client: AsyncQdrantClient = Depends(get_qdrant_client),
+    sample_questions: SampleQuestionService = Depends(get_sample_question_service)
+):
+    """Get sample questions that can be asked about a collection.
+
+    Questions are generated once per document after indexing and stored on
+    its record, so this is served from memory without calling OpenAI.
+    """
     try:
-        # Check if collection exists
-        client = get_qdrant_client()
-        try:
-            client.get_collection(collection_name)
-        except:
+        # Check if collection exists (served from the collection catalog)
+        if not await collection_catalog(client).exists(collection_name):
             raise HTTPException(
-                status_code=404, 
+                status_code=404,
                 detail=f"Collection '{collection_name}' not found"
             )
-
-        questions = await chat_service.get_sample_questions(collection_name, limit)
-        return {"questions": questions}
+        return {"questions": await sample_questions.get(collection_name, limit)}
 
     except HTTPException:
         raise
@@ -78,3 +233,35 @@ async def get_sample_questions(collection_name: str, limit: int = 3):
             status_code=500, 
             detail=f"Failed to generate sample questions: {str(e)}"
         )
+
+
+@router.post("/{collection_name}/sample/refresh")
+async def refresh_sample_questions(
+    collection_name: str,
+    limit: int = 3,
+    client: AsyncQdrantClient = Depends(get_qdrant_client),
+    sample_questions: SampleQuestionService = Depends(get_sample_question_service)
+):
+    """Regenerate the stored sample questions of every document in a collection"""
+    if not await collection_catalog(client).exists(collection_name):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Collection '{collection_name}' not found"
+        )
+    try:
+        return {"questions": await sample_questions.refresh(collection_name, limit)}
+    except Exception as e:
+        logger.error(f"Error refreshing sample questions: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to refresh sample questions: {str(e)}"
+        )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get hit/miss counters for the chat caches"""
+    return {
+        "embedding_cache": chat_service.embedding_model.stats(),
+        "answer_cache": answer_cache.stats()
+    }
@@ -7,6 +7,7 @@ from sqlalchemy import select
 
 # Import your DBService
 from app.services.dbservices import Document, get_db_service, DBService
+from app.services.sample_questions import current_sample_questions
 
 logger = logging.getLogger(__name__)
 
@@ -30,28 +31,42 @@ class DocumentResponse(BaseModel):
 class DocumentListResponseDto(BaseModel):
     doc_details: List[DocumentResponse]
     TotalRecords: int
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page; None on the last page
     
 # API Endpoints
 
 @router.get("/", response_model=DocumentListResponseDto)
 async def get_all_documents(
-    page_number: int = Query(1, ge=1, description="Page number (starts from 1)"),
+    page_number: int = Query(1, ge=1, description="Page number (starts from 1); ignored when a cursor is given"),
     page_size: int = Query(10, ge=1, le=100, description="Number of documents per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    collection_name: Optional[str] = Query(None, description="Only documents of this collection"),
+    filename_prefix: Optional[str] = Query(None, description="Only documents whose filename starts with this"),
     db_service: DBService = Depends(get_db_service)
 ):
-    """Get all documents with pagination"""
+    """Get documents, newest first, with cursor (keyset) pagination.
+
+    Following next_cursor costs the same on every page; page_number still
+    works but deep pages get slower. TotalRecords may lag recent changes
+    made by other processes by up to DOCUMENT_COUNT_TTL seconds.
+    """
     try:
-        # Calculate offset
-        offset = (page_number - 1) * page_size
-        
-        # Get documents with pagination
-        docs = await db_service.get_all_documents_paginated(limit=page_size, offset=offset)
-        total_count = await db_service.count_all_documents()
+        docs, next_cursor = await db_service.list_documents(
+            limit=page_size,
+            cursor=cursor,
+            offset=(page_number - 1) * page_size,
+            collection_name=collection_name,
+            filename_prefix=filename_prefix,
+        )
+        total_count = await db_service.count_documents(collection_name, filename_prefix)
         
         return DocumentListResponseDto(
             doc_details=[DocumentResponse.from_orm(doc) for doc in docs],
-            TotalRecords=total_count
+            TotalRecords=total_count,
+            next_cursor=next_cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching documents: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching documents: {str(e)}")
@@ -81,10 +96,13 @@ async def delete_document(
 ):
     """Delete a document by ID"""
     try:
-        success = await db_service.delete_document(document_id)
-        if not success:
+        document = await db_service.get_document_by_id(document_id)
+        if document is None or not await db_service.delete_document(document_id):
             raise HTTPException(status_code=404, detail="Document not found")
-        
+
+        sample_questions = current_sample_questions()
+        if sample_questions:
+            sample_questions.invalidate(document.collection_name)
         return {"message": f"Document {document_id} deleted successfully"}
     except HTTPException:
         raise
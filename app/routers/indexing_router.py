@@ -1,14 +1,31 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse
+import json
+from pathlib import Path
 from typing import Optional
-from app.models.indexing_models import UploadResponse, CollectionsResponse
-from app.services.dbservices import Document,DBService, get_db_service
-from app.services.indexing_service import IndexingService
-from app.config import MAX_FILE_SIZE
+from app.models.indexing_models import (
+    BulkUploadResponse,
+    CollectionsResponse,
+    JobResponse,
+    JobStatusResponse,
+)
+from app.services.dbservices import Document, DBService, JOB_QUEUED, JOB_KIND_BULK, document_key_of
+from app.services.indexing_service import (
+    IndexingService,
+    BULK_DUPLICATE,
+    new_document_key,
+)
+from app.services.job_service import IndexingJobManager, JobQueueFullError
+from app.services.sample_questions import current_sample_questions
+from app.config import MAX_FILE_SIZE, MAX_BULK_UPLOAD_SIZE, UPLOAD_OVERHEAD_BYTES, FILE_STORAGE_DIR
+from app.utils.embedding_backends import parse_backend
+from app.utils.file_storage import (
+    receive_uploads,
+    FileTooLargeError,
+    InvalidUploadError,
+    UploadTooLargeError,
+)
 from app.utils.logger import logger
-from pathlib import Path
-import uuid
-from datetime import datetime
 
 router = APIRouter(
     prefix="/indexing",
@@ -25,101 +42,323 @@ async def get_db_service() -> DBService:
     return db_service
 
 
-@router.post("/upload", response_model=UploadResponse)
+async def get_job_manager() -> IndexingJobManager:
+    """Get the global background indexing job manager"""
+    from app.main import job_manager
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Indexing workers not initialized")
+    return job_manager
+
+
+def upload_request_body(field_name: str, multiple: bool = False) -> dict:
+    """OpenAPI request body of an endpoint that streams its multipart files itself"""
+    file_schema = {"type": "string", "format": "binary"}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": [field_name],
+                        "properties": {
+                            field_name: {"type": "array", "items": file_schema} if multiple else file_schema
+                        },
+                    }
+                }
+            },
+        }
+    }
+
+
+def validate_backend(embedding_backend: Optional[str]):
+    """Reject unknown embedding backend specs before anything is stored"""
+    if embedding_backend:
+        try:
+            parse_backend(embedding_backend)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/upload", response_model=JobResponse, status_code=202, openapi_extra=upload_request_body("file"))
 async def upload_pdf(
-    file: UploadFile = File(...),
+    request: Request,
+    response: Response,
     collection_name: Optional[str] = Query(None, description="Custom collection name (optional)"),
     chunk_size: int = Query(1000, ge=100, le=2000, description="Text chunk size"),
     chunk_overlap: int = Query(400, ge=0, le=500, description="Text chunk overlap"),
+    reindex: bool = Query(False, description="Index the file again even if it is already in the collection"),
+    replaces: Optional[str] = Query(None, description="Id of the document this file is a new revision of"),
+    embedding_backend: Optional[str] = Query(
+        None, description="Embedding backend of a new collection, e.g. 'onnx:bge-small-en-v1.5' (default: server setting)"
+    ),
+    job_manager: IndexingJobManager = Depends(get_job_manager),
     db_service: DBService = Depends(get_db_service)
 ):
-    """Upload and index a PDF document"""
-    
-    # Validate file type
-    if not file.filename or not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    """Upload a PDF document (multipart field "file") and queue it for background indexing.
 
-    # Read and validate file size
-    try:
-        contents = await file.read()
-        if len(contents) > MAX_FILE_SIZE:
+    The file is streamed from the request straight to its storage location,
+    so it is written once; oversized uploads are refused from their
+    Content-Length, or as soon as the limit is crossed, without reading the
+    rest of the body.
+
+    If the same file (by sha256) is already indexed or queued for the target
+    collection, the upload is discarded and the existing document or job is
+    returned with status 200, unless reindex is set.
+
+    Every upload is a new document, even when another document in the
+    collection has the same filename. To upload a new revision of a document,
+    pass its id as replaces: only its changed chunks are re-embedded and its
+    record (and stored file) is replaced once indexing completes. Re-indexing
+    a file that is already in the collection (reindex) revises that document.
+    """
+    validate_backend(embedding_backend)
+
+    replaced = None
+    if replaces:
+        replaced = await db_service.get_document_by_id(replaces)
+        if replaced is None:
+            raise HTTPException(status_code=404, detail=f"Document {replaces} not found")
+        if collection_name and collection_name != replaced.collection_name:
             raise HTTPException(
-                status_code=400, 
-                detail=f"File size exceeds {MAX_FILE_SIZE / (1024*1024):.1f} MB limit."
+                status_code=400,
+                detail=f"Document {replaces} is in collection '{replaced.collection_name}', not '{collection_name}'",
             )
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
+        collection_name = replaced.collection_name
 
+    filename = None
     try:
         # Create storage directory if it doesn't exist
-        storage_dir = Path("/filestorage/ragchat")
-        storage_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Generate unique filename to avoid conflicts
-        timestamp = datetime.now().strftime("%Y%m%d")
-        file_extension = Path(file.filename).suffix
-        base_filename = Path(file.filename).stem
-        unique_filename = f"{base_filename}_{timestamp}{file_extension}"
-        
-        # Full file path
-        file_path = storage_dir / unique_filename
-        
-        # Save file to filesystem
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        
-        logger.info(f"File saved to: {file_path}")
-        
-        # Process the PDF using your indexing service
-        collection_name, doc_count, chunk_count = await indexing_service.process_pdf(
-            file_content=contents,
-            filename=file.filename,
-            collection_name=collection_name,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
+        FILE_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+
+        # Stream to a unique final location, checking type and size limit and hashing as we go
+        uploads = await receive_uploads(
+            request, "file", MAX_FILE_SIZE, MAX_FILE_SIZE + UPLOAD_OVERHEAD_BYTES, stop_on_error=True
         )
+        if len(uploads) != 1:
+            for upload in uploads:
+                upload.path.unlink()
+            raise HTTPException(status_code=400, detail="Upload exactly one PDF file in the 'file' field.")
+        filename, file_path = uploads[0].filename, uploads[0].path
+        file_size, content_hash = uploads[0].size, uploads[0].content_hash
+
+        if file_size == 0:
+            file_path.unlink()
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
         
-        # Insert document record into database with file path
-        document_id = await db_service.insert_document(
-            collection_name=collection_name,
-            filename=file.filename,
-            storage_path=str(file_path),         # Store full file path
-            document_count=doc_count,
-            chunk_count=chunk_count,
-            file_size=len(contents)
+        logger.info(f"File saved to: {file_path} (sha256 {content_hash})")
+
+        final_collection_name = indexing_service.resolve_collection_name(collection_name, filename)
+
+        # Skip parsing and embedding entirely when this exact file is already indexed or queued
+        if not reindex:
+            existing = await db_service.get_document_by_hash(final_collection_name, content_hash)
+            active_job = None if existing else await db_service.get_active_job_by_hash(final_collection_name, content_hash)
+            if existing or active_job:
+                file_path.unlink()
+                response.status_code = 200
+                logger.info(f"Duplicate upload of {filename} for collection '{final_collection_name}'")
+                return JobResponse(
+                    message=(
+                        "Document already indexed in this collection (set reindex=true to index it again)"
+                        if existing else "Document is already queued for indexing"
+                    ),
+                    job_id=active_job.id if active_job else None,
+                    status=BULK_DUPLICATE if existing else active_job.status,
+                    collection_name=final_collection_name,
+                    filename=filename,
+                    document_id=existing.id if existing else None,
+                )
+        elif replaced is None:
+            replaced = await db_service.get_document_by_hash(final_collection_name, content_hash)
+
+        # Hand the parsing/embedding/upserting work to the background workers
+        job_id = await job_manager.submit(
+            collection_name=final_collection_name,
+            filename=filename,
+            storage_path=str(file_path),
+            file_size=file_size,
+            content_hash=content_hash,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            embedding_backend=embedding_backend,
+            document_key=document_key_of(replaced) if replaced else new_document_key(),
+            replaces=replaced.id if replaced else None,
         )
 
-        logger.info(f"Successfully processed and stored document {file.filename} with ID {document_id}")
+        logger.info(f"Queued indexing job {job_id} for {filename}")
 
-        return UploadResponse(
-            message="Document successfully indexed and saved",
-            collection_name=collection_name,
-            document_count=doc_count,
-            chunk_count=chunk_count,
-            file_path=str(file_path)  # Include file path in response if needed
+        return JobResponse(
+            message="Document saved and queued for indexing",
+            job_id=job_id,
+            status=JOB_QUEUED,
+            collection_name=final_collection_name,
+            filename=filename
         )
-        
-    except OSError as e:
-        # Clean up file if it was created but DB operation failed
+
+    except HTTPException:
+        raise
+
+    except (FileTooLargeError, InvalidUploadError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    except JobQueueFullError as e:
         if 'file_path' in locals() and file_path.exists():
             file_path.unlink()
-        logger.error(f"File system error for {file.filename}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"File storage error: {str(e)}")
-        
-    except ValueError as e:
-        # Clean up file if it was created but processing failed
+        raise HTTPException(status_code=503, detail=str(e))
+
+    except OSError as e:
+        # Clean up file if it was created but queuing failed
         if 'file_path' in locals() and file_path.exists():
             file_path.unlink()
-        raise HTTPException(status_code=400, detail=str(e))
+        logger.error(f"File system error for {filename}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"File storage error: {str(e)}")
         
     except Exception as e:
         # Clean up file if it was created but something went wrong
         if 'file_path' in locals() and file_path.exists():
             file_path.unlink()
-        logger.error(f"Error processing PDF {file.filename}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        logger.error(f"Error queuing PDF {filename}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error queuing PDF: {str(e)}")
+
+
+@router.post(
+    "/upload/bulk", response_model=JobResponse, status_code=202, openapi_extra=upload_request_body("files", multiple=True)
+)
+async def upload_pdfs_bulk(
+    request: Request,
+    collection_name: Optional[str] = Query(None, description="Collection for all files (default: one per file)"),
+    chunk_size: int = Query(1000, ge=100, le=2000, description="Text chunk size"),
+    chunk_overlap: int = Query(400, ge=0, le=500, description="Text chunk overlap"),
+    reindex: bool = Query(False, description="Index files again even if they are already in the collection"),
+    embedding_backend: Optional[str] = Query(
+        None, description="Embedding backend of new collections, e.g. 'onnx:bge-small-en-v1.5' (default: server setting)"
+    ),
+    job_manager: IndexingJobManager = Depends(get_job_manager)
+):
+    """Upload many PDF documents (multipart field "files") and queue them for indexing in one run.
+
+    Files are streamed from the request straight to storage, each checked
+    against the size limit as it arrives, and indexed by a background bulk
+    job: parsing, embedding batches and Qdrant upserts are shared across
+    files and the document records are written in one batch. Poll
+    GET /indexing/jobs/{job_id} for the outcome of every file and the overall
+    throughput; files that cannot be stored or indexed are reported as
+    failed, and files already indexed in their collection as duplicates.
+    """
+    validate_backend(embedding_backend)
+    FILE_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+
+    try:
+        uploads = await receive_uploads(request, "files", MAX_FILE_SIZE, MAX_BULK_UPLOAD_SIZE)
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not uploads:
+        raise HTTPException(status_code=400, detail="Upload at least one PDF file in the 'files' field.")
+
+    stored, rejected = [], []
+    for upload in uploads:
+        if upload.size == 0 and not upload.error:
+            upload.path.unlink()
+            upload.error = "Uploaded file is empty."
+        if upload.error:
+            rejected.append({
+                "filename": upload.filename,
+                "collection_name": indexing_service.resolve_collection_name(collection_name, upload.filename),
+                "error": upload.error,
+            })
+        else:
+            stored.append({
+                "storage_path": str(upload.path),
+                "filename": upload.filename,
+                "file_size": upload.size,
+                "content_hash": upload.content_hash,
+                # Fixed up front so a run resumed after a restart reuses the points already upserted
+                "document_key": new_document_key(),
+            })
+
+    try:
+        job_id = await job_manager.submit(
+            kind=JOB_KIND_BULK,
+            collection_name=collection_name or "",
+            filename=f"{len(uploads)} files",
+            storage_path="",
+            file_size=sum(file["file_size"] for file in stored),
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            embedding_backend=embedding_backend,
+            bulk_request=json.dumps({"files": stored, "rejected": rejected, "reindex": reindex}),
+        )
+    except Exception as e:
+        for file in stored:
+            Path(file["storage_path"]).unlink(missing_ok=True)
+        if isinstance(e, JobQueueFullError):
+            raise HTTPException(status_code=503, detail=str(e))
+        logger.error(f"Bulk upload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error queuing bulk upload: {str(e)}")
+
+    logger.info(f"Queued bulk indexing job {job_id} for {len(stored)} files ({len(rejected)} rejected)")
+    return JobResponse(
+        message=f"{len(stored)} of {len(uploads)} documents saved and queued for indexing",
+        job_id=job_id,
+        status=JOB_QUEUED,
+        collection_name=collection_name or "",
+        filename=f"{len(uploads)} files",
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str,
+    db_service: DBService = Depends(get_db_service)
+):
+    """Get the stage and progress of an indexing job"""
+    try:
+        job = await db_service.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        status = JobStatusResponse.model_validate(job)
+        if job.bulk_results:
+            status.bulk = BulkUploadResponse(**json.loads(job.bulk_results))
+        return status
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching job: {str(e)}")
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(
+    job_id: str,
+    job_manager: IndexingJobManager = Depends(get_job_manager)
+):
+    """Cancel a queued or running indexing job"""
+    try:
+        cancelled = await job_manager.cancel(job_id)
+        if not cancelled:
+            raise HTTPException(status_code=409, detail="Job not found or already finished")
+        return {"message": f"Job {job_id} cancelled"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error cancelling job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error cancelling job: {str(e)}")
     
     
+@router.get("/scheduler")
+async def get_scheduler_stats():
+    """Get the embedding scheduler queue depth and rate-limit counters"""
+    scheduler = indexing_service.embedding_scheduler
+    # No scheduler when only local embedding backends are in use
+    return scheduler.stats() if scheduler else {}
+
+
 @router.get("/collections", response_model=CollectionsResponse)
 async def list_collections():
     """List all collections in Qdrant"""
@@ -136,6 +375,9 @@ async def delete_collection(collection_name: str):
     """Delete a specific collection from Qdrant"""
     try:
         await indexing_service.delete_collection(collection_name)
+        sample_questions = current_sample_questions()
+        if sample_questions:
+            sample_questions.invalidate(collection_name)
         return JSONResponse(
             content={"message": f"Collection '{collection_name}' successfully deleted"}, 
             status_code=200
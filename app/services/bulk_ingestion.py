@@ -0,0 +1,175 @@
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.services.dbservices import DBService, document_key_of
+from app.services.indexing_service import (
+    IndexingService,
+    BulkFileResult,
+    BULK_INDEXED,
+    BULK_DUPLICATE,
+    BULK_FAILED,
+    bulk_summary,
+)
+from app.utils.logger import logger
+
+# A PDF already in file storage: (storage path, original filename, size in bytes, sha256)
+StoredFile = Tuple[Path, str, int, str]
+
+
+async def ingest_stored_files(
+    indexing_service: IndexingService,
+    db_service: DBService,
+    files: List[StoredFile],
+    collection_name: Optional[str] = None,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 400,
+    reindex: bool = False,
+    embedding_backend: Optional[str] = None,
+    document_keys: Optional[List[str]] = None,
+) -> Tuple[List[BulkFileResult], dict]:
+    """Index stored PDFs in one bulk run and record them with a single batch insert.
+
+    Files whose content is already indexed in the target collection are
+    reported as duplicates and skipped unless reindex is set. A file repeating
+    an earlier file of the same run is a duplicate of it once that copy is
+    indexed, and fails with its error when it failed; with reindex, a file already indexed in
+    its collection is a new revision of that document and replaces its record
+    and stored file. Other files are new documents, whatever their filename;
+    document_keys (aligned with files) fixes their keys, so that a run
+    repeated after an interruption reuses the points already upserted.
+    Returns the per-file results (in input order) and the run summary with
+    throughput. Stored copies of files that were not indexed are removed.
+    """
+    started = time.perf_counter()
+
+    results: List[Optional[BulkFileResult]] = [None] * len(files)
+    to_index: List[Tuple[int, StoredFile]] = []
+    first_of_hash: Dict[Tuple[str, str], int] = {}
+    # Positions of files repeating a file indexed earlier in this run, decided once it is indexed
+    repeats: List[int] = []
+    existing = {
+        (doc.collection_name, doc.content_hash): doc
+        for doc in await db_service.get_documents_by_hashes([file[3] for file in files])
+    }
+
+    for position, file in enumerate(files):
+        file_path, filename, file_size, content_hash = file
+        key = (indexing_service.resolve_collection_name(collection_name, filename), content_hash)
+        if not reindex and (key in existing or key in first_of_hash):
+            results[position] = BulkFileResult(
+                filename=filename,
+                file_path=file_path,
+                collection_name=key[0],
+                status=BULK_DUPLICATE,
+                file_size=file_size,
+                content_hash=content_hash,
+                document_id=existing[key].id if key in existing else None,
+            )
+            if key not in existing:
+                repeats.append(position)
+            continue
+        # Re-indexing revises the existing document; only the run's first copy replaces it
+        replaced = existing.get(key) if key not in first_of_hash else None
+        first_of_hash.setdefault(key, position)
+        to_index.append((position, file, replaced))
+
+    indexed_results = await indexing_service.process_many(
+        [(file_path, filename) for _, (file_path, filename, _, _), _ in to_index],
+        collection_name=collection_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        embedding_backend=embedding_backend,
+        document_keys=[
+            document_key_of(replaced) if replaced else document_keys[position] if document_keys else None
+            for position, _, replaced in to_index
+        ],
+    )
+    replaced_files = {}
+    for (position, (_, _, file_size, content_hash), replaced), result in zip(to_index, indexed_results):
+        result.file_size = file_size
+        result.content_hash = content_hash
+        if replaced:
+            result.replaces = replaced.id
+            replaced_files[replaced.id] = replaced.storage_path
+        results[position] = result
+
+    indexed = [result for result in results if result.status == BULK_INDEXED]
+    document_ids = await db_service.insert_documents([
+        {
+            "collection_name": result.collection_name,
+            "filename": result.filename,
+            "document_count": result.document_count,
+            "chunk_count": result.chunk_count,
+            "file_size": result.file_size,
+            "storage_path": str(result.file_path),
+            "content_hash": result.content_hash,
+            "document_key": result.document_key,
+            "replaces": result.replaces,
+        }
+        for result in indexed
+    ])
+    for result, document_id in zip(indexed, document_ids):
+        result.document_id = document_id
+
+    # Stored files of the records replaced by revisions
+    for result in indexed:
+        storage_path = replaced_files.get(result.replaces)
+        if storage_path and Path(storage_path) != result.file_path and Path(storage_path).exists():
+            try:
+                Path(storage_path).unlink()
+            except OSError as e:
+                logger.warning(f"Failed to remove {storage_path}: {str(e)}")
+
+    for position in repeats:
+        # Repeats within this run follow the first copy: a duplicate of its document, or failed like it
+        result = results[position]
+        first = results[first_of_hash[(result.collection_name, result.content_hash)]]
+        if first.status == BULK_INDEXED:
+            result.document_id = first.document_id
+        else:
+            result.status = BULK_FAILED
+            result.error = f"Same content as {first.filename}, which failed: {first.error}"
+
+    for result in results:
+        if result.status != BULK_INDEXED and result.file_path.exists():
+            try:
+                result.file_path.unlink()
+            except OSError as e:
+                logger.warning(f"Failed to remove {result.file_path}: {str(e)}")
+
+    summary = bulk_summary(results, time.perf_counter() - started)
+    logger.info(
+        f"Bulk ingestion: {summary['indexed_files']}/{summary['total_files']} files "
+        f"({summary['duplicate_files']} duplicates), {summary['total_chunks']} chunks "
+        f"in {summary['elapsed_seconds']}s "
+        f"({summary['files_per_second']} files/s, {summary['chunks_per_second']} chunks/s)"
+    )
+    return results, summary
+
+
+def bulk_report(results: List[BulkFileResult], rejected: List[dict], summary: dict) -> dict:
+    """Outcome of a bulk upload as BulkUploadResponse fields.
+
+    rejected lists the uploads refused before indexing, as
+    {"filename", "collection_name", "error"} dicts; they count as failed.
+    """
+    summary = dict(summary)
+    summary["total_files"] += len(rejected)
+    summary["failed_files"] += len(rejected)
+    return {
+        "message": f"Indexed {summary['indexed_files']} of {summary['total_files']} documents",
+        "results": [
+            {
+                "filename": result.filename,
+                "status": result.status,
+                "collection_name": result.collection_name,
+                "document_id": result.document_id,
+                "document_count": result.document_count,
+                "chunk_count": result.chunk_count,
+                "error": result.error,
+            }
+            for result in results
+        ] + [dict(rejection, status=BULK_FAILED) for rejection in rejected],
+        **summary,
+    }
@@ -1,55 +1,338 @@
-from openai import OpenAI
-from langchain_qdrant import QdrantVectorStore
-from langchain_openai import OpenAIEmbeddings
-from app.config import OPENAI_API_KEY
+import asyncio
+import os
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+from openai import AsyncOpenAI
+from qdrant_client import AsyncQdrantClient, models
+from app.config import (
+    OPENAI_API_KEY,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_TTL,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_MAX_AGE,
+    EMBEDDING_BACKEND,
+    RETRIEVAL_MODE,
+    HYBRID_PREFETCH_LIMIT,
+    RERANKER,
+    RERANK_BUDGET_MS,
+    RERANK_CANDIDATES,
+    MMR_DIVERSITY,
+    MULTI_SEARCH_TIMEOUT_MS,
+    SAMPLE_QUESTION_COUNT,
+)
+from app.utils.context_packing import PackedContext, pack_context
+from app.utils.embedding_backends import load_embeddings, recorded_backend
+from app.utils.embedding_cache import CachedEmbeddings, SQLiteEmbeddingStore
+from app.utils.qdrant_client import get_qdrant_client
+from app.utils.reranking import load_reranker, mmr_select, rerank_within_budget
+from app.utils.semantic_cache import answer_cache, collections_key
+from app.utils.sparse_encoder import SparseEncoder, SPARSE_VECTOR_NAME
+from app.utils.collection_catalog import collection_catalog
+from app.utils.collection_routing import CollectionTarget
+from app.services.indexing_service import document_condition
+from app.utils.vector_config import CollectionLayout
 from app.utils.logger import logger
-from qdrant_client import QdrantClient
+
+# Retrieval modes accepted by ChatService.retrieve
+RETRIEVAL_DENSE = "dense"
+RETRIEVAL_SPARSE = "sparse"
+RETRIEVAL_HYBRID = "hybrid"
+
+# Sample questions are generated from the first chunks of a document
+SAMPLE_SOURCE_CHUNKS = 4
+SAMPLE_SOURCE_CHARS = 1500
 
 
 class ChatService:
-    def __init__(self):
-        self.openai_client = OpenAI()
-        self.embedding_model = OpenAIEmbeddings(model="text-embedding-3-large")
+    def __init__(self, qdrant_client: Optional[AsyncQdrantClient] = None):
+        self._qdrant_client = qdrant_client
+        self.openai_client = AsyncOpenAI()
+        # Query embeddings are cached so repeated questions skip the embedding round trip.
+        # embedding_model embeds for EMBEDDING_BACKEND; collections recorded with another
+        # backend are queried with their own (embeddings_for)
+        self.embedding_backend = EMBEDDING_BACKEND
+        self._query_store = SQLiteEmbeddingStore(
+            EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, max_age_seconds=EMBEDDING_CACHE_MAX_AGE
+        ) if EMBEDDING_CACHE_PATH else None
+        self.embedding_model = self._build_embeddings(EMBEDDING_BACKEND)
+        self._backend_models: Dict[str, CachedEmbeddings] = {}
+        self.sparse_encoder = SparseEncoder()
+        # Optional local reranker; any app.utils.reranking.Reranker can be plugged in here
+        self.reranker = load_reranker(RERANKER)
+
+    @property
+    def qdrant_client(self) -> AsyncQdrantClient:
+        """Injected Qdrant client, falling back to the shared application client"""
+        return self._qdrant_client or get_qdrant_client()
+
+    def _build_embeddings(self, backend: str) -> CachedEmbeddings:
+        return CachedEmbeddings(
+            load_embeddings(backend),
+            max_size=EMBEDDING_CACHE_SIZE,
+            ttl_seconds=EMBEDDING_CACHE_TTL,
+            disk_store=self._query_store,
+        )
+
+    def embeddings_for(self, backend: Optional[str]):
+        """Query embedding model for a backend spec (embedding_model for the default backend)"""
+        if not backend or backend == self.embedding_backend:
+            return self.embedding_model
+        if backend not in self._backend_models:
+            self._backend_models[backend] = self._build_embeddings(backend)
+        return self._backend_models[backend]
+
+    async def embed_query(self, query: str, backend: Optional[str] = None):
+        """Embed a query with a backend (default EMBEDDING_BACKEND), served from the embedding cache when possible"""
+        return await self.embeddings_for(backend).aembed_query(query)
+
+    async def collection_layout(self, target: CollectionTarget) -> CollectionLayout:
+        """Layout of a logical collection's Qdrant collection, with the embedding backend its points record.
 
-    async def get_answer(self, query: str, collection_name: str, max_results: int = 4, model: str = "gpt-4.1"):
-        """Get an AI-generated answer based on document context"""
+        Served from the collection catalog, so migrated collections are picked
+        up on its next refresh; read from Qdrant when the catalog cannot answer.
+        """
         try:
-            qdrant_client = QdrantClient(url="http://localhost:6333")
+            entry = await collection_catalog(self.qdrant_client).get(target.name)
+            if entry is not None and entry.physical_name == target.physical_name:
+                return entry.layout
+        except Exception as e:
+            logger.warning(f"Collection catalog unavailable, reading the layout of '{target.name}': {str(e)}")
+        layout = CollectionLayout.from_info(await self.qdrant_client.get_collection(target.physical_name))
+        layout.embedding_backend = await recorded_backend(self.qdrant_client, target.physical_name)
+        return layout
+
+    async def search(self, query: str, collection_name: str, limit: int, query_vector=None,
+                     retrieval_mode: str = RETRIEVAL_MODE, with_vectors: bool = False,
+                     hnsw_ef: Optional[int] = None):
+        """Query Qdrant in the requested mode and return the scored points.
+
+        hybrid runs the dense and BM25 sparse queries as prefetches of a single
+        request and fuses them with reciprocal rank fusion. Collections without
+        sparse vectors, and queries with no searchable terms, fall back to dense.
 
-            # Initialize vector store (new API for 0.3.x)
-            vector_db = QdrantVectorStore(
-                qdrant_client=qdrant_client,
-                collection_name=collection_name,
-                embedding=self.embedding_model
+        query_vector is the full-size query embedding from the default backend
+        (collections indexed with another backend embed the query with theirs).
+        It is reduced to the collection's vector size, and quantized
+        collections are searched with rescoring against the original vectors.
+        hnsw_ef overrides the dense graph search width (higher: better recall,
+        slower).
+
+        collection_name is the logical name; in shared mode the search runs on
+        the shared collection, filtered to the collection's tenant (or on the
+        collection's dedicated one while it has not been migrated).
+        """
+        target = await collection_catalog(self.qdrant_client).target(collection_name)
+        query_filter = target.filter()
+        layout = await self.collection_layout(target)
+        sparse_vector = None
+        if retrieval_mode != RETRIEVAL_DENSE and layout.has_sparse:
+            sparse_vector = self.sparse_encoder.encode_query(query)
+            if not sparse_vector.indices:
+                sparse_vector = None
+        if sparse_vector is None:
+            retrieval_mode = RETRIEVAL_DENSE
+
+        if retrieval_mode == RETRIEVAL_SPARSE:
+            search_kwargs = {"query": sparse_vector, "using": SPARSE_VECTOR_NAME}
+        else:
+            backend = layout.embedding_backend or self.embedding_backend
+            if query_vector is None or backend != self.embedding_backend:
+                query_vector = await self.embed_query(query, layout.embedding_backend)
+            query_vector = layout.fit_vector(query_vector)
+            search_params = layout.search_params(hnsw_ef)
+            if retrieval_mode == RETRIEVAL_DENSE:
+                search_kwargs = {"query": query_vector}
+                if search_params:
+                    search_kwargs["search_params"] = search_params
+            else:
+                prefetch_limit = max(HYBRID_PREFETCH_LIMIT, limit)
+                search_kwargs = {
+                    "prefetch": [
+                        models.Prefetch(
+                            query=query_vector, params=search_params, filter=query_filter, limit=prefetch_limit
+                        ),
+                        models.Prefetch(
+                            query=sparse_vector, using=SPARSE_VECTOR_NAME, filter=query_filter, limit=prefetch_limit
+                        ),
+                    ],
+                    "query": models.FusionQuery(fusion=models.Fusion.RRF),
+                }
+        if query_filter:
+            search_kwargs["query_filter"] = query_filter
+
+        response = await self.qdrant_client.query_points(
+            collection_name=target.physical_name,
+            limit=limit,
+            with_payload=True,
+            with_vectors=[""] if with_vectors else False,
+            **search_kwargs
+        )
+        return response.points
+
+    async def search_many(self, query: str, collection_names: Sequence[str], limit: int, query_vector=None,
+                          retrieval_mode: str = RETRIEVAL_MODE, with_vectors: bool = False,
+                          hnsw_ef: Optional[int] = None,
+                          timeout_seconds: float = MULTI_SEARCH_TIMEOUT_MS / 1000):
+        """Search several collections concurrently and merge them into one top-`limit` list.
+
+        Returns (collection_name, point) pairs. A collection that fails or
+        does not answer within timeout_seconds is left out. Dense scores are
+        cosine similarities and are merged as they are; sparse (BM25 with
+        per-collection IDF) and fused scores are on per-collection scales, so
+        in those modes each collection's scores are divided by its best one.
+        Dense scores are normalised the same way when the collections use
+        different embedding backends.
+        """
+        if query_vector is None and retrieval_mode != RETRIEVAL_SPARSE:
+            query_vector = await self.embed_query(query)
+
+        async def search_one(name: str):
+            return await asyncio.wait_for(
+                self.search(query, name, limit, query_vector, retrieval_mode, with_vectors, hnsw_ef),
+                timeout=timeout_seconds,
             )
 
-            # Perform similarity search
-            search_results = vector_db.similarity_search_with_score(
-                query=query,
-                k=max_results
+        responses = await asyncio.gather(
+            *(search_one(name) for name in collection_names), return_exceptions=True
+        )
+        catalog = collection_catalog(self.qdrant_client)
+        entries = await asyncio.gather(*(catalog.get(name) for name in collection_names), return_exceptions=True)
+        backends = {
+            getattr(getattr(entry, "layout", None), "embedding_backend", None) or self.embedding_backend
+            for entry, points in zip(entries, responses) if not isinstance(points, BaseException)
+        }
+        normalise = retrieval_mode != RETRIEVAL_DENSE or len(backends) > 1
+        merged = []
+        for name, points in zip(collection_names, responses):
+            if isinstance(points, BaseException):
+                reason = "timed out" if isinstance(points, asyncio.TimeoutError) else f"failed: {str(points)}"
+                logger.warning(f"Search in collection '{name}' {reason}; leaving it out of the results")
+                continue
+            top_score = max((point.score for point in points), default=0)
+            if normalise and top_score > 0:
+                for point in points:
+                    point.score = point.score / top_score
+            merged.extend((name, point) for point in points)
+
+        merged.sort(key=lambda pair: pair[1].score, reverse=True)
+        return merged[:limit]
+
+    @staticmethod
+    def _dense_vectors(points) -> Optional[np.ndarray]:
+        """Dense vectors of returned points (a dict when the collection also has sparse vectors)"""
+        vectors = [point.vector.get("") if isinstance(point.vector, dict) else point.vector for point in points]
+        if any(vector is None for vector in vectors) or len({len(vector) for vector in vectors}) > 1:
+            # Collections reduced to different sizes cannot be compared
+            return None
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def select_results(self, query: str, points, max_results: int, diversity: float):
+        """Rerank over-fetched candidates within the latency budget, then diversify them with MMR.
+
+        If there is no reranker, or it fails or overruns RERANK_BUDGET_MS,
+        candidates keep their vector-search order.
+        """
+        relevance = [point.score for point in points]
+        if self.reranker is not None and len(points) > 1:
+            scores = await rerank_within_budget(
+                self.reranker,
+                query,
+                [(point.payload or {}).get("page_content", "") for point in points],
+                RERANK_BUDGET_MS / 1000,
             )
+            if scores is not None:
+                relevance = scores
 
-            if not search_results:
-                return None, []
-
-            # Format search results and prepare context
-            formatted_results = []
-            context_parts = []
-            
-            for doc, score in search_results:
-                formatted_result = {
-                    "page_content": doc.page_content,
-                    "page_number": doc.metadata.get("page"),
-                    "source": doc.metadata.get("source"),
-                    "score": score
-                }
-                formatted_results.append(formatted_result)
-                context_parts.append(doc.page_content)
+        vectors = self._dense_vectors(points) if diversity > 0 else None
+        return [points[i] for i in mmr_select(relevance, vectors, max_results, diversity)]
+
+    @staticmethod
+    def cache_options(retrieval_mode: str, candidates: Optional[int], diversity: float,
+                      hnsw_ef: Optional[int] = None) -> str:
+        """Retrieval settings that must match for a cached answer to be reused"""
+        return f"{retrieval_mode}:{candidates}:{diversity}:{hnsw_ef}"
+
+    async def retrieve(self, query: str, collection_name: Union[str, List[str]], max_results: int = 4,
+                       query_vector=None, retrieval_mode: str = RETRIEVAL_MODE, candidates: Optional[int] = None,
+                       diversity: float = MMR_DIVERSITY, hnsw_ef: Optional[int] = None,
+                       model: str = "gpt-4.1"):
+        """Run the search and build the prompt context for a query.
+
+        When MMR diversity or a reranker is active, `candidates` results
+        (default RERANK_CANDIDATES) are fetched and narrowed to max_results.
+        collection_name may be a list: the collections are searched
+        concurrently (search_many) and every context passage is labelled with
+        its source document so the answer can cite it.
 
-            context = "\n\n---\n\n".join(context_parts)
+        Returns (formatted results, PackedContext): the results are packed
+        into the context budget of `model` (see pack_context), with duplicate
+        and overlapping chunks merged.
+        """
+        collection_names = [collection_name] if isinstance(collection_name, str) else list(collection_name)
+        post_process = diversity > 0 or self.reranker is not None
+        limit = max(candidates or RERANK_CANDIDATES, max_results) if post_process else max_results
+        if len(collection_names) == 1:
+            points = await self.search(
+                query, collection_names[0], limit, query_vector, retrieval_mode,
+                with_vectors=diversity > 0, hnsw_ef=hnsw_ef
+            )
+            point_collections = {id(point): collection_names[0] for point in points}
+        else:
+            pairs = await self.search_many(
+                query, collection_names, limit, query_vector, retrieval_mode,
+                with_vectors=diversity > 0, hnsw_ef=hnsw_ef
+            )
+            points = [point for _, point in pairs]
+            point_collections = {id(point): name for name, point in pairs}
+        if post_process:
+            points = await self.select_results(query, points, max_results, diversity)
+
+        if not points:
+            return [], PackedContext(text="", tokens=0, raw_tokens=0)
+
+        formatted_results = []
+
+        for point in points:
+            payload = point.payload or {}
+            metadata = payload.get("metadata") or {}
+            source = metadata.get("source")
+            formatted_result = {
+                "page_content": payload.get("page_content", ""),
+                "page_number": metadata.get("page"),
+                "source": source,
+                "score": point.score,
+                "collection_name": point_collections[id(point)],
+                # Points indexed before filenames were stored are keyed by filename
+                "document": (
+                    metadata.get("filename") or metadata.get("document_key")
+                    or (os.path.basename(source) if source else None)
+                ),
+            }
+            formatted_results.append(formatted_result)
+
+        # Token counting is CPU-bound
+        context = await asyncio.to_thread(
+            pack_context, formatted_results, model, label_documents=len(collection_names) > 1
+        )
+        logger.info(
+            f"Context: {context.chunks} chunks -> {context.spans} spans, {context.tokens} tokens "
+            f"({context.tokens_saved} saved, {context.duplicates} duplicates, {context.omitted} over budget)"
+        )
+        return formatted_results, context
+
+    def build_messages(self, query: str, context: str, cite_documents: bool = False):
+        """Build the chat messages for a query and its retrieved context.
 
-            # Create system prompt
-            system_prompt = f"""You are a helpful AI assistant that answers user queries based on the available context 
+        cite_documents is set when the context spans several documents and
+        each passage is labelled with its source.
+        """
+        citation_guideline = (
+            "\n- The context comes from several documents; each passage starts with its [document, page]. "
+            "Name the source document for every fact you use" if cite_documents else ""
+        )
+        # Create system prompt
+        system_prompt = f"""You are a helpful AI assistant that answers user queries based on the available context 
 retrieved from a PDF file along with page contents and page numbers.
 
 You should only answer the user based on the following context and guide the user 
@@ -60,62 +343,125 @@ Important guidelines:
 - If the context doesn't contain enough information, say so clearly
 - Always mention relevant page numbers when available
 - Be concise but comprehensive
-- If you're unsure, acknowledge the uncertainty
+- If you're unsure, acknowledge the uncertainty{citation_guideline}
 
 Context:
 {context}"""
 
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": query}
+        ]
+
+    async def get_answer(self, query: str, collection_name: Union[str, List[str]], max_results: int = 4,
+                         model: str = "gpt-4.1", retrieval_mode: str = RETRIEVAL_MODE,
+                         candidates: Optional[int] = None, diversity: float = MMR_DIVERSITY,
+                         hnsw_ef: Optional[int] = None):
+        """Get an AI-generated answer based on document context.
+
+        collection_name may be a list of collections to answer from together.
+        Returns (answer, search_results, cached, context) where cached tells
+        whether the answer came from the semantic answer cache and context is
+        the PackedContext sent to the model (None when cached).
+        """
+        try:
+            query_vector = await self.embed_query(query)
+
+            collection_names = [collection_name] if isinstance(collection_name, str) else list(collection_name)
+            cache_key = collections_key(collection_names)
+            options = self.cache_options(retrieval_mode, candidates, diversity, hnsw_ef)
+            generation = answer_cache.generation(cache_key)
+            cached = answer_cache.lookup(cache_key, query_vector, model, max_results, options=options)
+            if cached:
+                return cached.answer, cached.search_results, True, None
+
+            formatted_results, context = await self.retrieve(
+                query, collection_name, max_results, query_vector=query_vector,
+                retrieval_mode=retrieval_mode, candidates=candidates, diversity=diversity,
+                hnsw_ef=hnsw_ef, model=model
+            )
+
+            if not formatted_results:
+                return None, [], False, None
+
             # Get AI response
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ]
+            messages = self.build_messages(query, context.text, cite_documents=len(collection_names) > 1)
 
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=0.7,
                 max_tokens=800
             )
 
-            return response.choices[0].message.content, formatted_results
+            answer = response.choices[0].message.content
+            answer_cache.store(
+                cache_key, query_vector, model, max_results, answer, formatted_results, options=options,
+                generation=generation,
+            )
+
+            return answer, formatted_results, False, context
 
         except Exception as e:
             logger.error(f"Error in get_answer: {str(e)}")
             raise
 
-    async def get_sample_questions(self, collection_name: str, limit: int = 3):
-        """Generate sample questions for a collection"""
-        try:
-            
-            vector_db = QdrantVectorStore.from_existing_collection(
-                collection_name=collection_name,
-                embedding=self.embedding_model,
-                url="http://localhost:6333"   # or pass client if supported
-            )
+    async def stream_completion(self, messages, model: str = "gpt-4.1"):
+        """Stream the AI-generated answer token by token"""
+        stream = await self.openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=800,
+            stream=True
+        )
+
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
 
+    async def generate_sample_questions(self, collection_name: str, document_key: Optional[str] = None,
+                                        count: int = SAMPLE_QUESTION_COUNT) -> List[str]:
+        """Generate sample questions from the opening pages of a document (any document when None).
 
-            sample_docs = vector_db.similarity_search("", k=2)
-            
-            if not sample_docs:
+        Reads the chunks directly rather than searching, so no query is embedded.
+        """
+        try:
+            target = await collection_catalog(self.qdrant_client).target(collection_name)
+            conditions = [document_condition(document_key)] if document_key else []
+            points, _ = await self.qdrant_client.scroll(
+                collection_name=target.physical_name,
+                scroll_filter=target.filter(*conditions),
+                limit=SAMPLE_SOURCE_CHUNKS,
+                # Ordered by the (indexed) page, so the chunks come from the start of the document
+                order_by=models.OrderBy(key="metadata.page"),
+                with_payload=True,
+                with_vectors=False
+            )
+            if not points:
                 return []
 
-            sample_content = sample_docs[0].page_content[:500]
-            
+            sample_content = "\n\n".join(
+                (point.payload or {}).get("page_content", "") for point in points
+            )[:SAMPLE_SOURCE_CHARS]
+
             messages = [
-                {"role": "system", "content": "Generate 3 interesting and specific questions that could be asked about this content. Return only the questions, one per line."},
+                {"role": "system", "content": f"Generate {count} interesting and specific questions that could be asked about this content. Return only the questions, one per line."},
                 {"role": "user", "content": sample_content}
             ]
 
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model="gpt-4.1",
                 messages=messages,
                 temperature=0.7,
-                max_tokens=200
+                max_tokens=60 * count
             )
 
-            questions = response.choices[0].message.content.strip().split("\n")
-            return questions[:limit]
+            questions = [line.strip() for line in response.choices[0].message.content.strip().split("\n")]
+            return [question for question in questions if question][:count]
 
         except Exception as e:
             logger.error(f"Error generating sample questions: {str(e)}")
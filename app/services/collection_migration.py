@@ -0,0 +1,294 @@
+from typing import List, Optional
+
+from qdrant_client import AsyncQdrantClient, models
+
+from app.services.indexing_service import IndexingService, PAYLOAD_INDEXES, SCROLL_BATCH_SIZE, shared_point_id
+from app.utils.collection_routing import (
+    COLLECTION_MODE_SHARED,
+    PENDING_ALIAS_SUFFIX,
+    TENANT_FIELD,
+    collection_aliases,
+    collection_target,
+    drop_qdrant_collection,
+    is_shared_collection,
+    parse_versioned_name,
+    qdrant_collections,
+    versioned_collection_name,
+)
+from app.utils.collection_catalog import collection_catalog
+from app.utils.embedding_backends import recorded_backend, supports_truncation
+from app.utils.logger import logger
+from app.utils.sparse_encoder import SPARSE_VECTOR_NAME, SparseEncoder
+from app.utils.vector_config import (
+    CollectionLayout,
+    CollectionProfile,
+    QUANTIZATION_NONE,
+    collection_profile,
+    dense_vector_params,
+    quantization_config,
+    sparse_vectors_config,
+    truncate_embedding,
+)
+
+async def migrate_collection(client: AsyncQdrantClient, collection_name: str,
+                             dimensions: Optional[int] = None, quantization: Optional[str] = None,
+                             profile: Optional[str] = None) -> dict:
+    """Convert an existing collection to a smaller vector size, another quantization and/or a profile.
+
+    Quantization and profile changes are applied in place (Qdrant rebuilds
+    the quantized vectors and HNSW graph in the background) and a profile
+    adds any missing PAYLOAD_INDEXES. Reducing dimensions builds a new
+    versioned collection (<name>__v<n>) with the new layout, copies every
+    point into it with truncated vectors (keeping point IDs, payloads, sparse
+    vectors and payload indexes) and then switches the collection's alias to
+    it, so searches are served by the old collection until the switch. Points
+    written to the collection during the copy are not carried over. A
+    migration that stopped part-way is finished or cleaned up by the next
+    one (restore_collection). Reducing the dimensions of a collection embedded
+    with a backend whose vectors cannot be truncated is refused. Returns the
+    layout before and after.
+    """
+    await restore_collection(client, collection_name)
+    info = await client.get_collection(collection_name)
+    before = CollectionLayout.from_info(info)
+    if before.vector_size is None:
+        raise ValueError(f"Collection '{collection_name}' does not use the unnamed dense vector layout")
+
+    size = dimensions or before.vector_size
+    if size > before.vector_size:
+        raise ValueError(f"Cannot grow '{collection_name}' from {before.vector_size} to {size} dimensions")
+    if size < before.vector_size:
+        backend = await recorded_backend(client, collection_name)
+        if backend and not supports_truncation(backend):
+            raise ValueError(f"Collection '{collection_name}' is embedded with '{backend}', which cannot be truncated")
+    quantization = quantization or before.quantization
+    # Validate before touching the collection
+    quantization_config(quantization)
+    target_profile = collection_profile(profile) if profile else None
+    # Shared collections build one HNSW graph per tenant (payload_m) instead of a global one
+    hnsw = info.config.hnsw_config
+    shared = is_shared_collection(collection_name) or bool(hnsw.payload_m)
+    after = CollectionLayout(vector_size=size, has_sparse=before.has_sparse, quantization=quantization)
+
+    # Full index params, so e.g. the tenant index of a shared collection stays is_tenant
+    existing_indexes = {
+        field: index.params or index.data_type for field, index in (info.payload_schema or {}).items()
+    }
+    payload_schema = {**PAYLOAD_INDEXES, **existing_indexes} if target_profile else existing_indexes
+
+    if size == before.vector_size:
+        if quantization != before.quantization or target_profile:
+            quantized = quantization != QUANTIZATION_NONE
+            vectors_on_disk = quantized or (target_profile is not None and target_profile.vectors_on_disk)
+            await client.update_collection(
+                collection_name=collection_name,
+                vectors_config={"": models.VectorParamsDiff(on_disk=vectors_on_disk)},
+                quantization_config=quantization_config(quantization) or models.Disabled.DISABLED,
+                hnsw_config=target_profile.hnsw_config(per_tenant=shared) if target_profile else None,
+                collection_params=models.CollectionParamsDiff(
+                    on_disk_payload=target_profile.on_disk_payload
+                ) if target_profile else None,
+            )
+        for field, schema in payload_schema.items():
+            if field not in existing_indexes:
+                await client.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+        logger.info(
+            f"Collection '{collection_name}' updated in place: quantization {before.quantization} -> {quantization}"
+            + (f", profile '{profile}'" if profile else "")
+        )
+        return {"collection_name": collection_name, "points": info.points_count, "before": before, "after": after}
+
+    if target_profile is None:
+        # Keep the collection's current HNSW and storage settings
+        target_profile = CollectionProfile(
+            hnsw_m=hnsw.payload_m if shared else hnsw.m,
+            hnsw_ef_construct=hnsw.ef_construct,
+            hnsw_on_disk=bool(hnsw.on_disk),
+            vectors_on_disk=bool(getattr(info.config.params.vectors, "on_disk", False)),
+            on_disk_payload=bool(info.config.params.on_disk_payload),
+        )
+
+    current = (await collection_aliases(client)).get(collection_name, collection_name)
+    _, version = parse_versioned_name(current) or (collection_name, 0)
+    rebuilt = versioned_collection_name(collection_name, version + 1)
+    await create_with_layout(client, rebuilt, after, payload_schema, target_profile, shared=shared)
+    copied = await copy_points(client, current, rebuilt, size)
+    await switch_alias(client, collection_name, current, rebuilt)
+
+    logger.info(
+        f"Collection '{collection_name}': {before.vector_size} -> {size} dimensions, "
+        f"quantization {before.quantization} -> {quantization}, {copied} points"
+    )
+    return {"collection_name": collection_name, "points": copied, "before": before, "after": after}
+
+
+def _alias_operation(collection_name: str, alias: str, previous: Optional[str] = None) -> list:
+    """Alias operations pointing alias at collection_name (applied atomically by Qdrant)"""
+    operations = []
+    if previous:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=previous)))
+    operations.append(
+        models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=collection_name, alias_name=alias))
+    )
+    return operations
+
+
+async def switch_alias(client: AsyncQdrantClient, collection_name: str, current: str, rebuilt: str):
+    """Serve collection_name from the rebuilt collection, then delete the one it replaces"""
+    if current != collection_name:
+        # Already served through the alias: one atomic switch
+        await client.update_collection_aliases(
+            change_aliases_operations=_alias_operation(rebuilt, collection_name, previous=collection_name)
+        )
+        await client.delete_collection(current)
+    else:
+        # First rebuild: the original collection holds the name the alias takes, so the name is
+        # missing between its deletion and the switch. The pending alias marks the build complete,
+        # so restore_collection can finish the switch if the process stops in between
+        pending = f"{collection_name}{PENDING_ALIAS_SUFFIX}"
+        await client.update_collection_aliases(change_aliases_operations=_alias_operation(rebuilt, pending))
+        await client.delete_collection(collection_name)
+        await client.update_collection_aliases(
+            change_aliases_operations=_alias_operation(rebuilt, collection_name, previous=pending)
+        )
+    collection_catalog(client).invalidate()
+
+
+async def restore_collection(client: AsyncQdrantClient, collection_name: str):
+    """Finish or clean up an interrupted migrate_collection.
+
+    A complete build still holding the pending alias takes over the name.
+    Versions without an alias are builds that did not finish, or collections
+    that were replaced but not deleted yet, and are removed.
+    """
+    aliases = await collection_aliases(client)
+    pending = f"{collection_name}{PENDING_ALIAS_SUFFIX}"
+    if pending in aliases:
+        rebuilt = aliases[pending]
+        logger.warning(f"Completing the interrupted migration of '{collection_name}' to '{rebuilt}'")
+        if collection_name not in aliases and await client.collection_exists(collection_name):
+            await client.delete_collection(collection_name)
+        await client.update_collection_aliases(
+            change_aliases_operations=_alias_operation(rebuilt, collection_name, previous=pending)
+        )
+        aliases[collection_name] = rebuilt
+        collection_catalog(client).invalidate()
+
+    for col in (await client.get_collections()).collections:
+        parsed = parse_versioned_name(col.name)
+        if parsed and parsed[0] == collection_name and col.name != aliases.get(collection_name):
+            logger.info(f"Removing '{col.name}' left by an interrupted migration of '{collection_name}'")
+            await client.delete_collection(col.name)
+
+
+async def create_with_layout(client: AsyncQdrantClient, collection_name: str, layout: CollectionLayout,
+                             payload_schema: dict, profile: Optional[CollectionProfile] = None,
+                             shared: bool = False):
+    """(Re)create a collection with the given layout, profile and payload indexes (per-tenant HNSW when shared)"""
+    profile = profile or CollectionProfile()
+    if await client.collection_exists(collection_name):
+        await client.delete_collection(collection_name)  # left over from an interrupted migration
+    await client.create_collection(
+        collection_name=collection_name,
+        vectors_config=dense_vector_params(layout.vector_size, layout.quantization, profile.vectors_on_disk),
+        sparse_vectors_config=sparse_vectors_config() if layout.has_sparse else None,
+        hnsw_config=profile.hnsw_config(per_tenant=shared),
+        on_disk_payload=profile.on_disk_payload,
+    )
+    for field, schema in payload_schema.items():
+        await client.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+
+
+async def copy_points(client: AsyncQdrantClient, source: str, destination: str, dimensions: int,
+                      tenant: Optional[str] = None, sparse_encoder: Optional[SparseEncoder] = None) -> int:
+    """Copy all points, truncating the dense vector to `dimensions`.
+
+    With tenant, points are tagged with it and get their shared-collection
+    IDs. With sparse_encoder, points that have no BM25 vector (collections
+    created before sparse vectors) get one computed from their text.
+    """
+    copied = 0
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=source,
+            with_payload=True,
+            with_vectors=True,
+            limit=SCROLL_BATCH_SIZE,
+            offset=offset,
+        )
+        if points:
+            batch = []
+            for point in points:
+                vector = dict(point.vector) if isinstance(point.vector, dict) else {"": point.vector}
+                vector[""] = truncate_embedding(vector[""], dimensions)
+                payload = point.payload or {}
+                if sparse_encoder and SPARSE_VECTOR_NAME not in vector:
+                    vector[SPARSE_VECTOR_NAME] = sparse_encoder.encode_document(payload.get("page_content", ""))
+                point_id = point.id
+                if tenant:
+                    payload = {**payload, "metadata": {**(payload.get("metadata") or {}), TENANT_FIELD: tenant}}
+                    point_id = shared_point_id(tenant, str(point.id))
+                batch.append(models.PointStruct(id=point_id, vector=vector, payload=payload))
+            await client.upsert(collection_name=destination, points=batch, wait=True)
+            copied += len(batch)
+        if offset is None:
+            return copied
+
+
+async def migrate_to_shared(indexing_service: IndexingService, collection_names: Optional[List[str]] = None,
+                            delete_source: bool = False) -> List[dict]:
+    """Copy dedicated per-document collections into the shared collections as tenants.
+
+    collection_names defaults to every dedicated collection. Each one's points
+    are copied (IDs, payloads and vectors, truncated to the shared
+    collection's size; missing BM25 vectors are computed) under its name as
+    tenant, replacing any earlier copy. The dedicated collections are kept
+    by default and keep serving their names, also once COLLECTION_MODE is
+    "shared" (see resolve_target). Once the copies are checked, the operator
+    confirms the cut-over by running the migration again with delete_source:
+    it copies each collection again (picking up writes made since) and then
+    deletes the dedicated collection, so its tenant takes over.
+    A collection embedded with a different backend than the shared
+    collection it maps to is refused. Returns one {collection_name, shared_collection, points} per collection.
+    """
+    client = indexing_service.qdrant_client
+    if collection_names is None:
+        collection_names = [name for name in await qdrant_collections(client) if not is_shared_collection(name)]
+
+    migrated = []
+    for name in collection_names:
+        source = CollectionLayout.from_info(await client.get_collection(name))
+        if source.vector_size is None:
+            raise ValueError(f"Collection '{name}' does not use the unnamed dense vector layout")
+
+        target = collection_target(name, COLLECTION_MODE_SHARED)
+        backend = await recorded_backend(client, name)
+        if backend and await client.collection_exists(target.physical_name):
+            shared_backend = await recorded_backend(client, target.physical_name)
+            if shared_backend and shared_backend != backend:
+                raise ValueError(
+                    f"Collection '{name}' is embedded with '{backend}' but '{target.physical_name}' "
+                    f"with '{shared_backend}'"
+                )
+        layout = await indexing_service.ensure_collection(
+            client, target.physical_name, vector_size=source.vector_size, shared=True, embedding_backend=backend
+        )
+        # Start from an empty tenant, so a repeated migration leaves no chunks deleted since
+        await client.delete(
+            collection_name=target.physical_name,
+            points_selector=models.FilterSelector(filter=target.filter()),
+            wait=True,
+        )
+        copied = await copy_points(
+            client, name, target.physical_name, layout.vector_size, tenant=target.tenant,
+            sparse_encoder=indexing_service.sparse_encoder if layout.has_sparse else None,
+        )
+        if delete_source:
+            await drop_qdrant_collection(client, name)
+            logger.info(f"Moved collection '{name}' into '{target.physical_name}' ({copied} points)")
+        else:
+            logger.info(f"Copied collection '{name}' into '{target.physical_name}' ({copied} points), source kept")
+        migrated.append({"collection_name": name, "shared_collection": target.physical_name, "points": copied})
+    collection_catalog(client).invalidate()
+    return migrated
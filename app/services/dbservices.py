@@ -1,9 +1,13 @@
+import base64
+import json
+import time
 import uuid
 import logging
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, String, BigInteger, DateTime, Integer, select, text
+from sqlalchemy import Column, String, BigInteger, DateTime, Index, Integer, Text, and_, delete, func, inspect, or_, select, text, update
 from sqlalchemy.engine import URL
 from dotenv import load_dotenv
 import os
@@ -20,6 +24,18 @@ MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "file_db")
 
+# Engine pool: connections kept open, extra connections allowed under load, liveness check on checkout
+# and recycling before MySQL's wait_timeout closes idle connections. DB_ECHO logs every SQL statement
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# Seconds a document count is reused by the /files listing; writes in this process reset it
+DOCUMENT_COUNT_TTL = float(os.getenv("DOCUMENT_COUNT_TTL", "30"))
+
 # Base for all models
 Base = declarative_base()
 
@@ -35,6 +51,165 @@ class Document(Base):
     file_size = Column(BigInteger, nullable=True)
     upload_date = Column(DateTime, nullable=False, default=datetime.utcnow)
     storage_path = Column(String(500), nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256 of the uploaded file
+    sample_questions = Column(Text, nullable=True)  # JSON list, generated in the background after indexing
+    # Key of the document's points in Qdrant, kept across revisions; NULL for records from before
+    # keys were stored, whose points are keyed by filename (see document_key_of)
+    document_key = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        # Duplicate-upload lookups are by (content_hash, collection_name)
+        Index("ix_documents_content_hash_collection", "content_hash", "collection_name"),
+        # Keyset pagination of the listing, newest first, overall and per collection
+        Index("ix_documents_upload_date_id", "upload_date", "id"),
+        Index("ix_documents_collection_upload_date_id", "collection_name", "upload_date", "id"),
+        # Filename prefix filters (LIKE 'prefix%')
+        Index("ix_documents_filename", "filename"),
+    )
+
+
+# Columns the /files responses need; read with Core selects, so no ORM objects are built
+DOCUMENT_LISTING_COLUMNS = (
+    Document.id,
+    Document.collection_name,
+    Document.filename,
+    Document.document_count,
+    Document.chunk_count,
+    Document.file_size,
+    Document.upload_date,
+    Document.storage_path,
+    Document.document_key,
+)
+
+
+def document_key_of(doc) -> str:
+    """Key of a document record's points in Qdrant"""
+    return doc.document_key or doc.filename
+
+
+def encode_cursor(doc: "Document") -> str:
+    """Opaque listing cursor pointing after a document: its (upload_date, id)"""
+    raw = f"{doc.upload_date.isoformat()}|{doc.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        upload_date, document_id = raw.split("|", 1)
+        return datetime.fromisoformat(upload_date), document_id
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _document_filters(collection_name: Optional[str], filename_prefix: Optional[str]) -> list:
+    conditions = []
+    if collection_name is not None:
+        conditions.append(Document.collection_name == collection_name)
+    if filename_prefix:
+        # A constant 'prefix%' pattern, so MySQL can range-scan ix_documents_filename
+        conditions.append(Document.filename.like(_escape_like(filename_prefix) + "%", escape="\\"))
+    return conditions
+
+
+class _CountCache:
+    """Document counts per listing filter, shared by every DBService in the process"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._counts: Dict[tuple, Tuple[int, float]] = {}
+
+    def get(self, key: tuple) -> Optional[int]:
+        entry = self._counts.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+            return None
+        return entry[0]
+
+    def store(self, key: tuple, count: int):
+        self._counts[key] = (count, time.monotonic())
+
+    def clear(self):
+        self._counts.clear()
+
+
+document_counts = _CountCache(DOCUMENT_COUNT_TTL)
+
+
+# Indexing job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+# Job kinds (IndexingJob.kind); a NULL kind is a single-file upload
+JOB_KIND_BULK = "bulk"
+
+
+# Indexing Job Model
+class IndexingJob(Base):
+    __tablename__ = "indexing_jobs"
+
+    id = Column(String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
+    status = Column(String(20), nullable=False, default=JOB_QUEUED, index=True)
+    stage = Column(String(20), nullable=False, default=JOB_QUEUED)
+    collection_name = Column(String(255), nullable=False)
+    filename = Column(String(255), nullable=False)
+    storage_path = Column(String(500), nullable=False)
+    file_size = Column(BigInteger, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    chunk_size = Column(Integer, nullable=False, default=1000)
+    chunk_overlap = Column(Integer, nullable=False, default=400)
+    embedding_backend = Column(String(255), nullable=True)  # None: the collection's or EMBEDDING_BACKEND
+    pages_parsed = Column(Integer, nullable=False, default=0)
+    total_chunks = Column(Integer, nullable=False, default=0)
+    chunks_embedded = Column(Integer, nullable=False, default=0)
+    chunks_upserted = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    document_id = Column(String(36), nullable=True)
+    document_key = Column(String(255), nullable=True)  # None: the filename (jobs from before keys were stored)
+    replaces = Column(String(36), nullable=True)  # id of the document record this upload is a revision of
+    kind = Column(String(20), nullable=True)  # None: a single-file upload; JOB_KIND_BULK: a bulk upload
+    bulk_request = Column(Text, nullable=True)  # JSON: stored and rejected files and options of a bulk job
+    bulk_results = Column(Text, nullable=True)  # JSON: per-file results and summary of a finished bulk job
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def _sync_schema(connection):
+    """Add columns and indexes that create_all() does not add to existing tables.
+
+    Only nullable columns are added, so existing rows stay valid.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable:
+                logger.warning(f"⚠️ Cannot add non-nullable column {table.name}.{column.name} automatically")
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE `{table.name}` ADD COLUMN `{column.name}` {column_type} NULL"))
+            logger.info(f"📝 Added column {table.name}.{column.name}")
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(connection)
+                logger.info(f"📝 Created index {index.name}")
 
 
 class DBService:
@@ -140,7 +315,16 @@ class DBService:
             database_url = self._create_database_url()
             logger.info(f"🔗 Connecting to database '{self.mysql_database}'...")
             
-            self.engine = create_async_engine(database_url, echo=True, future=True)
+            self.engine = create_async_engine(
+                database_url,
+                echo=DB_ECHO,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=DB_POOL_PRE_PING,
+                pool_recycle=DB_POOL_RECYCLE,
+                future=True,
+            )
             self.async_session = sessionmaker(
                 self.engine, 
                 expire_on_commit=False, 
@@ -151,6 +335,7 @@ class DBService:
             logger.info("📋 Creating database tables...")
             async with self.engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_sync_schema)
             
             logger.info("✅ Database initialized successfully (tables created if missing)")
             
@@ -198,66 +383,178 @@ class DBService:
             session.add(doc)
             await session.commit()
             await session.refresh(doc)
+            document_counts.clear()
             logger.info(f"✅ Inserted document {filename} into DB with id {doc.id}")
             return doc.id
 
+    async def insert_documents(self, documents: List[dict]) -> List[str]:
+        """Insert many document records in a single transaction, returning their ids in order.
+
+        A record given a "replaces" document id is a revision: the replaced
+        record is deleted in the same transaction.
+        """
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+        if not documents:
+            return []
+
+        documents = [dict(fields) for fields in documents]
+        # Explicit revisions replace the record they name; nothing else is removed
+        replaced = {fields.pop("replaces", None) for fields in documents} - {None}
+        async with self.async_session() as session:
+            if replaced:
+                await session.execute(delete(Document).where(Document.id.in_(replaced)))
+            docs = [Document(**fields) for fields in documents]
+            session.add_all(docs)
+            await session.flush()
+            document_ids = [doc.id for doc in docs]
+            await session.commit()
+            document_counts.clear()
+            logger.info(f"✅ Inserted {len(docs)} documents into DB")
+            return document_ids
+
     async def get_all_documents(self):
         """Fetch all documents"""
         if not self.async_session:
             raise Exception("Database not initialized. Call init_db() first.")
             
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(Document).order_by(Document.upload_date.desc())
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(*DOCUMENT_LISTING_COLUMNS).order_by(Document.upload_date.desc())
             )
-            return result.scalars().all()
+            return result.all()
 
-    async def get_all_documents_paginated(self, limit: int = 10, offset: int = 0):
-        """Fetch documents with pagination"""
+    async def list_documents(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        collection_name: Optional[str] = None,
+        filename_prefix: Optional[str] = None,
+    ) -> Tuple[list, Optional[str]]:
+        """Fetch a page of documents, newest first, and the cursor of the next page (None on the last).
+
+        With a cursor (from a previous page) the page starts right after that
+        document, so every page is one index range scan on (upload_date, id);
+        offset is only used without a cursor, for page-number clients.
+        Documents are read-only rows of DOCUMENT_LISTING_COLUMNS.
+        """
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        conditions = _document_filters(collection_name, filename_prefix)
+        if cursor:
+            upload_date, document_id = decode_cursor(cursor)
+            # The plain upload_date bound lets MySQL and SQLite range-scan the index; the OR breaks ties on id
+            conditions.append(and_(
+                Document.upload_date <= upload_date,
+                or_(Document.upload_date < upload_date, Document.id < document_id),
+            ))
+        query = (
+            select(*DOCUMENT_LISTING_COLUMNS)
+            .where(*conditions)
+            .order_by(Document.upload_date.desc(), Document.id.desc())
+            .limit(limit + 1)
+        )
+        if offset and not cursor:
+            query = query.offset(offset)
+
+        async with self.engine.connect() as conn:
+            docs = (await conn.execute(query)).all()
+        if len(docs) > limit:
+            docs = docs[:limit]
+            return docs, encode_cursor(docs[-1])
+        return docs, None
+
+    async def count_documents(self, collection_name: Optional[str] = None,
+                              filename_prefix: Optional[str] = None) -> int:
+        """Count documents matching the listing filters, reusing a count up to DOCUMENT_COUNT_TTL old"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        key = (collection_name, filename_prefix or None)
+        count = document_counts.get(key)
+        if count is None:
+            async with self.engine.connect() as conn:
+                result = await conn.execute(
+                    select(func.count()).select_from(Document).where(*_document_filters(collection_name, filename_prefix))
+                )
+                count = result.scalar_one() or 0
+            document_counts.store(key, count)
+        return count
+
+    async def get_document_by_collection(self, collection_name: str):
+        """Get document by collection name"""
         if not self.async_session:
             raise Exception("Database not initialized. Call init_db() first.")
             
         async with self.async_session() as session:
             result = await session.execute(
-                select(Document)
+                select(Document).where(Document.collection_name == collection_name)
+            )
+            return result.scalars().first()
+        
+    async def get_documents_by_collection(self, collection_name: str):
+        """Get all documents of a collection, newest first"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(*DOCUMENT_LISTING_COLUMNS, Document.sample_questions)
+                .where(Document.collection_name == collection_name)
                 .order_by(Document.upload_date.desc())
-                .limit(limit)
-                .offset(offset)
             )
-            return result.scalars().all()
-    async def count_all_documents(self) -> int:
-        """Count total number of documents"""
+            return result.all()
+
+    async def set_sample_questions(self, document_id: str, questions: List[str]):
+        """Store the generated sample questions of a document"""
         if not self.async_session:
             raise Exception("Database not initialized. Call init_db() first.")
-            
+
         async with self.async_session() as session:
-            result = await session.execute(
-                select(text("COUNT(1)")).select_from(Document)
+            await session.execute(
+                update(Document).where(Document.id == document_id).values(sample_questions=json.dumps(questions))
             )
-            count = result.scalar_one()
-            return count if count is not None else 0
-        
-    async def get_document_by_collection(self, collection_name: str):
-        """Get document by collection name"""
+            await session.commit()
+
+    async def get_document_by_hash(self, collection_name: str, content_hash: str):
+        """Get the document with this content hash in a collection, if it was already indexed"""
         if not self.async_session:
             raise Exception("Database not initialized. Call init_db() first.")
-            
+
         async with self.async_session() as session:
             result = await session.execute(
-                select(Document).where(Document.collection_name == collection_name)
+                select(Document).where(
+                    Document.content_hash == content_hash,
+                    Document.collection_name == collection_name,
+                )
             )
             return result.scalars().first()
-        
-    async def get_document_by_id(self, id: str):
-        """Get document by collection name"""
+
+    async def get_documents_by_hashes(self, content_hashes: List[str]):
+        """Get all documents whose content hash is one of content_hashes"""
         if not self.async_session:
             raise Exception("Database not initialized. Call init_db() first.")
-            
+        if not content_hashes:
+            return []
+
         async with self.async_session() as session:
             result = await session.execute(
-                select(Document).where(Document.id == id)
+                select(Document).where(Document.content_hash.in_(set(content_hashes)))
             )
-            return result.scalars().first()
+            return result.scalars().all()
+
+    async def get_document_by_id(self, id: str):
+        """Get document by ID (a read-only row of DOCUMENT_LISTING_COLUMNS)"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+            
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(*DOCUMENT_LISTING_COLUMNS).where(Document.id == id)
+            )
+            return result.first()
 
     async def delete_document(self, document_id: str) -> bool:
         """Delete a document by ID"""
@@ -272,10 +569,113 @@ class DBService:
             if doc:
                 await session.delete(doc)
                 await session.commit()
+                document_counts.clear()
                 logger.info(f"✅ Deleted document {document_id}")
                 return True
             return False
 
+    async def create_job(self, **fields) -> str:
+        """Insert a new indexing job record"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        async with self.async_session() as session:
+            job = IndexingJob(**fields)
+            session.add(job)
+            await session.commit()
+            await session.refresh(job)
+            logger.info(f"✅ Created indexing job {job.id} for {job.filename}")
+            return job.id
+
+    async def get_job(self, job_id: str):
+        """Get an indexing job by ID"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(IndexingJob).where(IndexingJob.id == job_id)
+            )
+            return result.scalars().first()
+
+    async def update_job(self, job_id: str, **fields):
+        """Update progress/status columns of an indexing job"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        fields["updated_at"] = datetime.utcnow()
+        async with self.async_session() as session:
+            await session.execute(
+                update(IndexingJob).where(IndexingJob.id == job_id).values(**fields)
+            )
+            await session.commit()
+
+    async def get_active_job_by_hash(self, collection_name: str, content_hash: str):
+        """Get a queued or running job for the same file and collection, if any"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(IndexingJob).where(
+                    IndexingJob.content_hash == content_hash,
+                    IndexingJob.collection_name == collection_name,
+                    IndexingJob.status.in_(JOB_ACTIVE_STATES),
+                )
+            )
+            return result.scalars().first()
+
+    async def get_active_jobs(self):
+        """Get jobs that were queued or running (used to resume after a restart)"""
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(IndexingJob)
+                .where(IndexingJob.status.in_(JOB_ACTIVE_STATES))
+                .order_by(IndexingJob.created_at)
+            )
+            return result.scalars().all()
+
+    async def complete_job(self, job_id: str, replaces: Optional[str] = None, **document_fields) -> Optional[str]:
+        """Insert the document record and mark its job completed in one transaction.
+
+        When the job is a revision (replaces), the replaced record is deleted,
+        since re-indexing updated that document's points in place. Records are
+        never replaced just because another one has the same filename.
+
+        Only a running job completes: when it was cancelled meanwhile, nothing
+        is written and None is returned.
+        """
+        if not self.async_session:
+            raise Exception("Database not initialized. Call init_db() first.")
+
+        async with self.async_session() as session:
+            if replaces:
+                await session.execute(delete(Document).where(Document.id == replaces))
+            doc = Document(**document_fields)
+            session.add(doc)
+            await session.flush()
+            result = await session.execute(
+                update(IndexingJob).where(
+                    IndexingJob.id == job_id, IndexingJob.status == JOB_RUNNING
+                ).values(
+                    status=JOB_COMPLETED,
+                    stage="done",
+                    document_id=doc.id,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            if result.rowcount == 0:
+                await session.rollback()
+                logger.info(f"Job {job_id} is no longer running; its document {doc.filename} was not recorded")
+                return None
+            await session.commit()
+            document_counts.clear()
+            logger.info(f"✅ Inserted document {doc.filename} into DB with id {doc.id} (job {job_id})")
+            return doc.id
+
     async def close(self):
         """Close database connections"""
         if self.engine:
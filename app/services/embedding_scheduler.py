@@ -0,0 +1,250 @@
+import asyncio
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import (
+    EMBEDDING_TOKENS_PER_MINUTE,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_MAX_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+)
+from app.utils.logger import logger
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute.
+
+    Callers reserve their tokens under a (thread) lock and sleep after
+    releasing it, so waiters queue in order without holding the lock, and
+    the bucket is not tied to an event loop.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount: float):
+        """Wait until `amount` tokens are available and consume them.
+
+        Requests larger than the bucket wait for a full bucket and leave it in
+        debt, so oversized batches are throttled rather than rejected. A
+        cancelled wait gives its tokens back.
+        """
+        with self._lock:
+            self._refill()
+            wait = max(0.0, min(amount, self.capacity) - self.tokens) / self.rate_per_second
+            self.tokens -= amount
+        if wait <= 0:
+            return
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            with self._lock:
+                self.tokens += amount
+            raise
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for OpenAI 429 responses (RateLimitError or any error carrying status 429)"""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-provided Retry-After delay, if the error carries one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingScheduler(Embeddings):
+    """Batches document embeddings by token count and runs them under a shared rate limit.
+
+    Batches are packed up to max_batch_tokens / max_batch_size, run with up to
+    max_concurrency in flight, and throttled by token-per-minute and
+    request-per-minute buckets. 429 responses are retried with exponential
+    backoff (honouring Retry-After). One instance is shared by all indexing jobs,
+    and other models reach the same limits through scheduled().
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        tokens_per_minute: int = EMBEDDING_TOKENS_PER_MINUTE,
+        requests_per_minute: int = EMBEDDING_REQUESTS_PER_MINUTE,
+        max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        base_delay: float = 1.0,
+    ):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        # Created in the loop that runs the batches (see _concurrency_limit)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.max_concurrency = max_concurrency
+        self._encoding = None
+
+        self.queued_batches = 0
+        self.queued_tokens = 0
+        self.in_flight = 0
+        self.completed_batches = 0
+        self.rate_limited = 0
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens locally (tiktoken when available, ~4 chars/token otherwise)"""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating token counts: {str(e)}")
+                self._encoding = False
+        if self._encoding:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return max(1, len(text) // 4)
+
+    def pack_batches(self, texts: List[str]) -> List[Tuple[List[int], int]]:
+        """Greedily pack text indices into (indices, token count) batches bounded by tokens and size"""
+        batches, current, current_tokens = [], [], 0
+        for index, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    def _concurrency_limit(self) -> asyncio.Semaphore:
+        """Semaphore of the running event loop, created on first use in it"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def scheduled(self, embeddings: Embeddings) -> Embeddings:
+        """embeddings with its document batches run by this scheduler (itself for its own model)"""
+        return self if embeddings is self.embeddings else ScheduledEmbeddings(self, embeddings)
+
+    async def _run_batch(self, embeddings: Embeddings, texts: List[str], tokens: int) -> List[List[float]]:
+        self.queued_batches += 1
+        self.queued_tokens += tokens
+        dequeued = False
+        try:
+            async with self._concurrency_limit():
+                self.queued_batches -= 1
+                self.queued_tokens -= tokens
+                dequeued = True
+                self.in_flight += 1
+                try:
+                    for attempt in range(self.max_retries + 1):
+                        await self.token_bucket.acquire(tokens)
+                        await self.request_bucket.acquire(1)
+                        try:
+                            vectors = await embeddings.aembed_documents(texts)
+                            self.completed_batches += 1
+                            return vectors
+                        except Exception as e:
+                            if not is_rate_limit_error(e) or attempt == self.max_retries:
+                                raise
+                            self.rate_limited += 1
+                            delay = retry_after_seconds(e) or self.base_delay * (2 ** attempt)
+                            delay += random.uniform(0, self.base_delay)
+                            logger.warning(
+                                f"Embedding rate limited (attempt {attempt + 1}/{self.max_retries}), "
+                                f"retrying {len(texts)} chunks in {delay:.1f}s"
+                            )
+                            await asyncio.sleep(delay)
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if not dequeued:
+                self.queued_batches -= 1
+                self.queued_tokens -= tokens
+
+    async def aembed_documents(self, texts: List[str],
+                               embeddings: Optional[Embeddings] = None) -> List[List[float]]:
+        if not texts:
+            return []
+
+        batches = self.pack_batches(texts)
+        results = await asyncio.gather(*[
+            self._run_batch(embeddings or self.embeddings, [texts[i] for i in indices], tokens)
+            for indices, tokens in batches
+        ])
+
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for (indices, _), batch_vectors in zip(batches, results):
+            for index, vector in zip(indices, batch_vectors):
+                vectors[index] = vector
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+    def stats(self) -> dict:
+        """Queue depth and throughput counters"""
+        return {
+            "queued_batches": self.queued_batches,
+            "queued_tokens": self.queued_tokens,
+            "in_flight_batches": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "completed_batches": self.completed_batches,
+            "rate_limited_retries": self.rate_limited,
+            "tokens_per_minute": int(self.token_bucket.rate_per_second * 60),
+        }
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Embedding model whose document batches share another model's EmbeddingScheduler (and its limits)"""
+
+    def __init__(self, scheduler: EmbeddingScheduler, embeddings: Embeddings):
+        self.scheduler = scheduler
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.scheduler.aembed_documents(texts, embeddings=self.embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
@@ -1,115 +1,717 @@
+import asyncio
+import hashlib
 import uuid
+from dataclasses import dataclass, field
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from app.config import UPLOAD_DIR
+from qdrant_client import AsyncQdrantClient, models
+from app.config import (
+    CHUNK_EMBEDDING_STORE_PATH, BULK_MAX_PARALLEL_FILES, BULK_EMBED_WINDOW_CHUNKS, VECTOR_QUANTIZATION,
+    COLLECTION_PROFILE, EMBEDDING_BACKEND, CHUNK_EMBEDDING_STORE_MAX_ENTRIES, CHUNK_EMBEDDING_STORE_MAX_AGE,
+)
+from app.utils.embedding_backends import (
+    BACKEND_OPENAI,
+    EMBEDDING_BACKEND_FIELD,
+    load_embeddings,
+    parse_backend,
+    recorded_backend,
+    supports_truncation,
+)
+from app.utils.embedding_cache import CachedEmbeddings, SQLiteEmbeddingStore
+from app.services.embedding_scheduler import EmbeddingScheduler
 from app.utils.qdrant_client import get_qdrant_client
 from app.utils.logger import logger
-from app.config import QDRANT_URL
+from app.utils.pdf_parser import load_pdf
+from app.utils.semantic_cache import answer_cache
+from app.utils.collection_catalog import collection_catalog
+from app.utils.sparse_encoder import SparseEncoder, SPARSE_VECTOR_NAME
+from app.utils.collection_routing import (
+    CollectionTarget,
+    TENANT_FIELD,
+    collection_target,
+    drop_qdrant_collection,
+    is_shared_collection,
+    resolve_target,
+)
+from app.utils.vector_config import (
+    CollectionLayout,
+    collection_profile,
+    dense_vector_params,
+    sparse_vectors_config,
+    target_dimensions,
+)
 import json
 
+# Number of points sent per Qdrant upsert request
+UPSERT_BATCH_SIZE = 64
+
+# Number of chunks embedded (and reported as progress) per step
+EMBED_BATCH_SIZE = 256
+
+# Number of points read per Qdrant scroll request when diffing a document
+SCROLL_BATCH_SIZE = 1024
+
+# Namespace for deterministic point IDs
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2b7e-4d0a-4c57-9a53-2f0f5d9c8e41")
+
+# Chunk metadata identifying the document a point belongs to within its collection. The key is
+# a stable id chosen when a document is first uploaded and reused by its revisions, so documents
+# that share a filename never share points (records from before keys were stored use the filename)
+DOCUMENT_KEY_FIELD = "document_key"
+
+# Chunk metadata with the uploaded filename, used to label a document's chunks in answers
+FILENAME_FIELD = "filename"
+
+# Chunk metadata that can change without the chunk text changing (e.g. a page inserted before it)
+CHUNK_METADATA_FIELDS = ("page", "page_label")
+
+# Payload indexes created with every collection: re-indexing looks up a document's points by its
+# key, and searches and deletes can filter by source file or page without a full scan
+PAYLOAD_INDEXES = {
+    f"metadata.{DOCUMENT_KEY_FIELD}": models.PayloadSchemaType.KEYWORD,
+    "metadata.source": models.PayloadSchemaType.KEYWORD,
+    "metadata.page": models.PayloadSchemaType.INTEGER,
+}
+
+# Awaited as progress(stage, **counters) while a document is indexed
+ProgressCallback = Callable[..., Awaitable[None]]
+
+@dataclass
+class DocumentPlan:
+    """Changes needed to bring one document's points in Qdrant up to date"""
+    document_key: str
+    document_metadata: dict
+    embedding_backend: str = EMBEDDING_BACKEND
+    has_existing: bool = False
+    new_docs: list = field(default_factory=list)
+    new_ids: List[str] = field(default_factory=list)
+    page_updates: Dict[tuple, List[str]] = field(default_factory=dict)  # chunk metadata -> point IDs
+    stale_ids: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def moved(self) -> int:
+        """Unchanged chunks whose page metadata has to be updated"""
+        return sum(len(point_ids) for point_ids in self.page_updates.values())
+
+
+def document_condition(document_key: str) -> models.FieldCondition:
+    return models.FieldCondition(key=f"metadata.{DOCUMENT_KEY_FIELD}", match=models.MatchValue(value=document_key))
+
+
+def shared_point_id(tenant: str, point_id: str) -> str:
+    """ID of a chunk stored in a shared collection, derived from its per-collection ID.
+
+    Keeps IDs of documents with the same filename in different tenants apart,
+    and lets migrated points keep matching what re-indexing computes.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{tenant}\0{point_id}"))
+
+
+# Per-file outcomes of a bulk ingestion run
+BULK_PENDING = "pending"
+BULK_INDEXED = "indexed"
+BULK_FAILED = "failed"
+BULK_DUPLICATE = "duplicate"  # same content already indexed in the collection
+
+
+@dataclass
+class BulkFileResult:
+    """Outcome of one file in a bulk ingestion run"""
+    filename: str
+    file_path: Path
+    collection_name: str
+    status: str = BULK_PENDING
+    document_count: int = 0
+    chunk_count: int = 0
+    file_size: Optional[int] = None
+    content_hash: Optional[str] = None
+    document_id: Optional[str] = None
+    document_key: Optional[str] = None
+    replaces: Optional[str] = None  # id of the document record this file is a revision of
+    error: Optional[str] = None
+
+
+def new_document_key() -> str:
+    """Key for the points of a newly uploaded document"""
+    return str(uuid.uuid4())
+
+
+def bulk_summary(results: List[BulkFileResult], elapsed_seconds: float) -> dict:
+    """Totals and throughput for a bulk ingestion run"""
+    indexed = [result for result in results if result.status == BULK_INDEXED]
+    duplicates = sum(1 for result in results if result.status == BULK_DUPLICATE)
+    total_chunks = sum(result.chunk_count for result in indexed)
+    elapsed = max(elapsed_seconds, 1e-9)
+    return {
+        "total_files": len(results),
+        "indexed_files": len(indexed),
+        "duplicate_files": duplicates,
+        "failed_files": len(results) - len(indexed) - duplicates,
+        "total_pages": sum(result.document_count for result in indexed),
+        "total_chunks": total_chunks,
+        "elapsed_seconds": round(elapsed_seconds, 3),
+        "files_per_second": round(len(indexed) / elapsed, 3),
+        "chunks_per_second": round(total_chunks / elapsed, 3),
+    }
+
 
 class IndexingService:
-    def __init__(self):
-        self.embedding_model = OpenAIEmbeddings(model="text-embedding-3-large")
+    def __init__(self, qdrant_client: Optional[AsyncQdrantClient] = None):
+        self._qdrant_client = qdrant_client
+        # Chunk embeddings are content-addressed (per backend model) so unchanged chunks are never re-embedded
+        self.chunk_store = SQLiteEmbeddingStore(
+            CHUNK_EMBEDDING_STORE_PATH,
+            max_entries=CHUNK_EMBEDDING_STORE_MAX_ENTRIES,
+            max_age_seconds=CHUNK_EMBEDDING_STORE_MAX_AGE,
+        )
+        self.embedding_scheduler: Optional[EmbeddingScheduler] = None
+        # embedding_model embeds for EMBEDDING_BACKEND; collections recorded with
+        # another backend get their own model from embeddings_for()
+        self.embedding_backend = EMBEDDING_BACKEND
+        self.embedding_model = self._build_embeddings(EMBEDDING_BACKEND)
+        self._backend_models: Dict[str, CachedEmbeddings] = {}
+        self.sparse_encoder = SparseEncoder()
+
+    def _build_embeddings(self, backend: str) -> CachedEmbeddings:
+        if parse_backend(backend)[0] != BACKEND_OPENAI:
+            return CachedEmbeddings(load_embeddings(backend), document_store=self.chunk_store)
+        # Cache misses of every OpenAI model go through one rate-limited scheduler (the
+        # limits are per account), which owns retries (the OpenAI client's own are disabled)
+        embeddings = load_embeddings(backend, max_retries=0)
+        if self.embedding_scheduler is None:
+            self.embedding_scheduler = EmbeddingScheduler(embeddings)
+        return CachedEmbeddings(self.embedding_scheduler.scheduled(embeddings), document_store=self.chunk_store)
+
+    def embeddings_for(self, backend: str):
+        """Embedding model for a backend spec (embedding_model for the default backend)"""
+        if backend == self.embedding_backend:
+            return self.embedding_model
+        if backend not in self._backend_models:
+            self._backend_models[backend] = self._build_embeddings(backend)
+        return self._backend_models[backend]
+
+    async def resolve_backend(self, client: AsyncQdrantClient, target: CollectionTarget,
+                              requested: Optional[str] = None) -> str:
+        """Embedding backend to index into a collection with.
+
+        A collection that already has points keeps the backend they were
+        embedded with (asking for another one is an error); a new one uses
+        the requested backend, or EMBEDDING_BACKEND. In shared mode the
+        backend belongs to the shared collection, so all its tenants match.
+        """
+        if requested:
+            parse_backend(requested)
+        recorded = None
+        if await client.collection_exists(target.physical_name):
+            recorded = await recorded_backend(client, target.physical_name)
+        if recorded and requested and requested != recorded:
+            raise ValueError(
+                f"Collection '{target.name}' is embedded with '{recorded}' and cannot be indexed with '{requested}'"
+            )
+        return recorded or requested or self.embedding_backend
+
+    @property
+    def qdrant_client(self) -> AsyncQdrantClient:
+        """Injected Qdrant client, falling back to the shared application client"""
+        return self._qdrant_client or get_qdrant_client()
+
+    async def process_pdf(self, file_path: Path, filename: str, collection_name: str, 
+                         chunk_size: int = 1000, chunk_overlap: int = 400,
+                         progress: Optional[ProgressCallback] = None,
+                         embedding_backend: Optional[str] = None,
+                         document_key: Optional[str] = None):
+        """Process and index a stored PDF document.
+
+        The PDF is parsed directly from file_path (its final storage location).
+        progress is awaited as progress(stage, **counters) while the document
+        moves through parsing, embedding and upserting.
 
-    async def process_pdf(self, file_content: bytes, filename: str, collection_name: str, 
-                         chunk_size: int = 1000, chunk_overlap: int = 400):
-        """Process and index a PDF document"""
-        temp_pdf_path = UPLOAD_DIR / f"{uuid.uuid4().hex}_{filename}"
+        Point IDs are derived from (document_key, chunk text). Passing the key
+        of a document already in the collection indexes a new revision of it:
+        only the chunks that changed are embedded and upserted, chunks that are
+        gone are deleted and page metadata is updated in place. Re-running the
+        same document is idempotent. Without a key the document is new and
+        gets its own (new_document_key), whatever its filename.
+
+        When indexing fails or is cancelled, the chunks it added are deleted
+        again (a revision keeps the points it had), and a collection it
+        created is dropped when that leaves it empty.
+
+        embedding_backend selects the embeddings of a new collection (see
+        resolve_backend); existing collections keep the one they were built with.
+        """
+        async def report(stage: str, **counters):
+            if progress:
+                await progress(stage, **counters)
+
+        final_collection_name = self.resolve_collection_name(collection_name, filename)
+        document_key = document_key or new_document_key()
+        logger.info(f"Processing PDF: {filename} -> Collection: {final_collection_name}")
         
+        docs, split_docs = await self._load_chunks(file_path, chunk_size, chunk_overlap, report)
+        
+        # DEBUG: Print collection name and document info
+        logger.info(f"Final collection name: {final_collection_name}")
+        logger.info(f"Number of documents to store: {len(split_docs)}")
+        logger.info(f"Sample document metadata: {split_docs[0].metadata if split_docs else 'None'}")
+        
+        client = self.qdrant_client
+        target = await resolve_target(client, final_collection_name)
+        backend = await self.resolve_backend(client, target, embedding_backend)
+        embeddings = self.embeddings_for(backend)
+        plan = await self._plan_document(client, target, document_key, filename, split_docs, backend)
+        await report(
+            "embedding", total_chunks=len(split_docs),
+            chunks_embedded=plan.unchanged, chunks_upserted=plan.unchanged,
+        )
+
+        # Embed (cache misses only) and upsert new chunks batch by batch so progress is observable
+        chunks_embedded = chunks_upserted = plan.unchanged
+        existed = await client.collection_exists(target.physical_name)
         try:
-            # Save file temporarily
-            with open(temp_pdf_path, "wb") as f:
-                f.write(file_content)
-            
-            if collection_name == 'default':
-                final_collection_name = self.sanitize_collection_name(filename)
-            else:
-                final_collection_name = collection_name
-            logger.info(f"Processing PDF: {filename} -> Collection: {final_collection_name}")
-            
-            # Load and process PDF
-            loader = PyPDFLoader(file_path=str(temp_pdf_path))
-            docs = loader.load()
-            
-            if not docs:
-                raise ValueError("No content could be extracted from the PDF.")
-            
-            # Split documents
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size, 
-                chunk_overlap=chunk_overlap
-            )
-            split_docs = text_splitter.split_documents(documents=docs)
-            
-            if not split_docs:
-                raise ValueError("No text chunks could be created from the PDF.")
-            
-            # DEBUG: Print collection name and document info
-            logger.info(f"Final collection name: {final_collection_name}")
-            logger.info(f"Number of documents to store: {len(split_docs)}")
-            logger.info(f"Sample document metadata: {split_docs[0].metadata if split_docs else 'None'}")
-            
-            # RECOMMENDED APPROACH: Use direct client method
-            try:
-                from qdrant_client import QdrantClient
-                client = QdrantClient(url=QDRANT_URL)
-                
-                # Create vector store instance with specific collection
-                vector_store = QdrantVectorStore(
-                    client=client,
-                    collection_name=final_collection_name,
-                    embedding=self.embedding_model,
+            for start in range(0, len(plan.new_docs), EMBED_BATCH_SIZE):
+                batch = plan.new_docs[start:start + EMBED_BATCH_SIZE]
+                vectors = await embeddings.aembed_documents(
+                    [doc.page_content for doc in batch]
                 )
-                
-                # Add documents to the specific collection
-                vector_store.add_documents(documents=split_docs)
-                logger.info(f"Documents added to collection '{final_collection_name}' using direct method")
-                
-            except Exception as e:
-                logger.error(f"Error with direct client approach: {str(e)}")
-                # Fallback to from_documents method
-                logger.info("Falling back to from_documents method")
-                vector_store = QdrantVectorStore.from_documents(
-                    documents=split_docs,
-                    embedding=self.embedding_model,
-                    url=QDRANT_URL,
-                    collection_name=final_collection_name,
-                    force_recreate=False,
+                chunks_embedded += len(batch)
+                await report("embedding", chunks_embedded=chunks_embedded)
+
+                if start == 0:
+                    layout = await self.ensure_collection(
+                        client, target.physical_name, vector_size=len(vectors[0]), shared=target.shared,
+                        embedding_backend=backend,
+                    )
+
+                point_ids = plan.new_ids[start:start + EMBED_BATCH_SIZE]
+                await self._upsert_chunks(
+                    client, target.physical_name, batch,
+                    [layout.fit_vector(vector) for vector in vectors], point_ids, sparse=layout.has_sparse,
                 )
-            
-            logger.info(f"Successfully indexed {len(docs)} pages into {len(split_docs)} chunks in collection '{final_collection_name}'")
-            
-            # Verify the collection was created correctly
-            try:
-                from qdrant_client import QdrantClient
-                client = QdrantClient(url=QDRANT_URL)
-                collections = client.get_collections()
-                collection_names = [col.name for col in collections.collections]
-                logger.info(f"Available collections: {collection_names}")
+                chunks_upserted += len(batch)
+                await report("upserting", chunks_upserted=chunks_upserted)
+
+            await self._apply_plan(client, target, plan)
+        except BaseException:
+            # Also on cancellation: the chunks added so far belong to no document record
+            if plan.new_ids:
+                await self._discard_points(
+                    client, target, models.PointIdsList(points=plan.new_ids), drop_if_empty=not existed
+                )
+            raise
+        logger.info(
+            f"Document '{filename}' in '{final_collection_name}': {len(plan.new_ids)} chunks added, "
+            f"{plan.moved} moved, {len(plan.stale_ids)} removed, {plan.unchanged - plan.moved} unchanged"
+        )
+
+        logger.info(f"Documents added to collection '{final_collection_name}'")
+
+        # Cached answers and point counts no longer reflect the collection contents
+        answer_cache.invalidate(final_collection_name)
+        collection_catalog(client).invalidate()
+        
+        logger.info(f"Successfully indexed {len(docs)} pages into {len(split_docs)} chunks in collection '{final_collection_name}'")
+        
+        # Verify the collection was created correctly
+        try:
+            # Also answers for collections served through an alias (see migrate_collection)
+            if await client.collection_exists(target.physical_name):
+                collection_info = await client.get_collection(target.physical_name)
+                logger.info(f"Collection '{target.physical_name}' has {collection_info.points_count} points")
+            else:
+                logger.warning(f"Collection '{target.physical_name}' not found in available collections!")
                 
-                if final_collection_name in collection_names:
-                    collection_info = client.get_collection(final_collection_name)
-                    logger.info(f"Collection '{final_collection_name}' has {collection_info.points_count} points")
-                else:
-                    logger.warning(f"Collection '{final_collection_name}' not found in available collections!")
-                    
-            except Exception as e:
-                logger.warning(f"Could not verify collection creation: {str(e)}")
-            
-            return final_collection_name, len(docs), len(split_docs)
-            
-        finally:
-            # Clean up temporary file
-            if temp_pdf_path.exists():
+        except Exception as e:
+            logger.warning(f"Could not verify collection creation: {str(e)}")
+        
+        return final_collection_name, len(docs), len(split_docs)
+
+    async def process_many(self, files: List[Tuple[Path, str]], collection_name: Optional[str] = None,
+                           chunk_size: int = 1000, chunk_overlap: int = 400,
+                           max_parallel_files: int = BULK_MAX_PARALLEL_FILES,
+                           window_chunks: int = BULK_EMBED_WINDOW_CHUNKS,
+                           embedding_backend: Optional[str] = None,
+                           document_keys: Optional[List[Optional[str]]] = None) -> List[BulkFileResult]:
+        """Index many stored PDFs, given as (file_path, filename), in one run.
+
+        Files are parsed concurrently on the shared process pool and their
+        chunks pooled into windows of about window_chunks, so embedding
+        requests and Qdrant upserts are batched across files. Like
+        process_pdf, only chunks not already indexed for a document are
+        embedded. A failing file is reported in its result without stopping
+        the others. Collections are not re-verified after every file.
+        embedding_backend applies to new collections, as in process_pdf.
+        document_keys (aligned with files, None entries allowed) index
+        revisions of existing documents; other files get new keys.
+        """
+        document_keys = document_keys or [None] * len(files)
+        results = [
+            BulkFileResult(
+                filename=filename,
+                file_path=file_path,
+                collection_name=self.resolve_collection_name(collection_name, filename),
+                document_key=document_key or new_document_key(),
+            )
+            for (file_path, filename), document_key in zip(files, document_keys)
+        ]
+        client = self.qdrant_client
+        targets = {name: await resolve_target(client, name) for name in {result.collection_name for result in results}}
+        ensured_collections: Dict[str, CollectionLayout] = {}  # physical collection -> layout
+        semaphore = asyncio.Semaphore(max_parallel_files)
+
+        async def no_progress(stage: str, **counters):
+            pass
+
+        async def parse(result: BulkFileResult):
+            async with semaphore:
                 try:
-                    temp_pdf_path.unlink()
-                    logger.info(f"Cleaned up temporary file: {temp_pdf_path}")
+                    docs, split_docs = await self._load_chunks(
+                        result.file_path, chunk_size, chunk_overlap, no_progress, offload=True
+                    )
+                    target = targets[result.collection_name]
+                    backend = await self.resolve_backend(client, target, embedding_backend)
+                    plan = await self._plan_document(
+                        client, target, result.document_key, result.filename, split_docs, backend
+                    )
                 except Exception as e:
-                    logger.warning(f"Failed to clean up temporary file {temp_pdf_path}: {str(e)}")
+                    logger.error(f"Bulk ingestion failed to parse {result.filename}: {str(e)}")
+                    result.status, result.error = BULK_FAILED, str(e)
+                    return result, None
+                result.document_count, result.chunk_count = len(docs), len(split_docs)
+                return result, plan
+
+        tasks = [asyncio.create_task(parse(result)) for result in results]
+        try:
+            # Embed and upsert full windows while the remaining files are still parsing
+            window, window_size = [], 0
+            for parsed in asyncio.as_completed(tasks):
+                result, plan = await parsed
+                if plan is None:
+                    continue
+                window.append((result, plan))
+                window_size += len(plan.new_docs)
+                if window_size >= window_chunks:
+                    await self._index_window(client, window, ensured_collections, targets)
+                    window, window_size = [], 0
+            if window:
+                await self._index_window(client, window, ensured_collections, targets)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        for name in {result.collection_name for result in results if result.status == BULK_INDEXED}:
+            answer_cache.invalidate(name)
+        collection_catalog(client).invalidate()
+
+        indexed = sum(1 for result in results if result.status == BULK_INDEXED)
+        logger.info(f"Bulk ingestion indexed {indexed}/{len(results)} files")
+        return results
+
+    async def _index_window(self, client: AsyncQdrantClient, window, ensured_collections: Dict[str, CollectionLayout],
+                            targets: Dict[str, CollectionTarget]):
+        """Embed the new chunks of several files together and upsert them collection by collection"""
+        try:
+            # Files are embedded together per backend (usually all with the default one)
+            texts_by_backend: Dict[str, List[str]] = {}
+            for _, plan in window:
+                texts_by_backend.setdefault(plan.embedding_backend, []).extend(
+                    doc.page_content for doc in plan.new_docs
+                )
+            vectors_by_backend = {
+                backend: iter(await self.embeddings_for(backend).aembed_documents(texts) if texts else [])
+                for backend, texts in texts_by_backend.items()
+            }
+        except Exception as e:
+            logger.error(f"Bulk ingestion failed to embed {len(window)} files: {str(e)}")
+            for result, _ in window:
+                result.status, result.error = BULK_FAILED, str(e)
+            return
+
+        by_collection: Dict[str, list] = {}
+        for result, plan in window:
+            backend_vectors = vectors_by_backend[plan.embedding_backend]
+            by_collection.setdefault(result.collection_name, []).append(
+                (result, plan, [next(backend_vectors) for _ in plan.new_docs])
+            )
+
+        for name, entries in by_collection.items():
+            target = targets[name]
+            docs = [doc for _, plan, _ in entries for doc in plan.new_docs]
+            point_ids = [point_id for _, plan, _ in entries for point_id in plan.new_ids]
+            doc_vectors = [vector for _, _, file_vectors in entries for vector in file_vectors]
+            try:
+                if docs:
+                    if target.physical_name not in ensured_collections:
+                        ensured_collections[target.physical_name] = await self.ensure_collection(
+                            client, target.physical_name, vector_size=len(doc_vectors[0]), shared=target.shared,
+                            embedding_backend=entries[0][1].embedding_backend,
+                        )
+                    layout = ensured_collections[target.physical_name]
+                    await self._upsert_chunks(
+                        client, target.physical_name, docs, [layout.fit_vector(vector) for vector in doc_vectors],
+                        point_ids, sparse=layout.has_sparse,
+                    )
+                for _, plan, _ in entries:
+                    await self._apply_plan(client, target, plan)
+            except Exception as e:
+                logger.error(f"Bulk ingestion failed to upsert into '{name}': {str(e)}")
+                for result, _, _ in entries:
+                    result.status, result.error = BULK_FAILED, str(e)
+                await self._delete_sources(client, target, [str(result.file_path) for result, _, _ in entries])
+                continue
+
+            for result, _, _ in entries:
+                result.status = BULK_INDEXED
+
+    async def _delete_sources(self, client: AsyncQdrantClient, target: CollectionTarget, sources: List[str]):
+        """Best-effort removal of points already upserted for files that failed"""
+        try:
+            await client.delete(
+                collection_name=target.physical_name,
+                points_selector=models.FilterSelector(
+                    filter=target.filter(
+                        models.FieldCondition(key="metadata.source", match=models.MatchAny(any=sources))
+                    )
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Could not remove partial points from '{target.name}': {str(e)}")
+
+    async def _discard_points(self, client: AsyncQdrantClient, target: CollectionTarget,
+                              points_selector, drop_if_empty: bool):
+        """Best-effort removal of points that will not be recorded as a document.
+
+        With drop_if_empty, a dedicated collection left without points is
+        dropped too (it was created for them).
+        """
+        try:
+            if not await client.collection_exists(target.physical_name):
+                return
+            await client.delete(collection_name=target.physical_name, points_selector=points_selector)
+            if drop_if_empty and not target.shared:
+                if (await client.count(collection_name=target.physical_name, exact=True)).count == 0:
+                    await drop_qdrant_collection(client, target.name)
+                    logger.info(f"Dropped collection '{target.name}' left empty by a discarded document")
+            answer_cache.invalidate(target.name)
+            collection_catalog(client).invalidate()
+        except Exception as e:
+            logger.warning(f"Could not remove discarded points from '{target.name}': {str(e)}")
+
+    async def discard_document(self, collection_name: str, document_key: str):
+        """Remove every point of a document that will not be recorded (a first upload that was
+        cancelled or failed), dropping its dedicated collection when that leaves it empty"""
+        client = self.qdrant_client
+        try:
+            target = await resolve_target(client, collection_name)
+        except Exception as e:
+            logger.warning(f"Could not remove the points of document {document_key}: {str(e)}")
+            return
+        await self._discard_points(
+            client, target, models.FilterSelector(filter=target.filter(document_condition(document_key))),
+            drop_if_empty=True,
+        )
+
+    async def _load_chunks(self, file_path: Path, chunk_size: int, chunk_overlap: int,
+                           report: ProgressCallback, offload: bool = False):
+        """Parse a PDF and split it into chunks, returning (pages, chunks)"""
+        # Parse page ranges in parallel on the process pool (parsing is CPU-bound)
+        await report("parsing")
+        docs = await load_pdf(file_path, offload=offload)
+        
+        if not docs:
+            raise ValueError("No content could be extracted from the PDF.")
+        
+        # Split documents
+        await report("splitting", pages_parsed=len(docs))
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, 
+            chunk_overlap=chunk_overlap
+        )
+        split_docs = await asyncio.to_thread(text_splitter.split_documents, docs)
+        
+        if not split_docs:
+            raise ValueError("No text chunks could be created from the PDF.")
+
+        return docs, split_docs
+
+    async def ensure_collection(self, client: AsyncQdrantClient, collection_name: str, vector_size: int,
+                                shared: bool = False, embedding_backend: Optional[str] = None) -> CollectionLayout:
+        """Create the Qdrant collection if it does not exist and return its layout.
+
+        vector_size is the embedding model's size. The dense vector keeps the
+        unnamed, LangChain-compatible layout, reduced to EMBEDDING_DIMENSIONS
+        (text-embedding-3 backends only; other models keep their size)
+        and quantized per VECTOR_QUANTIZATION for new collections; existing
+        collections keep whatever layout they were created (or migrated) with.
+        The sparse vector is named and Qdrant applies IDF to it at query time.
+        HNSW and on-disk storage follow COLLECTION_PROFILE, and the
+        PAYLOAD_INDEXES are created up front. A shared collection also gets a
+        tenant index and builds its HNSW graphs per tenant instead of globally.
+        """
+        if await client.collection_exists(collection_name):
+            return CollectionLayout.from_info(await client.get_collection(collection_name))
+
+        profile = collection_profile(COLLECTION_PROFILE)
+        if supports_truncation(embedding_backend or self.embedding_backend):
+            vector_size = target_dimensions(vector_size)
+        layout = CollectionLayout(vector_size=vector_size, has_sparse=True, quantization=VECTOR_QUANTIZATION)
+        await client.create_collection(
+            collection_name=collection_name,
+            vectors_config=dense_vector_params(layout.vector_size, layout.quantization, profile.vectors_on_disk),
+            sparse_vectors_config=sparse_vectors_config(),
+            hnsw_config=profile.hnsw_config(per_tenant=shared),
+            on_disk_payload=profile.on_disk_payload,
+        )
+        payload_indexes = dict(PAYLOAD_INDEXES)
+        if shared:
+            # Co-locates each tenant's points on disk and lets Qdrant plan tenant-filtered searches
+            payload_indexes[f"metadata.{TENANT_FIELD}"] = models.KeywordIndexParams(
+                type=models.KeywordIndexType.KEYWORD, is_tenant=True
+            )
+        for field_name, field_schema in payload_indexes.items():
+            await client.create_payload_index(
+                collection_name=collection_name, field_name=field_name, field_schema=field_schema
+            )
+        logger.info(
+            f"Created {'shared ' if shared else ''}collection '{collection_name}' with vector size "
+            f"{layout.vector_size} (profile '{COLLECTION_PROFILE}', "
+            f"embeddings '{embedding_backend or self.embedding_backend}')"
+        )
+        return layout
+
+    def _chunk_ids(self, document_key: str, split_docs, tenant: Optional[str] = None) -> List[str]:
+        """Deterministic point IDs from the document key, the chunk text and its repeat count"""
+        occurrences: Dict[str, int] = {}
+        point_ids = []
+        for doc in split_docs:
+            chunk_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+            occurrence = occurrences.get(chunk_hash, 0)
+            occurrences[chunk_hash] = occurrence + 1
+            point_id = str(uuid.uuid5(POINT_ID_NAMESPACE, f"{document_key}\0{chunk_hash}\0{occurrence}"))
+            point_ids.append(shared_point_id(tenant, point_id) if tenant else point_id)
+        return point_ids
+
+    async def _existing_chunks(self, client: AsyncQdrantClient, target: CollectionTarget, document_key: str) -> Dict[str, tuple]:
+        """Map point ID -> chunk-level metadata for the points a document already has"""
+        if not await client.collection_exists(target.physical_name):
+            return {}
+
+        existing = {}
+        offset = None
+        while True:
+            points, offset = await client.scroll(
+                collection_name=target.physical_name,
+                scroll_filter=target.filter(document_condition(document_key)),
+                with_payload=[f"metadata.{field}" for field in CHUNK_METADATA_FIELDS],
+                with_vectors=False,
+                limit=SCROLL_BATCH_SIZE,
+                offset=offset,
+            )
+            for point in points:
+                metadata = (point.payload or {}).get("metadata", {})
+                existing[str(point.id)] = tuple(metadata.get(field) for field in CHUNK_METADATA_FIELDS)
+            if offset is None:
+                return existing
+
+    async def _plan_document(self, client: AsyncQdrantClient, target: CollectionTarget, document_key: str,
+                             filename: str, split_docs, embedding_backend: str) -> DocumentPlan:
+        """Diff a document's chunks against the points already indexed for it"""
+        for doc in split_docs:
+            doc.metadata[DOCUMENT_KEY_FIELD] = document_key
+            doc.metadata[FILENAME_FIELD] = filename
+            doc.metadata[EMBEDDING_BACKEND_FIELD] = embedding_backend
+            if target.shared:
+                doc.metadata[TENANT_FIELD] = target.tenant
+        point_ids = self._chunk_ids(document_key, split_docs, target.tenant)
+        existing = await self._existing_chunks(client, target, document_key)
+
+        plan = DocumentPlan(
+            document_key=document_key,
+            document_metadata={
+                key: value for key, value in split_docs[0].metadata.items()
+                if key not in CHUNK_METADATA_FIELDS
+            },
+            embedding_backend=embedding_backend,
+            has_existing=bool(existing),
+        )
+        for doc, point_id in zip(split_docs, point_ids):
+            if point_id not in existing:
+                plan.new_docs.append(doc)
+                plan.new_ids.append(point_id)
+                continue
+            plan.unchanged += 1
+            chunk_metadata = tuple(doc.metadata.get(field) for field in CHUNK_METADATA_FIELDS)
+            if existing[point_id] != chunk_metadata:
+                plan.page_updates.setdefault(chunk_metadata, []).append(point_id)
+        plan.stale_ids = list(set(existing) - set(point_ids))
+        return plan
+
+    async def _apply_plan(self, client: AsyncQdrantClient, target: CollectionTarget, plan: DocumentPlan):
+        """Bring the payloads of unchanged chunks up to date and delete chunks that are gone.
+
+        Runs after the new chunks are upserted, so the document is never missing from search.
+        """
+        if not plan.has_existing:
+            return
+
+        collection_name = target.physical_name
+        document_filter = target.filter(document_condition(plan.document_key))
+        # Document-level fields (source, total_pages, ...) are the same for every chunk: one request
+        await client.set_payload(
+            collection_name=collection_name, payload=plan.document_metadata, key="metadata", points=document_filter
+        )
+        if plan.page_updates:
+            await client.batch_update_points(
+                collection_name=collection_name,
+                update_operations=[
+                    models.SetPayloadOperation(set_payload=models.SetPayload(
+                        payload=dict(zip(CHUNK_METADATA_FIELDS, chunk_metadata)), key="metadata", points=point_ids,
+                    ))
+                    for chunk_metadata, point_ids in plan.page_updates.items()
+                ],
+            )
+        if plan.stale_ids:
+            await client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(points=plan.stale_ids),
+            )
+
+    async def _upsert_chunks(self, client: AsyncQdrantClient, collection_name: str, docs, vectors, point_ids,
+                             sparse: bool = False):
+        """Upsert chunk vectors using the page_content/metadata payload layout ChatService reads.
+
+        With sparse, each point also gets its BM25 sparse vector (computed locally).
+        """
+        for start in range(0, len(docs), UPSERT_BATCH_SIZE):
+            batch = docs[start:start + UPSERT_BATCH_SIZE]
+            batch_vectors = vectors[start:start + UPSERT_BATCH_SIZE]
+            if sparse:
+                sparse_vectors = await asyncio.to_thread(
+                    self.sparse_encoder.encode_documents, [doc.page_content for doc in batch]
+                )
+                batch_vectors = [
+                    {"": vector, SPARSE_VECTOR_NAME: sparse_vector}
+                    for vector, sparse_vector in zip(batch_vectors, sparse_vectors)
+                ]
+            points = [
+                models.PointStruct(
+                    id=point_id,
+                    vector=vector,
+                    payload={"page_content": doc.page_content, "metadata": doc.metadata},
+                )
+                for doc, vector, point_id in zip(
+                    batch, batch_vectors, point_ids[start:start + UPSERT_BATCH_SIZE],
+                )
+            ]
+            await client.upsert(collection_name=collection_name, points=points)
+
+    def resolve_collection_name(self, collection_name: Optional[str], filename: str) -> str:
+        """Use the requested collection name, or derive one from the filename"""
+        if not collection_name or collection_name == 'default':
+            return self.sanitize_collection_name(filename)
+        return collection_name
 
     def sanitize_collection_name(self, filename: str) -> str:
         """
@@ -130,30 +732,36 @@ class IndexingService:
         return name
     
     async def list_collections(self):
-        """List all collections in Qdrant"""
-        client = get_qdrant_client()
-        collections = client.get_collections().collections
-        
-        collection_info = []
-        for col in collections:
-            info = client.get_collection(col.name)
-            collection_info.append({
-                "name": col.name,
-                "vectors_count": info.vectors_count or 0
-            })
-        
-        return collection_info
+        """List all logical collections: dedicated Qdrant collections and the tenants of shared ones"""
+        return await collection_catalog(self.qdrant_client).list()
 
     async def delete_collection(self, collection_name: str):
-        """Delete a specific collection"""
-        client = get_qdrant_client()
-        client.delete_collection(collection_name=collection_name)
+        """Delete a specific collection (in shared mode, its points in the shared collection).
+
+        In shared mode, a dedicated collection still holding the collection
+        (see resolve_target) is deleted too, so the tenant copy of a migration
+        does not take its place.
+        """
+        client = self.qdrant_client
+        target = collection_target(collection_name)
+        if not target.shared:
+            await drop_qdrant_collection(client, collection_name)
+        else:
+            if await client.collection_exists(target.physical_name):
+                await client.delete(
+                    collection_name=target.physical_name,
+                    points_selector=models.FilterSelector(filter=target.filter()),
+                )
+            if not is_shared_collection(collection_name) and await client.collection_exists(collection_name):
+                await drop_qdrant_collection(client, collection_name)
+        answer_cache.invalidate(collection_name)
+        collection_catalog(client).invalidate()
         logger.info(f"Deleted collection: {collection_name}")
 
     async def get_collection_info(self, collection_name: str):
         """Get information about a specific collection"""
-        client = get_qdrant_client()
-        info = client.get_collection(collection_name)
+        client = self.qdrant_client
+        info = await client.get_collection(collection_name)
 
         vectors_config = info.config.params["vectors"]  # <- dict
 
@@ -167,15 +775,30 @@ class IndexingService:
         }
     
     async def get_collection_info_robust(self, collection_name: str):
-        """Get full information about a specific collection with robust error handling"""
-        client = get_qdrant_client()
-        info = client.get_collection(collection_name)
+        """Get full information about a specific collection with robust error handling.
+
+        In shared mode this is the shared collection's information with the
+        point counts of the requested tenant.
+        """
+        client = self.qdrant_client
+        target = await resolve_target(client, collection_name)
+        info = await client.get_collection(target.physical_name)
 
         # Convert to dictionary (Qdrant client usually returns Pydantic models / dataclasses)
         if hasattr(info, "dict"):  # If it's a Pydantic model
-            return info.dict()
+            details = info.dict()
         elif hasattr(info, "model_dump"):  # For Pydantic v2
-            return info.model_dump()
+            details = info.model_dump()
         else:
             # As a fallback, cast to str (or jsonable dict if available)
             return json.loads(info.json()) if hasattr(info, "json") else info
+
+        if target.shared:
+            count = (await client.count(
+                collection_name=target.physical_name, count_filter=target.filter(), exact=True
+            )).count
+            if count == 0:
+                raise ValueError(f"Collection '{collection_name}' not found")
+            details.update(points_count=count, vectors_count=count, indexed_vectors_count=None)
+            details["shared_collection"] = target.physical_name
+        return details
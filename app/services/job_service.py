@@ -0,0 +1,250 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import INDEXING_WORKERS, INDEXING_QUEUE_SIZE
+from app.services.bulk_ingestion import bulk_report, ingest_stored_files
+from app.services.dbservices import (
+    DBService,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_COMPLETED,
+    JOB_FAILED,
+    JOB_CANCELLED,
+    JOB_ACTIVE_STATES,
+    JOB_KIND_BULK,
+)
+from app.services.indexing_service import IndexingService, BULK_INDEXED
+from app.services.sample_questions import SampleQuestionService
+from app.utils.logger import logger
+
+
+class JobQueueFullError(Exception):
+    """Raised when the indexing queue has no room for another job"""
+
+
+class IndexingJobManager:
+    """Runs indexing jobs on a bounded pool of background workers.
+
+    Job state lives in the indexing_jobs table, so jobs that were queued or
+    running when the process stopped are picked up again on start(). A job
+    indexes one uploaded file, or (JOB_KIND_BULK) all files of a bulk upload
+    in one bulk ingestion run.
+    """
+
+    def __init__(
+        self,
+        db_service: DBService,
+        indexing_service: IndexingService,
+        max_workers: int = INDEXING_WORKERS,
+        max_queue_size: int = INDEXING_QUEUE_SIZE,
+        sample_questions: Optional[SampleQuestionService] = None,
+    ):
+        self.db_service = db_service
+        self.indexing_service = indexing_service
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        # Generates sample questions for each indexed document in the background
+        self.sample_questions = sample_questions
+        # Unbounded so resumed jobs always fit; submit() enforces max_queue_size for new ones
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def start(self):
+        """Resume unfinished jobs and start the worker pool"""
+        for job in await self.db_service.get_active_jobs():
+            logger.info(f"Resuming indexing job {job.id} ({job.filename}) left in state '{job.status}'")
+            await self.db_service.update_job(job.id, status=JOB_QUEUED, stage=JOB_QUEUED)
+            self.queue.put_nowait(job.id)
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.max_workers)
+        ]
+        logger.info(f"✅ Started {self.max_workers} indexing workers")
+
+    async def stop(self):
+        """Stop the workers; running jobs stay 'running' and resume on next start"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("✅ Indexing workers stopped")
+
+    async def submit(self, **job_fields) -> str:
+        """Create a job record and queue it for processing"""
+        if self.queue.qsize() >= self.max_queue_size:
+            raise JobQueueFullError("Indexing queue is full, try again later")
+
+        job_id = await self.db_service.create_job(**job_fields)
+        self.queue.put_nowait(job_id)
+        return job_id
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it already finished"""
+        job = await self.db_service.get_job(job_id)
+        if job is None or job.status not in JOB_ACTIVE_STATES:
+            return False
+
+        await self.db_service.update_job(job_id, status=JOB_CANCELLED)
+        task = self._running.get(job_id)
+        if task:
+            task.cancel()
+        logger.info(f"Cancelled indexing job {job_id}")
+        return True
+
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Indexing worker {worker_id} failed on job {job_id}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await self.db_service.get_job(job_id)
+        if job is None:
+            return
+        if job.status != JOB_QUEUED:
+            # Cancelled while waiting in the queue
+            self._discard_files(job)
+            return
+
+        task = asyncio.create_task(self._process(job))
+        self._running[job_id] = task
+        try:
+            # asyncio.wait does not raise when the job task is cancelled, only when this worker is
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            self._running.pop(job_id, None)
+
+        if task.cancelled():
+            await self.db_service.update_job(job_id, status=JOB_CANCELLED, stage=JOB_CANCELLED)
+            await self._discard_points(job)
+            self._discard_files(job)
+        elif task.exception() is not None:
+            error = task.exception()
+            logger.error(f"Indexing job {job_id} failed: {str(error)}")
+            await self.db_service.update_job(job_id, status=JOB_FAILED, error=str(error))
+            await self._discard_points(job)
+            self._discard_files(job)
+
+    async def _process(self, job):
+        await self.db_service.update_job(
+            job.id, status=JOB_RUNNING, attempts=job.attempts + 1, error=None
+        )
+        if job.kind == JOB_KIND_BULK:
+            await self._process_bulk(job)
+            return
+
+        async def progress(stage: str, **counters):
+            await self.db_service.update_job(job.id, stage=stage, **counters)
+
+        # The record this upload revises; its stored file is removed once the revision is saved
+        replaced = await self.db_service.get_document_by_id(job.replaces) if job.replaces else None
+        document_key = job.document_key or job.filename
+
+        # Parse straight from the stored upload - no second copy of the file
+        collection_name, doc_count, chunk_count = await self.indexing_service.process_pdf(
+            file_path=Path(job.storage_path),
+            filename=job.filename,
+            collection_name=job.collection_name,
+            chunk_size=job.chunk_size,
+            chunk_overlap=job.chunk_overlap,
+            progress=progress,
+            embedding_backend=job.embedding_backend,
+            document_key=document_key,
+        )
+
+        await progress("saving")
+        document_id = await self.db_service.complete_job(
+            job.id,
+            replaces=job.replaces,
+            document_key=job.document_key,
+            collection_name=collection_name,
+            filename=job.filename,
+            storage_path=job.storage_path,
+            document_count=doc_count,
+            chunk_count=chunk_count,
+            file_size=job.file_size,
+            content_hash=job.content_hash,
+        )
+        if document_id is None:
+            # Cancelled while it was saved: no record, and _run removes the points
+            logger.info(f"Indexing job {job.id} was cancelled before its document was saved")
+            raise asyncio.CancelledError()
+        logger.info(f"Indexing job {job.id} completed: document {document_id}")
+        if replaced and replaced.storage_path != job.storage_path:
+            self._discard_file(replaced.storage_path)
+        if self.sample_questions:
+            self.sample_questions.schedule(document_id, collection_name, document_key)
+
+    async def _process_bulk(self, job):
+        """Index the files of a bulk upload in one run and store the per-file report on the job"""
+        request = json.loads(job.bulk_request)
+        files = request["files"]
+        await self.db_service.update_job(job.id, stage="indexing")
+        results, summary = await ingest_stored_files(
+            self.indexing_service,
+            self.db_service,
+            [(Path(file["storage_path"]), file["filename"], file["file_size"], file["content_hash"]) for file in files],
+            collection_name=job.collection_name or None,
+            chunk_size=job.chunk_size,
+            chunk_overlap=job.chunk_overlap,
+            reindex=request["reindex"],
+            embedding_backend=job.embedding_backend,
+            document_keys=[file["document_key"] for file in files],
+        )
+        report = bulk_report(results, request["rejected"], summary)
+        await self.db_service.update_job(
+            job.id,
+            status=JOB_COMPLETED,
+            stage="done",
+            pages_parsed=summary["total_pages"],
+            total_chunks=summary["total_chunks"],
+            chunks_embedded=summary["total_chunks"],
+            chunks_upserted=summary["total_chunks"],
+            bulk_results=json.dumps(report),
+        )
+        logger.info(f"Bulk indexing job {job.id} completed: {report['message']}")
+        if self.sample_questions:
+            for result in results:
+                if result.status == BULK_INDEXED:
+                    self.sample_questions.schedule(result.document_id, result.collection_name, result.document_key)
+
+    async def _discard_points(self, job):
+        """Remove the points of a first upload that will not produce a document.
+
+        process_pdf already removes what a failed run added; this also covers a
+        job cancelled after indexing finished. A revision keeps its document's
+        points, which the existing record still refers to.
+        """
+        if job.kind == JOB_KIND_BULK or job.replaces or not job.document_key:
+            return
+        await self.indexing_service.discard_document(job.collection_name, job.document_key)
+
+    @classmethod
+    def _discard_files(cls, job):
+        """Remove the stored uploads of a job that will not produce documents"""
+        if job.kind == JOB_KIND_BULK:
+            for file in json.loads(job.bulk_request)["files"]:
+                cls._discard_file(file["storage_path"])
+        else:
+            cls._discard_file(job.storage_path)
+
+    @staticmethod
+    def _discard_file(storage_path: Optional[str]):
+        """Remove the stored upload of a job that will not produce a document"""
+        if storage_path and Path(storage_path).exists():
+            try:
+                Path(storage_path).unlink()
+            except OSError as e:
+                logger.warning(f"Failed to remove {storage_path}: {str(e)}")
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.config import SAMPLE_QUESTION_COUNT, SAMPLE_QUESTION_RETRY_BACKOFF, SAMPLE_QUESTION_RETRY_MAX
+from app.services.dbservices import document_key_of
+from app.utils.logger import logger
+
+
+class SampleQuestionService:
+    """Sample questions per document, generated once in the background and stored on its record.
+
+    Indexing schedules generation for the new document record; reads are
+    served from memory, falling back to the stored questions of the
+    collection's documents (newest first). Questions are only regenerated
+    when a document is re-indexed or on refresh(). A document whose
+    generation failed is not retried by reads for retry_backoff seconds,
+    doubling with each further failure up to retry_max.
+    """
+
+    def __init__(self, db_service, chat_service, count: int = SAMPLE_QUESTION_COUNT,
+                 retry_backoff: float = SAMPLE_QUESTION_RETRY_BACKOFF, retry_max: float = SAMPLE_QUESTION_RETRY_MAX):
+        self.db_service = db_service
+        self.chat_service = chat_service
+        self.count = count
+        self.retry_backoff = retry_backoff
+        self.retry_max = retry_max
+        # Collection name -> questions of its documents, newest first
+        self._questions: Dict[str, List[str]] = {}
+        # Document id -> running generation
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Document id -> (failed generations in a row, monotonic time reads may retry from)
+        self._failures: Dict[str, Tuple[int, float]] = {}
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        """Drop the in-memory questions of a collection (all collections when None)"""
+        if collection_name is None:
+            self._questions.clear()
+        else:
+            self._questions.pop(collection_name, None)
+
+    def schedule(self, document_id: str, collection_name: str, document_key: str) -> asyncio.Task:
+        """Generate a document's questions in the background; one generation per document at a time"""
+        task = self._tasks.get(document_id)
+        if task is None:
+            task = asyncio.create_task(self.generate(document_id, collection_name, document_key))
+            self._tasks[document_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(document_id, None))
+        return task
+
+    async def generate(self, document_id: str, collection_name: str, document_key: str) -> List[str]:
+        """Generate and store a document's questions; failures are logged and retried on a read after a backoff"""
+        try:
+            questions = await self.chat_service.generate_sample_questions(collection_name, document_key, self.count)
+            await self.db_service.set_sample_questions(document_id, questions)
+        except Exception as e:
+            failures = self._failures.get(document_id, (0, 0.0))[0] + 1
+            delay = min(self.retry_backoff * 2 ** (failures - 1), self.retry_max)
+            self._failures[document_id] = (failures, time.monotonic() + delay)
+            logger.warning(
+                f"Sample question generation failed for {collection_name}/{document_key} "
+                f"(retrying after {delay:.0f}s): {str(e)}"
+            )
+            return []
+        self._failures.pop(document_id, None)
+        self.invalidate(collection_name)
+        return questions
+
+    async def get(self, collection_name: str, limit: int = 3) -> List[str]:
+        """Sample questions of a collection, without calling OpenAI once they are stored.
+
+        Documents indexed before questions were stored get theirs generated
+        on first read: the newest is awaited when the collection has no
+        questions at all, the rest run in the background.
+        """
+        questions = self._questions.get(collection_name)
+        if questions is None:
+            documents = await self.db_service.get_documents_by_collection(collection_name)
+            questions = [
+                question for document in documents
+                for question in json.loads(document.sample_questions or "[]")
+            ]
+            missing = [document for document in documents if document.sample_questions is None]
+            now = time.monotonic()
+            tasks = [
+                self.schedule(document.id, collection_name, document_key_of(document)) for document in missing
+                if self._failures.get(document.id, (0, 0.0))[1] <= now
+            ]
+            if tasks and not questions:
+                # Shielded so a client disconnect does not cancel the generation
+                questions = await asyncio.shield(tasks[0])
+            if not missing:
+                self._questions[collection_name] = questions
+        return questions[:limit]
+
+    async def refresh(self, collection_name: str, limit: int = 3) -> List[str]:
+        """Regenerate the questions of every document in a collection"""
+        documents = await self.db_service.get_documents_by_collection(collection_name)
+        await asyncio.gather(*(
+            self.generate(document.id, collection_name, document_key_of(document)) for document in documents
+        ))
+        self.invalidate(collection_name)
+        return await self.get(collection_name, limit)
+
+    async def stop(self):
+        """Cancel generations still running"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def current_sample_questions() -> Optional[SampleQuestionService]:
+    """The application's sample question service (None until startup has created it)"""
+    from app.main import sample_question_service
+    return sample_question_service
@@ -0,0 +1,169 @@
+import asyncio
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from qdrant_client import AsyncQdrantClient
+
+from app.config import COLLECTION_CATALOG_TTL
+from app.utils.embedding_backends import recorded_backend
+from app.utils.collection_routing import (
+    MAX_LISTED_TENANTS,
+    TENANT_FIELD,
+    CollectionTarget,
+    collection_exists,
+    is_shared_collection,
+    qdrant_collections,
+    resolve_target,
+)
+from app.utils.logger import logger
+from app.utils.vector_config import CollectionLayout
+
+
+@dataclass
+class CatalogEntry:
+    """A logical collection as last read from Qdrant"""
+    name: str
+    physical_name: str
+    vectors_count: int
+    layout: CollectionLayout  # vector config and embedding backend of the physical collection
+
+    @property
+    def target(self) -> CollectionTarget:
+        tenant = self.name if is_shared_collection(self.physical_name) else None
+        return CollectionTarget(name=self.name, physical_name=self.physical_name, tenant=tenant)
+
+
+class CollectionCatalog:
+    """In-process snapshot of the logical collections of one Qdrant client.
+
+    Existence checks and listings are answered from memory. A snapshot older
+    than ttl_seconds is still served while a refresh runs in the background;
+    after invalidate() (indexing, deletion, migration) the next read waits
+    for a refresh. A refresh reads every physical collection concurrently.
+    """
+
+    def __init__(self, client: AsyncQdrantClient, ttl_seconds: float = COLLECTION_CATALOG_TTL):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self._entries: Optional[Dict[str, CatalogEntry]] = None
+        self._loaded_at = 0.0
+        # Bumped by invalidate(); a snapshot is current when it was loaded at the latest version
+        self._version = 0
+        self._loaded_version = -1
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def invalidate(self):
+        """Make the next read wait for a fresh snapshot"""
+        self._version += 1
+
+    async def _describe(self, physical_name: str) -> List[CatalogEntry]:
+        if is_shared_collection(physical_name):
+            # One facet request lists every tenant with its point count
+            info, backend, facet = await asyncio.gather(
+                self.client.get_collection(physical_name),
+                recorded_backend(self.client, physical_name),
+                self.client.facet(
+                    collection_name=physical_name, key=f"metadata.{TENANT_FIELD}", limit=MAX_LISTED_TENANTS, exact=True
+                ),
+            )
+            layout = CollectionLayout.from_info(info)
+            layout.embedding_backend = backend
+            return [CatalogEntry(hit.value, physical_name, hit.count, layout) for hit in facet.hits]
+        info, backend = await asyncio.gather(
+            self.client.get_collection(physical_name), recorded_backend(self.client, physical_name)
+        )
+        layout = CollectionLayout.from_info(info)
+        layout.embedding_backend = backend
+        # points_count, like the tenant counts (vectors_count is no longer reported by recent Qdrant servers)
+        return [CatalogEntry(physical_name, physical_name, info.points_count or 0, layout)]
+
+    async def _load(self):
+        version = self._version
+        # Collections rebuilt by migrate_collection are read through their alias, the name the API uses
+        names = list(await qdrant_collections(self.client))
+        described = await asyncio.gather(*(self._describe(name) for name in names), return_exceptions=True)
+        entries = {}
+        for name, result in zip(names, described):
+            if isinstance(result, Exception):
+                # Typically deleted between the two requests
+                logger.warning(f"Collection catalog skipped '{name}': {str(result)}")
+                continue
+            for entry in result:
+                # A dedicated collection wins over a tenant of the same name, as in resolve_target
+                if entry.name not in entries or not is_shared_collection(entry.physical_name):
+                    entries[entry.name] = entry
+        self._entries, self._loaded_at, self._loaded_version = entries, time.monotonic(), version
+
+    def _start_refresh(self) -> asyncio.Task:
+        """One refresh at a time; concurrent readers share it"""
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            self._refresh_task = asyncio.create_task(self._load())
+            self._refresh_task.add_done_callback(self._log_failure)
+        return self._refresh_task
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Collection catalog refresh failed: {str(task.exception())}")
+
+    async def refresh(self):
+        """Wait until the snapshot reflects every invalidation made before this call"""
+        version = self._version
+        while self._loaded_version < version:
+            # Shielded so a cancelled request does not cancel a refresh other readers wait on
+            await asyncio.shield(self._start_refresh())
+
+    async def entries(self) -> Dict[str, CatalogEntry]:
+        if self._entries is None or self._loaded_version != self._version:
+            await self.refresh()
+        elif time.monotonic() - self._loaded_at > self.ttl_seconds:
+            self._start_refresh()
+        return self._entries
+
+    async def get(self, name: str) -> Optional[CatalogEntry]:
+        return (await self.entries()).get(name)
+
+    async def exists(self, name: str) -> bool:
+        """Whether a logical collection exists; only unknown names cost a Qdrant request.
+
+        A collection created by another process since the last refresh is
+        found by the direct check and picked up by the next refresh; the
+        direct check also answers while the catalog cannot be refreshed.
+        """
+        try:
+            if await self.get(name) is not None:
+                return True
+        except Exception as e:
+            logger.warning(f"Collection catalog unavailable, checking '{name}' directly: {str(e)}")
+        if await collection_exists(self.client, name):
+            self.invalidate()
+            return True
+        return False
+
+    async def target(self, name: str) -> CollectionTarget:
+        """Where a logical collection's points live (resolve_target, answered from the snapshot)"""
+        try:
+            entry = await self.get(name)
+            if entry is not None:
+                return entry.target
+        except Exception as e:
+            logger.warning(f"Collection catalog unavailable, resolving '{name}' directly: {str(e)}")
+        return await resolve_target(self.client, name)
+
+    async def list(self) -> List[dict]:
+        """Logical collections with their point counts, as list_collections returns them"""
+        return [{"name": entry.name, "vectors_count": entry.vectors_count} for entry in (await self.entries()).values()]
+
+
+_catalogs: "weakref.WeakKeyDictionary[AsyncQdrantClient, CollectionCatalog]" = weakref.WeakKeyDictionary()
+
+
+def collection_catalog(client: AsyncQdrantClient) -> CollectionCatalog:
+    """The catalog of a Qdrant client (one per client, created on first use)"""
+    catalog = _catalogs.get(client)
+    if catalog is None:
+        catalog = _catalogs[client] = CollectionCatalog(client)
+    return catalog
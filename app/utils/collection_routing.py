@@ -0,0 +1,147 @@
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from qdrant_client import AsyncQdrantClient, models
+
+from app.config import COLLECTION_MODE, SHARED_COLLECTION_NAME, SHARED_COLLECTION_COUNT
+
+COLLECTION_MODE_PER_DOCUMENT = "per-document"
+COLLECTION_MODE_SHARED = "shared"
+
+# Chunk metadata holding the logical collection name of points in a shared collection
+TENANT_FIELD = "tenant"
+
+# Upper bound on tenants listed per shared collection
+MAX_LISTED_TENANTS = 100000
+
+_SHARED_NAME_PATTERN = re.compile(rf"^{re.escape(SHARED_COLLECTION_NAME)}(_\d+)?$")
+
+# A collection rebuilt by migrate_collection lives in a versioned Qdrant collection,
+# <name>__v<n>, and keeps serving <name> through a Qdrant alias. A complete build waiting to
+# take over the name has the alias <name>__next
+VERSION_SEPARATOR = "__v"
+PENDING_ALIAS_SUFFIX = "__next"
+_VERSIONED_NAME_PATTERN = re.compile(rf"^(.+){re.escape(VERSION_SEPARATOR)}(\d+)$")
+
+
+def shared_collection_name(logical_name: str) -> str:
+    """Shared Qdrant collection a logical collection is stored in (stable for a given count)"""
+    if SHARED_COLLECTION_COUNT <= 1:
+        return SHARED_COLLECTION_NAME
+    return f"{SHARED_COLLECTION_NAME}_{zlib.crc32(logical_name.encode('utf-8')) % SHARED_COLLECTION_COUNT}"
+
+
+def is_shared_collection(physical_name: str) -> bool:
+    return bool(_SHARED_NAME_PATTERN.match(physical_name))
+
+
+def versioned_collection_name(name: str, version: int) -> str:
+    return f"{name}{VERSION_SEPARATOR}{version}"
+
+
+def parse_versioned_name(physical_name: str) -> Optional[Tuple[str, int]]:
+    """(collection name, version) of a versioned Qdrant collection, None for other names"""
+    match = _VERSIONED_NAME_PATTERN.match(physical_name)
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+async def collection_aliases(client: AsyncQdrantClient) -> Dict[str, str]:
+    """Alias -> Qdrant collection it points at"""
+    return {alias.alias_name: alias.collection_name for alias in (await client.get_aliases()).aliases}
+
+
+async def qdrant_collections(client: AsyncQdrantClient) -> Dict[str, str]:
+    """Name the API uses -> Qdrant collection, for every Qdrant collection.
+
+    Versioned collections are listed under their alias; one without an alias
+    (being built, or left by an interrupted migration) is not listed.
+    """
+    served = {
+        physical: alias for alias, physical in (await collection_aliases(client)).items()
+        if not alias.endswith(PENDING_ALIAS_SUFFIX)
+    }
+    names = {}
+    for col in (await client.get_collections()).collections:
+        if col.name in served:
+            names[served[col.name]] = col.name
+        elif parse_versioned_name(col.name) is None:
+            names[col.name] = col.name
+    return names
+
+
+async def drop_qdrant_collection(client: AsyncQdrantClient, name: str):
+    """Delete a Qdrant collection by the name the API uses (an alias is resolved; its alias goes with it).
+
+    Versions left by an interrupted migration of the collection are deleted too.
+    """
+    physical = (await collection_aliases(client)).get(name, name)
+    await client.delete_collection(collection_name=physical)
+    for col in (await client.get_collections()).collections:
+        parsed = parse_versioned_name(col.name)
+        if parsed and parsed[0] == name:
+            await client.delete_collection(collection_name=col.name)
+
+
+def tenant_condition(tenant: str) -> models.FieldCondition:
+    return models.FieldCondition(key=f"metadata.{TENANT_FIELD}", match=models.MatchValue(value=tenant))
+
+
+@dataclass(frozen=True)
+class CollectionTarget:
+    """Where the points of a logical collection (the name the API uses) live in Qdrant"""
+    name: str
+    physical_name: str
+    tenant: Optional[str] = None  # set when the points share a collection with other tenants
+
+    @property
+    def shared(self) -> bool:
+        return self.tenant is not None
+
+    def filter(self, *conditions: models.Condition) -> Optional[models.Filter]:
+        """Filter restricting a request to this collection's points, plus any extra conditions"""
+        must = ([tenant_condition(self.tenant)] if self.shared else []) + list(conditions)
+        return models.Filter(must=must) if must else None
+
+
+def collection_target(name: str, mode: Optional[str] = None) -> CollectionTarget:
+    """Resolve a logical collection name under `mode` (default: COLLECTION_MODE)"""
+    mode = mode or COLLECTION_MODE
+    if mode == COLLECTION_MODE_SHARED:
+        return CollectionTarget(name=name, physical_name=shared_collection_name(name), tenant=name)
+    if mode == COLLECTION_MODE_PER_DOCUMENT:
+        return CollectionTarget(name=name, physical_name=name)
+    raise ValueError(
+        f"Unknown collection mode '{mode}', expected '{COLLECTION_MODE_PER_DOCUMENT}' or '{COLLECTION_MODE_SHARED}'"
+    )
+
+
+async def resolve_target(client: AsyncQdrantClient, name: str) -> CollectionTarget:
+    """Where the points of a logical collection live now.
+
+    Under the shared mode, a collection that still has its dedicated Qdrant
+    collection (not migrated yet, or migrated with the source kept) is served
+    and extended from it, so switching COLLECTION_MODE never hides a
+    collection; once migrate_to_shared deletes the source, its tenant takes
+    over. Costs a Qdrant request only under the shared mode.
+    """
+    target = collection_target(name)
+    if target.shared and not is_shared_collection(name) and await client.collection_exists(name):
+        return CollectionTarget(name=name, physical_name=name)
+    return target
+
+
+async def collection_exists(client: AsyncQdrantClient, name: str) -> bool:
+    """Whether a logical collection has been created (shared: whether it has any points)"""
+    try:
+        target = await resolve_target(client, name)
+        if not target.shared:
+            await client.get_collection(target.physical_name)
+            return True
+        result = await client.count(
+            collection_name=target.physical_name, count_filter=target.filter(), exact=True
+        )
+        return result.count > 0
+    except Exception:
+        return False
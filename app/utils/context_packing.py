@@ -0,0 +1,219 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGETS
+from app.utils.logger import logger
+
+# Separator between passages in the prompt context
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+
+# Shortest repeated text treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+# A span cut to fit the budget keeps at least this many tokens, otherwise it is left out
+MIN_PARTIAL_TOKENS = 64
+
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    """Parse "model=tokens,model=tokens" into a dict"""
+    budgets = {}
+    for item in spec.split(","):
+        model, _, tokens = item.partition("=")
+        if model.strip() and tokens.strip():
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+MODEL_CONTEXT_BUDGETS = _parse_budgets(CONTEXT_TOKEN_BUDGETS)
+
+_encodings: Dict[str, object] = {}
+
+
+def context_budget(model: str) -> int:
+    """Context tokens allowed for a chat model"""
+    return MODEL_CONTEXT_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET)
+
+
+def _encoding(model: str):
+    """tiktoken encoding of a chat model (False when tiktoken or its data is unavailable)"""
+    if model not in _encodings:
+        try:
+            import tiktoken
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable for {model}, estimating context tokens: {str(e)}")
+            _encodings[model] = False
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count tokens locally (tiktoken when available, ~4 chars/token otherwise)"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, tokens: int, model: str) -> str:
+    encoding = _encoding(model)
+    if encoding:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+    return text[:tokens * 4]
+
+
+def overlap_length(first: str, second: str) -> int:
+    """Length of the longest end of first that repeats the start of second (0 below MIN_OVERLAP_CHARS)"""
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    # The earliest match is the longest overlap
+    start = first.find(probe)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start = first.find(probe, start + 1)
+    return 0
+
+
+def merge_overlapping(first: str, second: str) -> Optional[str]:
+    """Join two chunks when one contains the other or their ends overlap.
+
+    Chunks split with chunk_overlap repeat up to chunk_overlap characters
+    of their neighbour. Either order is tried and the longer overlap wins,
+    so repetitive text is not joined at a coincidental short match.
+    Returns None when the chunks do not overlap.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    forward, backward = overlap_length(first, second), overlap_length(second, first)
+    if not forward and not backward:
+        return None
+    if forward >= backward:
+        return first + second[forward:]
+    return second + first[backward:]
+
+
+@dataclass
+class _Span:
+    """Text of one or more merged chunks from the same page"""
+    document: Optional[str]
+    page: Optional[int]
+    text: str
+    rank: int  # position of its best chunk in the retrieved order
+
+
+@dataclass
+class PackedContext:
+    """Prompt context built from retrieved chunks, with what packing saved"""
+    text: str
+    tokens: int
+    raw_tokens: int  # tokens of the chunks joined as retrieved
+    chunks: int = 0
+    spans: int = 0
+    duplicates: int = 0
+    omitted: int = 0  # spans cut or left out to fit the budget
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+
+def _label(document: Optional[str], page, label_documents: bool) -> str:
+    page_label = f"page {page}" if page is not None else ""
+    if label_documents:
+        return f"[{', '.join(part for part in (document, page_label) if part)}]"
+    return f"[{page_label}]" if page_label else ""
+
+
+def _add_to_page(spans: List[_Span], piece: _Span):
+    """Merge a chunk into the overlapping spans of its page, or start a new span"""
+    while True:
+        for index, span in enumerate(spans):
+            merged = merge_overlapping(span.text, piece.text)
+            if merged is not None:
+                spans.pop(index)
+                piece = _Span(piece.document, piece.page, merged, min(span.rank, piece.rank))
+                break
+        else:
+            spans.append(piece)
+            return
+
+
+def pack_context(results: List[dict], model: str, label_documents: bool = False,
+                 budget: Optional[int] = None) -> PackedContext:
+    """Assemble the prompt context from formatted search results within a token budget.
+
+    Exact duplicate chunks are dropped and overlapping chunks of the same
+    page are merged into one span. Spans are taken in relevance order while
+    they fit the budget (default: context_budget(model)); the first that
+    does not fit is cut if enough room is left. The chosen spans are then
+    ordered by document (most relevant first) and page. Each span is
+    labelled with its page, and its document when label_documents is set.
+    """
+    budget = budget or context_budget(model)
+    raw_passages = []
+    pages: Dict[tuple, List[_Span]] = {}
+    seen = set()
+    duplicates = 0
+    for rank, result in enumerate(results):
+        text = result.get("page_content") or ""
+        document = result.get("document") or result.get("collection_name")
+        page = result.get("page_number")
+        label = _label(document, page, True) if label_documents else ""
+        raw_passages.append(f"{label}\n{text}" if label else text)
+
+        key = " ".join(text.split())
+        if not key or key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        _add_to_page(
+            pages.setdefault((result.get("collection_name"), document, page), []),
+            _Span(document, page, text, rank),
+        )
+
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR, model)
+    spans = sorted((span for page_spans in pages.values() for span in page_spans), key=lambda span: span.rank)
+    chosen, used, omitted = [], 0, 0
+    for span in spans:
+        label = _label(span.document, span.page, label_documents)
+        passage = f"{label}\n{span.text}" if label else span.text
+        cost = count_tokens(passage, model) + (separator_tokens if chosen else 0)
+        if used + cost <= budget:
+            chosen.append((span, passage))
+            used += cost
+            continue
+        omitted += 1
+        room = budget - used - (separator_tokens if chosen else 0) - count_tokens(label, model) - 2
+        if room >= MIN_PARTIAL_TOKENS:
+            text = truncate_to_tokens(span.text, room, model) + " …"
+            chosen.append((span, f"{label}\n{text}" if label else text))
+            used = budget
+
+    document_rank: Dict[Optional[str], int] = {}
+    for span, _ in chosen:
+        document_rank[span.document] = min(document_rank.get(span.document, span.rank), span.rank)
+    chosen.sort(key=lambda item: (
+        document_rank[item[0].document],
+        not isinstance(item[0].page, int),
+        item[0].page if isinstance(item[0].page, int) else 0,
+        item[0].rank,
+    ))
+
+    text = PASSAGE_SEPARATOR.join(passage for _, passage in chosen)
+    return PackedContext(
+        text=text,
+        tokens=count_tokens(text, model),
+        raw_tokens=count_tokens(PASSAGE_SEPARATOR.join(raw_passages), model),
+        chunks=len(results),
+        spans=len(spans),
+        duplicates=duplicates,
+        omitted=omitted,
+    )
@@ -0,0 +1,171 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from qdrant_client import AsyncQdrantClient
+
+from app.config import (
+    LOCAL_EMBEDDING_BATCH_SIZE,
+    LOCAL_EMBEDDING_MAX_LENGTH,
+    LOCAL_EMBEDDING_MODELS_DIR,
+    LOCAL_EMBEDDING_THREADS,
+)
+
+BACKEND_OPENAI = "openai"
+BACKEND_ONNX = "onnx"
+
+# Chunk metadata recording the backend a point was embedded with
+EMBEDDING_BACKEND_FIELD = "embedding_backend"
+
+# Points indexed before backends were recorded were all embedded with this
+LEGACY_EMBEDDING_BACKEND = "openai:text-embedding-3-large"
+
+
+def parse_backend(spec: str) -> Tuple[str, str]:
+    """Split a backend spec '<kind>:<model>' into (kind, model), validating the kind"""
+    kind, _, model = spec.partition(":")
+    if kind not in _FACTORIES or not model:
+        raise ValueError(
+            f"Unknown embedding backend '{spec}', expected one of "
+            + ", ".join(f"'{name}:<model>'" for name in _FACTORIES)
+        )
+    return kind, model
+
+
+def supports_truncation(spec: str) -> bool:
+    """Whether prefixes of the backend's vectors are valid embeddings (text-embedding-3 only)"""
+    kind, model = parse_backend(spec)
+    return kind == BACKEND_OPENAI and model.startswith("text-embedding-3")
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-embedding model exported to ONNX, run locally on CPU (optional dependency).
+
+    The model directory holds model.onnx and the tokenizer.json of a
+    BERT-style encoder (e.g. bge-small-en-v1.5, all-MiniLM-L6-v2). Texts are
+    sorted by length and embedded in batches of batch_size, so little work
+    is spent on padding; batches run concurrently on a thread pool
+    (onnxruntime releases the GIL) with the CPU cores split between them.
+    Vectors are mean-pooled over the tokens and L2-normalised.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+                 threads: int = LOCAL_EMBEDDING_THREADS, max_length: int = LOCAL_EMBEDDING_MAX_LENGTH,
+                 models_dir: Path = LOCAL_EMBEDDING_MODELS_DIR):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model = f"{BACKEND_ONNX}:{model_name}"
+        self.batch_size = batch_size
+        model_dir = Path(models_dir) / model_name
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // threads)
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / "model.onnx"), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="onnx-embed")
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.asarray([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+        token_states = self.session.run(None, feeds)[0]
+
+        mask = feeds["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_states * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.where(norms == 0, 1, norms)
+
+    def _batches(self, texts: List[str]) -> List[List[int]]:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        return [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+
+    @staticmethod
+    def _reorder(count: int, batches: List[List[int]], results) -> List[List[float]]:
+        vectors: List[Optional[List[float]]] = [None] * count
+        for indices, batch_vectors in zip(batches, results):
+            for index, vector in zip(indices, batch_vectors):
+                vectors[index] = vector.tolist()
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self._batches(texts)
+        results = self.executor.map(lambda indices: self._embed_batch([texts[i] for i in indices]), batches)
+        return self._reorder(len(texts), batches, results)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        batches = self._batches(texts)
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, self._embed_batch, [texts[i] for i in indices])
+            for indices in batches
+        ))
+        return self._reorder(len(texts), batches, results)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vectors = await asyncio.get_running_loop().run_in_executor(self.executor, self._embed_batch, [text])
+        return vectors[0].tolist()
+
+
+def _openai_embeddings(model: str, **options) -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model, **options)
+
+
+def _onnx_embeddings(model: str, **options) -> Embeddings:
+    # OpenAI client options (max_retries) do not apply to local models
+    return OnnxEmbeddings(model)
+
+
+# Backend kind -> factory(model, **options); register_backend adds more
+_FACTORIES: Dict[str, Callable[..., Embeddings]] = {
+    BACKEND_OPENAI: _openai_embeddings,
+    BACKEND_ONNX: _onnx_embeddings,
+}
+
+
+def register_backend(kind: str, factory: Callable[..., Embeddings]):
+    """Make '<kind>:<model>' specs build embeddings with factory(model, **options)"""
+    _FACTORIES[kind] = factory
+
+
+def load_embeddings(spec: str, **options) -> Embeddings:
+    """Build the embeddings for a backend spec such as 'openai:text-embedding-3-large' or 'onnx:bge-small-en-v1.5'.
+
+    options are passed to the factory (e.g. max_retries for OpenAI).
+    """
+    kind, model = parse_backend(spec)
+    return _FACTORIES[kind](model, **options)
+
+
+async def recorded_backend(client: AsyncQdrantClient, collection_name: str) -> Optional[str]:
+    """Backend the points of a Qdrant collection were embedded with; None while it has no points"""
+    points, _ = await client.scroll(
+        collection_name=collection_name,
+        limit=1,
+        with_payload=[f"metadata.{EMBEDDING_BACKEND_FIELD}"],
+        with_vectors=False,
+    )
+    if not points:
+        return None
+    metadata = (points[0].payload or {}).get("metadata") or {}
+    return metadata.get(EMBEDDING_BACKEND_FIELD) or LEGACY_EMBEDDING_BACKEND
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.utils.logger import logger
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different queries share a cache entry"""
+    return " ".join(text.split()).lower()
+
+
+class SQLiteEmbeddingStore:
+    """Persistent key -> vector store backed by a single SQLite file.
+
+    Entries older than max_age_seconds, and the oldest entries beyond
+    max_entries, are pruned when the store opens and after every
+    prune_every writes (None: no limit).
+    """
+
+    def __init__(self, path: Path, max_entries: Optional[int] = None, max_age_seconds: Optional[float] = None,
+                 prune_every: int = 1000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.prune_every = prune_every
+        self._writes_since_prune = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_created_at ON embeddings (created_at)")
+        self._conn.commit()
+        self.prune()
+
+    def prune(self) -> int:
+        """Delete expired entries, then the oldest ones over max_entries; returns how many were removed"""
+        removed = 0
+        with self._lock:
+            if self.max_age_seconds is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+                ).rowcount
+            if self.max_entries is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+            self._writes_since_prune = 0
+        if removed:
+            logger.info(f"Pruned {removed} entries from embedding store {self.path.name}")
+        return removed
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Fetch the stored vectors for the given keys (missing keys are omitted)"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors, replacing existing entries with the same key"""
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+            self._writes_since_prune += len(rows)
+            due = self._writes_since_prune >= self.prune_every
+        if due and (self.max_entries is not None or self.max_age_seconds is not None):
+            self.prune()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that caches query vectors in a bounded LRU with TTL,
+    optionally backed by a persistent on-disk tier.
+
+    When a document store is given, document (chunk) embeddings are
+    content-addressed by hash(model, exact text) so only unseen chunks are
+    sent to the underlying model.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        namespace: Optional[str] = None,
+        max_size: int = 2048,
+        ttl_seconds: float = 86400,
+        disk_store: Optional[SQLiteEmbeddingStore] = None,
+        document_store: Optional[SQLiteEmbeddingStore] = None,
+    ):
+        self.embeddings = embeddings
+        # Vectors are only interchangeable within one model, so the model is part of the key
+        self.namespace = namespace or getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.disk_store = disk_store
+        self.document_store = document_store
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.document_hits = 0
+        self.document_misses = 0
+
+    def cache_key(self, text: str) -> str:
+        """Cache key for a text: hash of the model namespace and the normalized text"""
+        return hashlib.sha256(f"{self.namespace}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def document_key(self, text: str) -> str:
+        """Content address for a chunk: hash of the model namespace and the exact text"""
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at < time.monotonic():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+
+    def _memory_put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        if self.disk_store is None:
+            return None
+        vector = self.disk_store.get_many([key]).get(key)
+        if vector is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._memory_put(key, vector)
+        return vector
+
+    def _store(self, key: str, vector: List[float]):
+        self._memory_put(key, vector)
+        if self.disk_store is not None:
+            self.disk_store.put_many({key: vector})
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        vector = self._memory_get(key) or self._disk_get(key)
+        if vector is not None:
+            return vector
+
+        with self._lock:
+            self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        vector = self._memory_get(key)
+        if vector is not None:
+            return vector
+
+        # Concurrent requests for the same text share one lookup / embedding call
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            vector = await asyncio.to_thread(self._disk_get, key)
+            if vector is None:
+                with self._lock:
+                    self.misses += 1
+                vector = await self.embeddings.aembed_query(text)
+                await asyncio.to_thread(self._store, key, vector)
+            future.set_result(vector)
+            return vector
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting on it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _split_cached(self, texts: List[str]):
+        """Look texts up in the document store; return (keys, found vectors, texts to embed)"""
+        keys = [self.document_key(text) for text in texts]
+        found = self.document_store.get_many(keys)
+        # Identical chunks (e.g. repeated headers) are embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        with self._lock:
+            self.document_hits += len(texts) - sum(1 for key in keys if key not in found)
+            self.document_misses += len(missing)
+        return keys, found, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.document_store is None:
+            return self.embeddings.embed_documents(texts)
+
+        keys, found, missing = self._split_cached(texts)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            self.document_store.put_many(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.document_store is None:
+            return await self.embeddings.aembed_documents(texts)
+
+        keys, found, missing = await asyncio.to_thread(self._split_cached, texts)
+        if missing:
+            logger.info(f"Embedding {len(missing)} of {len(texts)} chunks (rest served from the embedding store)")
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self.document_store.put_many, new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    def stats(self) -> dict:
+        """Hit/miss counters for the query cache"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "size": len(self._memory),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_tier": str(self.disk_store.path) if self.disk_store else None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "document_store": str(self.document_store.path) if self.document_store else None,
+                "document_hits": self.document_hits,
+                "document_misses": self.document_misses,
+            }
+
+    def clear(self):
+        """Drop all in-memory entries and reset the counters"""
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+        logger.info(f"Cleared embedding cache for {self.namespace}")
@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.config import UPLOAD_CHUNK_SIZE, FILE_STORAGE_DIR
+from app.utils.logger import logger
+
+
+class FileTooLargeError(ValueError):
+    """Raised when an uploaded file exceeds the configured size limit"""
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when a whole upload request exceeds its size limit"""
+
+
+class InvalidUploadError(ValueError):
+    """Raised when an upload request is not a well-formed upload of the expected files"""
+
+
+def unique_storage_path(filename: str, storage_dir: Path = FILE_STORAGE_DIR) -> Path:
+    """Unique path in the storage directory, so files with the same name never collide"""
+    timestamp = datetime.now().strftime("%Y%m%d")
+    name = Path(filename)
+    return storage_dir / f"{name.stem}_{timestamp}_{uuid.uuid4().hex[:8]}{name.suffix}"
+
+
+@dataclass
+class ReceivedUpload:
+    """A file part of an upload request, streamed into storage (or rejected)"""
+    filename: str
+    path: Optional[Path] = None  # None when rejected
+    size: int = 0
+    content_hash: Optional[str] = None  # hex sha256
+    error: Optional[str] = None
+
+
+def _decode_filename(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+class _PartWriter:
+    """Streams one file part to a .part file, enforcing the size limit and hashing as it goes"""
+
+    def __init__(self, upload: ReceivedUpload, destination: Path, max_size: int):
+        self.upload = upload
+        self.destination = destination
+        self.partial_path = destination.with_name(destination.name + ".part")
+        self.max_size = max_size
+        self.digest = hashlib.sha256()
+        self.out = open(self.partial_path, "wb")
+
+    async def write(self, data: bytes):
+        self.upload.size += len(data)
+        if self.upload.size > self.max_size:
+            raise FileTooLargeError(f"File size exceeds {self.max_size / (1024*1024):.1f} MB limit.")
+        self.digest.update(data)
+        await asyncio.to_thread(self.out.write, data)
+
+    async def finish(self):
+        self.out.close()
+        await asyncio.to_thread(self.partial_path.replace, self.destination)
+        self.upload.path, self.upload.content_hash = self.destination, self.digest.hexdigest()
+        logger.info(f"Streamed {self.upload.size} bytes to {self.destination}")
+
+    def discard(self):
+        self.out.close()
+        if self.partial_path.exists():
+            self.partial_path.unlink()
+
+
+async def receive_uploads(
+    request: Request,
+    field_name: str,
+    max_size: int,
+    max_body_size: int,
+    storage_dir: Path = FILE_STORAGE_DIR,
+    suffix: str = ".pdf",
+    stop_on_error: bool = False,
+) -> List[ReceivedUpload]:
+    """Stream the files of a multipart/form-data request straight into storage.
+
+    The request body is parsed as it arrives, without Starlette spooling the
+    files first, so each file is written once: to a .part file in
+    storage_dir, renamed into place when complete. A body whose
+    Content-Length exceeds max_body_size is rejected before anything is read
+    (UploadTooLargeError, also raised once a body without a length goes over
+    it). Files of field_name are checked as they stream: one without the
+    suffix or over max_size is rejected and its data dropped, or, with
+    stop_on_error, raises FileTooLargeError / InvalidUploadError at once.
+    Returns the files in request order; on error, nothing stays stored.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body_size:
+        raise UploadTooLargeError(f"Upload exceeds {max_body_size / (1024*1024):.1f} MB limit.")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise InvalidUploadError("Expected a multipart/form-data upload.")
+
+    # The parser runs synchronously inside write(); its events are handled (and awaited) after each chunk
+    events: List[Tuple[str, bytes]] = []
+    callbacks = {
+        "on_part_begin": lambda: events.append(("part_begin", b"")),
+        "on_header_field": lambda data, start, end: events.append(("header_field", data[start:end])),
+        "on_header_value": lambda data, start, end: events.append(("header_value", data[start:end])),
+        "on_header_end": lambda: events.append(("header_end", b"")),
+        "on_headers_finished": lambda: events.append(("headers_finished", b"")),
+        "on_part_data": lambda data, start, end: events.append(("part_data", data[start:end])),
+        "on_part_end": lambda: events.append(("part_end", b"")),
+    }
+    parser = MultipartParser(params[b"boundary"], callbacks)
+
+    uploads: List[ReceivedUpload] = []
+    writer: Optional[_PartWriter] = None
+    header_field, header_value, disposition = b"", b"", b""
+    received = 0
+
+    async def handle(kind: str, data: bytes):
+        nonlocal writer, header_field, header_value, disposition
+        if kind == "part_begin":
+            header_field, header_value, disposition = b"", b"", b""
+        elif kind == "header_field":
+            header_field += data
+        elif kind == "header_value":
+            header_value += data
+        elif kind == "header_end":
+            if header_field.lower() == b"content-disposition":
+                disposition = header_value
+            header_field, header_value = b"", b""
+        elif kind == "headers_finished":
+            _, options = parse_options_header(disposition)
+            if options.get(b"name", b"").decode("latin-1") != field_name or b"filename" not in options:
+                return
+            upload = ReceivedUpload(filename=_decode_filename(options[b"filename"]))
+            uploads.append(upload)
+            if not upload.filename.lower().endswith(suffix):
+                upload.error = f"Only {suffix[1:].upper()} files are allowed."
+                if stop_on_error:
+                    raise InvalidUploadError(upload.error)
+                return
+            writer = _PartWriter(upload, unique_storage_path(upload.filename, storage_dir), max_size)
+        elif kind == "part_data" and writer:
+            try:
+                await writer.write(data)
+            except FileTooLargeError as e:
+                writer.discard()
+                writer.upload.error, writer = str(e), None
+                if stop_on_error:
+                    raise
+        elif kind == "part_end" and writer:
+            await writer.finish()
+            writer = None
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_body_size:
+                raise UploadTooLargeError(f"Upload exceeds {max_body_size / (1024*1024):.1f} MB limit.")
+            parser.write(chunk)
+            for kind, data in events:
+                await handle(kind, data)
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        if writer:
+            writer.discard()
+        for upload in uploads:
+            if upload.path and upload.path.exists():
+                upload.path.unlink()
+        raise
+    if writer:
+        # Body ended inside a file part
+        writer.discard()
+        raise InvalidUploadError("Upload ended before the file was complete.")
+    return uploads
+
+
+def _copy_and_hash(source: Path, destination: Path) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(source, "rb") as src, open(destination, "wb") as out:
+        while True:
+            chunk = src.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+            out.write(chunk)
+    return size, digest.hexdigest()
+
+
+async def copy_to_storage(source: Path, destination: Path) -> Tuple[int, str]:
+    """Copy a local file into storage, hashing it on the way. Returns (size, hex sha256)"""
+    partial_path = destination.with_name(destination.name + ".part")
+    try:
+        size, content_hash = await asyncio.to_thread(_copy_and_hash, source, partial_path)
+        await asyncio.to_thread(partial_path.replace, destination)
+    except BaseException:
+        if partial_path.exists():
+            partial_path.unlink()
+        raise
+    return size, content_hash
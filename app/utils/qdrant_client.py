@@ -1,12 +1,72 @@
-from qdrant_client import QdrantClient
-from app.config import QDRANT_URL
+from typing import Optional
+import httpx
+from qdrant_client import AsyncQdrantClient
+from app.config import (
+    QDRANT_URL,
+    QDRANT_PREFER_GRPC,
+    QDRANT_GRPC_PORT,
+    QDRANT_TIMEOUT,
+    QDRANT_MAX_CONNECTIONS,
+    QDRANT_MAX_KEEPALIVE_CONNECTIONS,
+    QDRANT_KEEPALIVE_EXPIRY,
+    QDRANT_GRPC_KEEPALIVE_MS,
+)
 from app.utils.logger import logger
 
-def get_qdrant_client() -> QdrantClient:
-    """Get a configured Qdrant client instance"""
+# Shared client instance - created in the FastAPI lifespan
+_qdrant_client: Optional[AsyncQdrantClient] = None
+
+
+def create_qdrant_client() -> AsyncQdrantClient:
+    """Create an async Qdrant client with pooled, keep-alive connections"""
     try:
-        client = QdrantClient(url=QDRANT_URL)
+        client = AsyncQdrantClient(
+            url=QDRANT_URL,
+            prefer_grpc=QDRANT_PREFER_GRPC,
+            grpc_port=QDRANT_GRPC_PORT,
+            timeout=QDRANT_TIMEOUT,
+            # REST: reuse connections instead of qdrant-client's no-keep-alive default
+            limits=httpx.Limits(
+                max_connections=QDRANT_MAX_CONNECTIONS,
+                max_keepalive_connections=QDRANT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=QDRANT_KEEPALIVE_EXPIRY,
+            ),
+            # gRPC: keep the HTTP/2 channel warm between requests
+            grpc_options={
+                "grpc.keepalive_time_ms": QDRANT_GRPC_KEEPALIVE_MS,
+                "grpc.keepalive_timeout_ms": 10000,
+                "grpc.keepalive_permit_without_calls": 1,
+                "grpc.http2.max_pings_without_data": 0,
+            },
+        )
+        logger.info(f"Created Qdrant client for {QDRANT_URL} (gRPC: {QDRANT_PREFER_GRPC})")
         return client
     except Exception as e:
         logger.error(f"Failed to create Qdrant client: {str(e)}")
         raise
+
+
+async def init_qdrant_client() -> AsyncQdrantClient:
+    """Create the shared Qdrant client (called from the application lifespan)"""
+    global _qdrant_client
+    if _qdrant_client is None:
+        _qdrant_client = create_qdrant_client()
+    return _qdrant_client
+
+
+async def close_qdrant_client():
+    """Close the shared Qdrant client and its connection pool"""
+    global _qdrant_client
+    if _qdrant_client is not None:
+        await _qdrant_client.close()
+        _qdrant_client = None
+        logger.info("✅ Qdrant connections closed")
+
+
+def get_qdrant_client() -> AsyncQdrantClient:
+    """Get the shared Qdrant client instance (usable as a FastAPI dependency)"""
+    global _qdrant_client
+    if _qdrant_client is None:
+        # Lazily created when running outside the lifespan (scripts, tests)
+        _qdrant_client = create_qdrant_client()
+    return _qdrant_client
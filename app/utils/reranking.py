@@ -0,0 +1,110 @@
+import asyncio
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.utils.logger import logger
+from app.utils.sparse_encoder import tokenize
+
+
+def mmr_select(relevance: Sequence[float], vectors: Optional[np.ndarray], k: int, diversity: float) -> List[int]:
+    """Pick k candidate indices by maximal marginal relevance.
+
+    relevance is any per-candidate score (higher is better) and is min-max
+    scaled, so vector, fused and reranker scores all work. diversity=0 keeps
+    relevance order; higher values penalise candidates similar (cosine of
+    vectors) to ones already picked.
+    """
+    count = len(relevance)
+    if count == 0:
+        return []
+    if diversity <= 0 or vectors is None or count <= 1:
+        return sorted(range(count), key=lambda i: -relevance[i])[:k]
+
+    scores = np.asarray(relevance, dtype=np.float32)
+    spread = scores.max() - scores.min()
+    scores = (scores - scores.min()) / spread if spread else np.ones_like(scores)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1, norms)
+    similarity = unit @ unit.T
+
+    selected = [int(np.argmax(scores))]
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < min(k, count):
+        mmr = (1 - diversity) * scores - diversity * max_similarity
+        mmr[selected] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
+
+
+class Reranker:
+    """Scores (query, passage) pairs locally; higher is more relevant.
+
+    score() runs in a worker thread, so implementations may be CPU-bound.
+    """
+
+    name = "reranker"
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        raise NotImplementedError
+
+
+class LexicalReranker(Reranker):
+    """Dependency-free reranker: fraction of query terms found in the passage"""
+
+    name = "lexical"
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        terms = set(tokenize(query))
+        if not terms:
+            return [0.0] * len(passages)
+        return [len(terms & set(tokenize(passage))) / len(terms) for passage in passages]
+
+
+class CrossEncoderReranker(Reranker):
+    """sentence-transformers cross-encoder on CPU (optional dependency)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+        self.name = f"cross-encoder:{model_name}"
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        return [float(score) for score in self.model.predict([(query, passage) for passage in passages])]
+
+
+def load_reranker(spec: str) -> Optional[Reranker]:
+    """Build the reranker named by RERANKER: '', 'lexical' or 'cross-encoder:<model>'"""
+    if not spec:
+        return None
+    if spec == "lexical":
+        return LexicalReranker()
+    if spec.startswith("cross-encoder:"):
+        try:
+            return CrossEncoderReranker(spec.split(":", 1)[1])
+        except Exception as e:
+            logger.warning(f"Reranker '{spec}' unavailable, reranking disabled: {str(e)}")
+            return None
+    logger.warning(f"Unknown reranker '{spec}', reranking disabled")
+    return None
+
+
+async def rerank_within_budget(reranker: Reranker, query: str, passages: List[str],
+                               budget_seconds: float) -> Optional[List[float]]:
+    """Reranker scores, or None if the reranker fails or exceeds its latency budget.
+
+    A reranker that overruns is not interrupted (threads cannot be); its
+    late result is simply discarded.
+    """
+    try:
+        return await asyncio.wait_for(
+            asyncio.to_thread(reranker.score, query, passages), timeout=budget_seconds
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Reranker {reranker.name} exceeded {budget_seconds * 1000:.0f} ms, using vector order")
+    except Exception as e:
+        logger.warning(f"Reranker {reranker.name} failed, using vector order: {str(e)}")
+    return None
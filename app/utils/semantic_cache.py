@@ -0,0 +1,173 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+)
+from app.utils.logger import logger
+
+
+# Joins the names of a multi-collection query into one cache key
+COLLECTION_KEY_SEPARATOR = "\x1f"
+
+
+def collections_key(collection_names: List[str]) -> str:
+    """Cache key for a query over one or several collections (order-insensitive)"""
+    return COLLECTION_KEY_SEPARATOR.join(sorted(set(collection_names)))
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray
+    model: str
+    max_results: int
+    answer: str
+    search_results: List[dict]
+    options: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+    last_hit: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """Answer cache keyed by collection and query-vector similarity.
+
+    A new query is served from cache when its embedding is within the cosine
+    similarity threshold of a previous query on the same collection, model,
+    result count and retrieval options.
+
+    Each collection has a generation, bumped by invalidate(). Callers read
+    generation() when they look a query up and pass it to store(), so an
+    answer computed while its collections were re-indexed is not cached.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries_per_collection: int = 500,
+        enabled: bool = True,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_collection = max_entries_per_collection
+        self.enabled = enabled
+
+        self._entries: Dict[str, List[CachedAnswer]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _generation(self, collection_name: str) -> Tuple[int, ...]:
+        return tuple(self._generations.get(name, 0) for name in collection_name.split(COLLECTION_KEY_SEPARATOR))
+
+    def generation(self, collection_name: str) -> Tuple[int, ...]:
+        """Current generation of a cache key (one counter per collection it names)"""
+        with self._lock:
+            return self._generation(collection_name)
+
+    def lookup(self, collection_name: str, vector, model: str, max_results: int,
+               options: str = "") -> Optional[CachedAnswer]:
+        """Return the closest cached answer above the similarity threshold, if any"""
+        if not self.enabled:
+            return None
+
+        query = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            entries = [
+                entry for entry in self._entries.get(collection_name, [])
+                if now - entry.created_at < self.ttl_seconds
+            ]
+            self._entries[collection_name] = entries
+
+            candidates = [
+                entry for entry in entries
+                if entry.model == model and entry.max_results == max_results and entry.options == options
+                and entry.vector.shape == query.shape
+            ]
+            if candidates:
+                similarities = np.stack([entry.vector for entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = candidates[best]
+                    entry.last_hit = now
+                    self.hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def store(self, collection_name: str, vector, model: str, max_results: int,
+              answer: str, search_results: List[dict], options: str = "",
+              generation: Optional[Tuple[int, ...]] = None):
+        """Cache an answer for a query vector.
+
+        generation is the one read at lookup; the answer is dropped when a
+        collection has been invalidated since.
+        """
+        if not self.enabled or not answer:
+            return
+
+        entry = CachedAnswer(
+            vector=self._unit(vector),
+            model=model,
+            max_results=max_results,
+            answer=answer,
+            search_results=search_results,
+            options=options,
+        )
+        with self._lock:
+            if generation is not None and generation != self._generation(collection_name):
+                logger.info(f"Not caching an answer for '{collection_name}': invalidated while it was generated")
+                return
+            entries = self._entries.setdefault(collection_name, [])
+            entries.append(entry)
+            if len(entries) > self.max_entries_per_collection:
+                # Evict the least recently used entry
+                entries.remove(min(entries, key=lambda e: e.last_hit))
+
+    def invalidate(self, collection_name: str):
+        """Drop all cached answers involving a collection (re-indexed or deleted)"""
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            keys = [key for key in self._entries if collection_name in key.split(COLLECTION_KEY_SEPARATOR)]
+            removed = sum(len(self._entries.pop(key)) for key in keys)
+        if removed:
+            logger.info(f"Invalidated {removed} cached answers for collection '{collection_name}'")
+
+    def stats(self) -> dict:
+        """Hit/miss counters for the answer cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "collections": len(self._entries),
+                "entries": sum(len(entries) for entries in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Shared by ChatService (lookup/store) and IndexingService (invalidation)
+answer_cache = SemanticAnswerCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL,
+    max_entries_per_collection=SEMANTIC_CACHE_MAX_ENTRIES,
+    enabled=SEMANTIC_CACHE_ENABLED,
+)
@@ -0,0 +1,79 @@
+import re
+import zlib
+from collections import Counter
+from typing import List
+
+from qdrant_client import models
+
+from app.config import SPARSE_BM25_K1, SPARSE_BM25_B, SPARSE_AVG_DOC_TOKENS
+
+# Name of the sparse vector in collections created by IndexingService (the dense vector stays unnamed)
+SPARSE_VECTOR_NAME = "bm25"
+
+# Words, numbers and compound codes such as "E-1042", "PN_7731-B" or "v2.3.1"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_PATTERN = re.compile(r"[-_./]")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i if in is it its of on or "
+    "that the this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms; compound codes are kept whole and also split into their parts"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = _SPLIT_PATTERN.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part not in _STOPWORDS)
+    return tokens
+
+
+def token_index(token: str) -> int:
+    """Stable sparse dimension for a term (no vocabulary to store or ship)"""
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def collection_has_sparse(collection_info) -> bool:
+    """Whether a collection stores the BM25 sparse vector (collections created before it did not)"""
+    return SPARSE_VECTOR_NAME in (collection_info.config.params.sparse_vectors or {})
+
+
+class SparseEncoder:
+    """BM25 term weights computed locally, for Qdrant sparse vectors.
+
+    Documents carry the saturated, length-normalised term frequency; queries
+    carry weight 1 per term. The IDF factor is applied by Qdrant from
+    collection statistics (the sparse vector is configured with Modifier.IDF),
+    so scores stay correct as documents are added and removed.
+    """
+
+    def __init__(self, k1: float = SPARSE_BM25_K1, b: float = SPARSE_BM25_B,
+                 avg_doc_tokens: float = SPARSE_AVG_DOC_TOKENS):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_tokens = avg_doc_tokens
+
+    @staticmethod
+    def _vector(weights: dict) -> models.SparseVector:
+        indices = sorted(weights)
+        return models.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+    def encode_document(self, text: str) -> models.SparseVector:
+        tokens = tokenize(text)
+        length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_tokens)
+        weights: dict = {}
+        for token, tf in Counter(tokens).items():
+            index = token_index(token)
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + length_norm)
+        return self._vector(weights)
+
+    def encode_documents(self, texts: List[str]) -> List[models.SparseVector]:
+        return [self.encode_document(text) for text in texts]
+
+    def encode_query(self, text: str) -> models.SparseVector:
+        return self._vector({token_index(token): 1.0 for token in set(tokenize(text))})
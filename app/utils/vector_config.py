@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from qdrant_client import models
+
+from app.config import (
+    COLLECTION_PROFILE,
+    EMBEDDING_DIMENSIONS,
+    VECTOR_QUANTIZATION,
+    QUANTIZATION_OVERSAMPLING,
+)
+from app.utils.sparse_encoder import SPARSE_VECTOR_NAME, collection_has_sparse
+
+QUANTIZATION_NONE = "none"
+QUANTIZATION_SCALAR = "scalar"
+QUANTIZATION_BINARY = "binary"
+QUANTIZATION_KINDS = (QUANTIZATION_NONE, QUANTIZATION_SCALAR, QUANTIZATION_BINARY)
+
+
+def truncate_embedding(vector: List[float], dimensions: int) -> List[float]:
+    """Shorten a text-embedding-3 vector to its first `dimensions` components, renormalised.
+
+    These models are trained so that a prefix of the embedding is itself a
+    valid embedding (the same result as requesting `dimensions` from the API),
+    so stored full-size vectors can be reduced without re-embedding.
+    """
+    if dimensions >= len(vector):
+        if dimensions > len(vector):
+            raise ValueError(f"Cannot expand a {len(vector)}-dimensional embedding to {dimensions}")
+        return vector
+    prefix = np.asarray(vector[:dimensions], dtype=np.float32)
+    norm = np.linalg.norm(prefix)
+    return (prefix / norm if norm else prefix).tolist()
+
+
+def target_dimensions(native_dimensions: int) -> int:
+    """Vector size for a new collection: EMBEDDING_DIMENSIONS if set, else the model's own size"""
+    return min(EMBEDDING_DIMENSIONS or native_dimensions, native_dimensions)
+
+
+def quantization_config(kind: str = VECTOR_QUANTIZATION):
+    """Qdrant quantization config for 'scalar' (int8, 4x smaller) or 'binary' (1 bit, 32x smaller)"""
+    if kind == QUANTIZATION_SCALAR:
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if kind == QUANTIZATION_BINARY:
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if kind == QUANTIZATION_NONE:
+        return None
+    raise ValueError(f"Unknown quantization '{kind}', expected one of {', '.join(QUANTIZATION_KINDS)}")
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    """HNSW and storage settings for new collections (None keeps Qdrant's default)"""
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+    hnsw_on_disk: bool = False
+    vectors_on_disk: bool = False
+    on_disk_payload: bool = False
+
+    def hnsw_config(self, per_tenant: bool = False) -> Optional[models.HnswConfigDiff]:
+        """HNSW settings; per_tenant builds one graph per tenant (payload_m) and no global graph (m=0)"""
+        if per_tenant:
+            return models.HnswConfigDiff(
+                m=0, payload_m=self.hnsw_m or 16, ef_construct=self.hnsw_ef_construct,
+                on_disk=self.hnsw_on_disk or None,
+            )
+        if self.hnsw_m is None and self.hnsw_ef_construct is None and not self.hnsw_on_disk:
+            return None
+        return models.HnswConfigDiff(
+            m=self.hnsw_m, ef_construct=self.hnsw_ef_construct, on_disk=self.hnsw_on_disk or None
+        )
+
+
+COLLECTION_PROFILES = {
+    # Qdrant defaults (m=16, ef_construct=100), everything in RAM
+    "default": CollectionProfile(),
+    # Denser graph built with a wider search: better recall at a given hnsw_ef, more RAM and slower indexing
+    "small-fast": CollectionProfile(hnsw_m=32, hnsw_ef_construct=256),
+    # Large collections: vectors, graph and payloads are memory-mapped from disk and paged in on demand
+    "large-on-disk": CollectionProfile(
+        hnsw_m=16, hnsw_ef_construct=128, hnsw_on_disk=True, vectors_on_disk=True, on_disk_payload=True
+    ),
+}
+
+
+def collection_profile(name: str = COLLECTION_PROFILE) -> CollectionProfile:
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}', expected one of {', '.join(COLLECTION_PROFILES)}")
+    return COLLECTION_PROFILES[name]
+
+
+def dense_vector_params(size: int, quantization: str = VECTOR_QUANTIZATION,
+                        on_disk: bool = False) -> models.VectorParams:
+    """Unnamed cosine vector; quantized collections keep the original vectors on disk for rescoring"""
+    quantized = quantization != QUANTIZATION_NONE
+    return models.VectorParams(
+        size=size,
+        distance=models.Distance.COSINE,
+        on_disk=True if quantized or on_disk else None,
+        quantization_config=quantization_config(quantization),
+    )
+
+
+def quantization_kind(collection_info) -> str:
+    """'scalar', 'binary' or 'none' for an existing collection"""
+    configs = [collection_info.config.quantization_config]
+    vectors = collection_info.config.params.vectors
+    if isinstance(vectors, models.VectorParams):
+        configs.append(vectors.quantization_config)
+    for config in configs:
+        if isinstance(config, models.ScalarQuantization):
+            return QUANTIZATION_SCALAR
+        if isinstance(config, models.BinaryQuantization):
+            return QUANTIZATION_BINARY
+    return QUANTIZATION_NONE
+
+
+@dataclass
+class CollectionLayout:
+    """The parts of a collection's configuration that retrieval depends on"""
+    vector_size: Optional[int]
+    has_sparse: bool
+    quantization: str = QUANTIZATION_NONE
+    embedding_backend: Optional[str] = None  # set by readers that look it up (see embedding_backends)
+
+    @classmethod
+    def from_info(cls, collection_info) -> "CollectionLayout":
+        vectors = collection_info.config.params.vectors
+        return cls(
+            vector_size=vectors.size if isinstance(vectors, models.VectorParams) else None,
+            has_sparse=collection_has_sparse(collection_info),
+            quantization=quantization_kind(collection_info),
+        )
+
+    def search_params(self, hnsw_ef: Optional[int] = None) -> Optional[models.SearchParams]:
+        """Dense search parameters for this collection.
+
+        Quantized collections are searched over the quantized vectors, then an
+        oversampled shortlist is rescored with the originals. hnsw_ef widens
+        (or narrows) the graph search to trade latency for recall.
+        """
+        quantized = self.quantization != QUANTIZATION_NONE
+        if not quantized and hnsw_ef is None:
+            return None
+        return models.SearchParams(
+            hnsw_ef=hnsw_ef,
+            quantization=models.QuantizationSearchParams(
+                rescore=True, oversampling=QUANTIZATION_OVERSAMPLING
+            ) if quantized else None,
+        )
+
+    def fit_vector(self, vector: List[float]) -> List[float]:
+        """Reduce a full-size embedding to the collection's vector size"""
+        return truncate_embedding(vector, self.vector_size) if self.vector_size else vector
+
+
+def sparse_vectors_config() -> dict:
+    return {SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
@@ -0,0 +1,78 @@
+"""Local CPU embedding throughput (chunks per second) by batch size and thread count.
+
+Run from the repository root with an ONNX model exported to
+LOCAL_EMBEDDING_MODELS_DIR/<model>/ (model.onnx and tokenizer.json):
+
+    python -m benchmarks.bench_embeddings --model bge-small-en-v1.5 --chunks 2000 \\
+        --batch-sizes 8 32 64 --threads 1 2 4
+
+Chunks are synthetic manual text of about --chunk-chars characters (the
+indexing default is 1000). Each configuration embeds all chunks through
+OnnxEmbeddings.aembed_documents, as indexing does on a cache miss; the best
+of --repeat runs is reported. Pass --openai to add one remote
+text-embedding-3-large run for comparison (needs OPENAI_API_KEY; costs tokens).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# app.config requires these; local embedding does not talk to either service
+os.environ.setdefault("QDRANT_URL", "http://localhost:6333")
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from app.utils.embedding_backends import OnnxEmbeddings, load_embeddings
+
+WORDS = "pump valve pressure sensor error reset firmware manual calibrate torque seal gasket".split()
+
+
+def chunk_text(rng: random.Random, chars: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def best_of(embeddings, texts, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        asyncio.run(embeddings.aembed_documents(texts))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="Model directory name under LOCAL_EMBEDDING_MODELS_DIR")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 64])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--openai", action="store_true", help="Also time text-embedding-3-large")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Varied lengths, like the tail chunks of real pages
+    texts = [chunk_text(rng, rng.randint(args.chunk_chars // 4, args.chunk_chars)) for _ in range(args.chunks)]
+
+    print(f"model={args.model} chunks={args.chunks} cpus={os.cpu_count()}")
+    print(f"{'backend':>8} {'batch':>6} {'threads':>8} {'seconds':>9} {'chunks/s':>10}")
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            embeddings = OnnxEmbeddings(args.model, batch_size=batch_size, threads=threads)
+            # Warm up the session so graph optimisation is not billed to the first run
+            embeddings.embed_documents(texts[:batch_size])
+            seconds = best_of(embeddings, texts, args.repeat)
+            embeddings.executor.shutdown()
+            print(f"{'onnx':>8} {batch_size:>6} {threads:>8} {seconds:>9.2f} {args.chunks / seconds:>10.1f}")
+
+    if args.openai:
+        seconds = best_of(load_embeddings("openai:text-embedding-3-large"), texts, 1)
+        print(f"{'openai':>8} {'-':>6} {'-':>8} {seconds:>9.2f} {args.chunks / seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Requests per second of the /files endpoints, before and after the DBService read paths changed.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_files_api --documents 20000 --requests 2000 --concurrency 20
+
+The /files router is served in-process (httpx ASGI transport, no network)
+from a seeded SQLite database, or from --database-url (e.g. a MySQL
+"mysql+aiomysql://..." URL) when given. "before" is the previous DBService
+behaviour: ORM reads, SQL echo on, OFFSET paging and a COUNT on every
+listing; "after" is the current one: Core reads, echo off, keyset cursors
+and the cached count. Deep pages are --deep-page pages of 20 in, reached by
+page_number before and by cursor after. Echo output goes to os.devnull so
+the terminal does not limit it.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.routers import filescrud_router
+from app.services.dbservices import (
+    Base,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DBService,
+    Document,
+    document_counts,
+    encode_cursor,
+)
+
+PAGE_SIZE = 20
+
+
+class BaselineDBService(DBService):
+    """DBService reads as they were: ORM objects, OFFSET pages and an uncached COUNT"""
+
+    async def list_documents(self, limit=10, cursor=None, offset=0, collection_name=None, filename_prefix=None):
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Document).order_by(Document.upload_date.desc()).limit(limit).offset(offset)
+            )
+            return result.scalars().all(), None
+
+    async def count_documents(self, collection_name=None, filename_prefix=None):
+        async with self.async_session() as session:
+            return (await session.execute(select(func.count()).select_from(Document))).scalar_one()
+
+    async def get_document_by_id(self, id):
+        async with self.async_session() as session:
+            return (await session.execute(select(Document).where(Document.id == id))).scalars().first()
+
+
+def make_service(service_class, url: str, echo: bool) -> DBService:
+    db = service_class()
+    pool = {} if url.startswith("sqlite") else dict(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+    db.engine = create_async_engine(url, echo=echo, pool_pre_ping=True, **pool)
+    db.async_session = sessionmaker(db.engine, expire_on_commit=False, class_=AsyncSession)
+    return db
+
+
+async def seed(db: DBService, documents: int):
+    async with db.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    start = datetime(2024, 1, 1)
+    rng = random.Random(0)
+    for first in range(0, documents, 1000):
+        await db.insert_documents([
+            dict(collection_name=f"collection_{rng.randrange(50)}", filename=f"manual_{i}.pdf",
+                 chunk_count=rng.randrange(10, 400), file_size=rng.randrange(10 ** 5, 10 ** 7),
+                 upload_date=start + timedelta(seconds=i // 3))
+            for i in range(first, min(first + 1000, documents))
+        ])
+
+
+async def requests_per_second(client: httpx.AsyncClient, paths, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(path):
+        async with semaphore:
+            response = await client.get(path)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(fetch(path) for path in paths))
+    return len(paths) / (time.perf_counter() - start)
+
+
+async def run(args):
+    url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'files.db')}"
+    # Echo writes here instead of adding its own stdout handler; request logs are left out
+    echo_logger = logging.getLogger("sqlalchemy.engine.Engine")
+    echo_logger.addHandler(logging.FileHandler(os.devnull))
+    echo_logger.propagate = False
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    db = make_service(DBService, url, echo=False)
+    if not args.database_url:
+        await seed(db, args.documents)
+    ids = [row.id for row in (await db.get_all_documents())]
+    deep_offset = args.deep_page * PAGE_SIZE
+    deep_cursor = encode_cursor((await db.list_documents(limit=deep_offset))[0][-1])
+    await db.engine.dispose()
+
+    rng = random.Random(1)
+    by_id = [f"/files/{rng.choice(ids)}" for _ in range(args.requests)]
+    scenarios = {
+        "first page": ([f"/files/?page_size={PAGE_SIZE}"] * args.requests,) * 2,
+        "deep page": (
+            [f"/files/?page_size={PAGE_SIZE}&page_number={args.deep_page + 1}"] * args.requests,
+            [f"/files/?page_size={PAGE_SIZE}&cursor={deep_cursor}"] * args.requests,
+        ),
+        "by id": (by_id, by_id),
+    }
+
+    print(f"documents={len(ids)} requests={args.requests} concurrency={args.concurrency} database={url.split(':')[0]}")
+    print(f"{'endpoint':>12} {'before req/s':>13} {'after req/s':>12} {'speedup':>8}")
+    for name, (before_paths, after_paths) in scenarios.items():
+        rates = []
+        for service_class, echo, paths in ((BaselineDBService, True, before_paths), (DBService, False, after_paths)):
+            db = make_service(service_class, url, echo=echo)
+            document_counts.clear()
+            app = FastAPI()
+            app.include_router(filescrud_router.router)
+            app.dependency_overrides[filescrud_router.get_db_service] = lambda: db
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                await requests_per_second(client, paths[:args.concurrency], args.concurrency)  # warm up
+                rates.append(await requests_per_second(client, paths, args.concurrency))
+            await db.engine.dispose()
+        print(f"{name:>12} {rates[0]:>13.0f} {rates[1]:>12.0f} {rates[1] / rates[0]:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20000, help="Rows to seed (SQLite only)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--deep-page", type=int, default=500, help="Page (of 20) for the deep-page scenario")
+    parser.add_argument("--database-url", help="Existing database to read instead of a seeded SQLite file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
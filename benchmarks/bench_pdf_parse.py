@@ -0,0 +1,80 @@
+"""Serial vs page-sharded PDF parse time by page count.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pdf_parse --pages 10 50 100 300 --workers 4
+
+"serial" is PyPDFLoader(...).load(), the previous upload path; "parallel"
+is app.utils.pdf_parser.load_pdf on a warm process pool.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# app.config requires these; parsing does not talk to either service
+os.environ.setdefault("QDRANT_URL", "http://localhost:6333")
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from app.utils.pdf_parser import load_pdf, parse_page_range
+from tests.conftest import build_text_pdf
+
+WORDS = "pump valve pressure sensor error reset firmware manual calibrate torque seal gasket".split()
+
+
+def page_text(rng: random.Random, chars: int = 3000) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 100, 300])
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--min-pages-per-shard", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Warm the pool so worker start-up is not billed to the first measurement
+        warmup = Path(tmp) / "warmup.pdf"
+        warmup.write_bytes(build_text_pdf(["warm up"]))
+        list(executor.map(parse_page_range, [str(warmup)] * args.workers, [0] * args.workers, [1] * args.workers))
+
+        print(f"workers={args.workers} min_pages_per_shard={args.min_pages_per_shard} cpus={os.cpu_count()}")
+        print(f"{'pages':>6} {'serial (s)':>11} {'parallel (s)':>13} {'speedup':>8}")
+        for pages in args.pages:
+            path = Path(tmp) / f"doc_{pages}.pdf"
+            path.write_bytes(build_text_pdf([page_text(rng) for _ in range(pages)]))
+
+            serial = best_of(lambda: PyPDFLoader(str(path)).load(), args.repeat)
+            parallel = best_of(
+                lambda: asyncio.run(load_pdf(
+                    path, executor=executor, workers=args.workers,
+                    min_pages_per_shard=args.min_pages_per_shard,
+                )),
+                args.repeat,
+            )
+            print(f"{pages:>6} {serial:>11.3f} {parallel:>13.3f} {serial / parallel:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Memory and recall of reduced-dimension and quantized layouts on a live collection.
+
+Run from the repository root against the deployment's Qdrant and OpenAI key:
+
+    python -m benchmarks.bench_quantization --collection manuals --queries queries.jsonl \\
+        --dimensions 3072 1024 512 --quantization none scalar binary -k 10
+
+queries.jsonl holds one query per line ({"query": "..."}; other fields are
+ignored, so the retrieval benchmark's file works too). Each layout is built
+as a temporary copy of the collection (deleted afterwards) and its dense top-k
+is compared with exact search over the original full-size vectors:
+recall@k is the fraction of the exact top-k it returns. "RAM MB" estimates
+the vectors searched in memory (float32 without quantization; int8 or 1 bit
+per dimension with it, the originals then live on disk and are only read to
+rescore). Index and payload memory are not included.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from qdrant_client import models
+
+from app.services.chat_service import ChatService
+from app.services.collection_migration import copy_points, create_with_layout
+from app.utils.qdrant_client import close_qdrant_client
+from app.utils.vector_config import (
+    CollectionLayout,
+    QUANTIZATION_BINARY,
+    QUANTIZATION_KINDS,
+    QUANTIZATION_SCALAR,
+)
+
+BYTES_PER_DIMENSION = {QUANTIZATION_SCALAR: 1, QUANTIZATION_BINARY: 1 / 8}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(args):
+    with open(args.queries) as f:
+        queries = [json.loads(line)["query"] for line in f if line.strip()]
+
+    service = ChatService()
+    client = service.qdrant_client
+    info = await client.get_collection(args.collection)
+    source = CollectionLayout.from_info(info)
+    vectors = [await service.embed_query(query) for query in queries]
+
+    exact = []
+    for vector in vectors:
+        response = await client.query_points(
+            collection_name=args.collection, query=source.fit_vector(vector), limit=args.k,
+            search_params=models.SearchParams(exact=True),
+        )
+        exact.append({point.id for point in response.points})
+
+    print(f"collection={args.collection} points={info.points_count} queries={len(queries)} k={args.k}")
+    print(f"{'dims':>5} {'quantization':>12} {'RAM MB':>8} {'recall@k':>9} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    bench = f"{args.collection}__bench"
+    for dimensions in args.dimensions:
+        if dimensions > source.vector_size:
+            continue
+        for quantization in args.quantization:
+            layout = CollectionLayout(vector_size=dimensions, has_sparse=source.has_sparse, quantization=quantization)
+            await create_with_layout(client, bench, layout, {})
+            try:
+                await copy_points(client, args.collection, bench, dimensions)
+                # Wait for indexing and quantization to finish before timing
+                while (await client.get_collection(bench)).status != models.CollectionStatus.GREEN:
+                    await asyncio.sleep(1)
+
+                recalls, latencies = [], []
+                for vector, expected in zip(vectors, exact):
+                    start = time.perf_counter()
+                    response = await client.query_points(
+                        collection_name=bench, query=layout.fit_vector(vector), limit=args.k,
+                        search_params=layout.search_params(),
+                    )
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    recalls.append(len(expected & {point.id for point in response.points}) / max(len(expected), 1))
+            finally:
+                await client.delete_collection(bench)
+
+            ram_mb = info.points_count * dimensions * BYTES_PER_DIMENSION.get(quantization, 4) / 1024 ** 2
+            print(
+                f"{dimensions:>5} {quantization:>12} {ram_mb:>8.1f} {statistics.mean(recalls):>9.3f} "
+                f"{percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.95):>9.1f}"
+            )
+
+    await close_qdrant_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--queries", required=True, help="JSONL file of {query}")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[3072, 1536, 1024, 512])
+    parser.add_argument("--quantization", nargs="+", choices=QUANTIZATION_KINDS, default=list(QUANTIZATION_KINDS))
+    parser.add_argument("-k", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Recall and latency of dense, sparse and hybrid retrieval on a live collection.
+
+Run from the repository root against the deployment's Qdrant and OpenAI key:
+
+    python -m benchmarks.bench_retrieval --collection manuals --queries queries.jsonl -k 4
+
+queries.jsonl holds one labelled query per line:
+
+    {"query": "What does error E-1042 mean?", "expected": "E-1042"}
+
+A query counts as recalled at k when any of the top-k chunks contains the
+"expected" text (case-insensitive). Query embeddings are computed once up
+front, so latencies are Qdrant search time only; the collection must have
+been indexed after sparse vectors were introduced for sparse/hybrid to differ
+from dense. Pass --hnsw-ef to compare recall and latency at different HNSW
+search widths.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.services.chat_service import ChatService, RETRIEVAL_DENSE, RETRIEVAL_SPARSE, RETRIEVAL_HYBRID
+from app.utils.qdrant_client import close_qdrant_client
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(args):
+    with open(args.queries) as f:
+        labelled = [json.loads(line) for line in f if line.strip()]
+
+    service = ChatService()
+    vectors = [await service.embed_query(item["query"]) for item in labelled]
+
+    print(f"collection={args.collection} queries={len(labelled)} k={args.k} hnsw_ef={args.hnsw_ef or 'default'}")
+    print(f"{'mode':>7} {'recall@k':>9} {'MRR':>6} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for mode in (RETRIEVAL_DENSE, RETRIEVAL_SPARSE, RETRIEVAL_HYBRID):
+        hits, reciprocal_ranks, latencies = 0, [], []
+        for item, vector in zip(labelled, vectors):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                points = await service.search(
+                    item["query"], args.collection, args.k, vector, mode, hnsw_ef=args.hnsw_ef
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            expected = item["expected"].lower()
+            rank = next(
+                (i for i, point in enumerate(points)
+                 if expected in (point.payload or {}).get("page_content", "").lower()),
+                None,
+            )
+            if rank is not None:
+                hits += 1
+                reciprocal_ranks.append(1 / (rank + 1))
+            else:
+                reciprocal_ranks.append(0.0)
+
+        print(
+            f"{mode:>7} {hits / len(labelled):>9.3f} {statistics.mean(reciprocal_ranks):>6.3f} "
+            f"{percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.95):>9.1f}"
+        )
+
+    await close_qdrant_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--queries", required=True, help="JSONL file of {query, expected}")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="timed searches per query and mode")
+    parser.add_argument("--hnsw-ef", type=int, default=None, help="HNSW search width (default: Qdrant's)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
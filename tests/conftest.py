@@ -0,0 +1,121 @@
+import asyncio
+import io
+import pytest
+from langchain_core.embeddings import Embeddings
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from qdrant_client import AsyncQdrantClient
+from app.services import indexing_service
+from app.services.indexing_service import IndexingService
+
+
+class TopicEmbeddings:
+    """Dense stand-in: valve text and pump text point in different directions"""
+
+    async def aembed_documents(self, texts):
+        return [await self.aembed_query(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return [1.0, 0.0, 0.2] if "valve" in text else [0.0, 1.0, 0.2]
+
+
+class KeywordEmbeddings(Embeddings):
+    """TopicEmbeddings as a registered backend ('keyword:<model>')"""
+
+    def __init__(self, model):
+        self.model = f"keyword:{model}"
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.2] if "valve" in text else [0.0, 1.0, 0.2]
+
+
+class PageEmbeddings:
+    """4-dimensional stand-in whose first two components already separate the pages"""
+
+    async def aembed_documents(self, texts):
+        return [[1.0, 0.1, 0.5, 0.5] if "valve" in text else [0.1, 1.0, 0.5, -0.5] for text in texts]
+
+    async def aembed_query(self, text):
+        return [1.0, 0.0, 0.5, 0.5] if "valve" in text else [0.0, 1.0, 0.5, -0.5]
+
+
+class CodeBlindEmbeddings:
+    """Dense stand-in that cannot tell error codes apart and ranks the E-1045 page last"""
+
+    async def aembed_documents(self, texts):
+        return [[0.0, 1.0, 0.0] if "E-1045" in text else [1.0, 0.0, 0.0] for text in texts]
+
+    async def aembed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class LengthEmbeddings:
+    """Stand-in that tells chunks apart by length, recording each call's batch size and the texts embedded"""
+
+    def __init__(self):
+        self.calls = []
+        self.embedded = []
+
+    async def aembed_documents(self, texts):
+        self.calls.append(len(texts))
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+
+def build_text_pdf(pages):
+    """Build a PDF whose pages contain the given text (one string per page)"""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for text in pages:
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)]
+        content = DecodedStreamObject()
+        content.set_data(
+            ("BT /F1 10 Tf 40 760 Td 12 TL " + " ".join(f"({line}) '" for line in lines) + " ET").encode()
+        )
+        page[NameObject("/Contents")] = writer._add_object(content)
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Write a text PDF to a temporary file and return its path"""
+    def _make(pages, name="manual.pdf"):
+        path = tmp_path / name
+        path.write_bytes(build_text_pdf(pages))
+        return path
+    return _make
+
+
+@pytest.fixture
+def run_indexed(monkeypatch, tmp_path):
+    """Run a scenario against a fresh in-memory Qdrant and an IndexingService using it.
+
+    run_indexed(scenario, embeddings) awaits scenario(qdrant, indexing) in
+    asyncio.run and returns its result; embeddings defaults to TopicEmbeddings.
+    The service's chunk embedding store lives in the test's tmp_path, so no
+    vectors are shared between tests or runs.
+    """
+    monkeypatch.setattr(indexing_service, "CHUNK_EMBEDDING_STORE_PATH", tmp_path / "chunk_embeddings.sqlite3")
+
+    def _run(scenario, embeddings=None):
+        async def run():
+            qdrant = AsyncQdrantClient(":memory:")
+            indexing = IndexingService(qdrant_client=qdrant)
+            indexing.embedding_model = embeddings or TopicEmbeddings()
+            return await scenario(qdrant, indexing)
+        return asyncio.run(run())
+    return _run
@@ -1,6 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.utils.context_packing import pack_context
+from app.utils.qdrant_client import get_qdrant_client
 
 client = TestClient(app)
 
@@ -29,3 +31,186 @@ def test_chat_nonexistent_collection():
     })
     assert response.status_code == 404
     assert "not found" in response.json()["detail"].lower()
+
+def test_chat_stream_sends_search_results_before_tokens(monkeypatch):
+    """Test that the streaming endpoint emits sources first, then tokens"""
+    from app.routers import chat_router
+
+    class FakeQdrantClient:
+        async def get_collection(self, name):
+            return {}
+
+    async def fake_embed_query(query):
+        return [0.1, 0.2, 0.3]
+
+    async def fake_retrieve(query, collection_name, max_results=4, query_vector=None, retrieval_mode=None,
+                            candidates=None, diversity=0.0, hnsw_ef=None, model="gpt-4.1"):
+        results = [{"page_content": "Reset with E42", "page_number": 3, "source": "manual.pdf", "score": 0.9}]
+        return results, pack_context(results, model)
+
+    async def fake_stream_completion(messages, model="gpt-4.1"):
+        for token in ["Press ", "reset."]:
+            yield token
+
+    monkeypatch.setitem(app.dependency_overrides, get_qdrant_client, lambda: FakeQdrantClient())
+    monkeypatch.setattr(chat_router.answer_cache, "enabled", False)
+    monkeypatch.setattr(chat_router.chat_service, "embed_query", fake_embed_query)
+    monkeypatch.setattr(chat_router.chat_service, "retrieve", fake_retrieve)
+    monkeypatch.setattr(chat_router.chat_service, "stream_completion", fake_stream_completion)
+
+    response = client.post("/chat/stream", json={
+        "query": "How do I reset?",
+        "collection_name": "manual"
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [frame.split("\n")[0] for frame in response.text.strip().split("\n\n")]
+    assert events == [
+        "event: search_results",
+        "event: token",
+        "event: token",
+        "event: done",
+    ]
+    assert '"page_number": 3' in response.text
+
+def test_concurrent_chat_requests_do_not_block_event_loop(monkeypatch):
+    """Test that N simultaneous /chat requests complete in roughly the time of one"""
+    import asyncio
+    import time
+    from types import SimpleNamespace
+    import httpx
+    from app.routers import chat_router
+
+    delay = 0.2  # per-call latency of each fake network dependency
+
+    class FakeQdrantClient:
+        async def get_collection(self, name):
+            await asyncio.sleep(delay)
+            params = SimpleNamespace(vectors=None, sparse_vectors=None)
+            return SimpleNamespace(config=SimpleNamespace(params=params, quantization_config=None))
+
+        async def scroll(self, collection_name, limit, with_payload=True, with_vectors=False):
+            await asyncio.sleep(delay)
+            return [], None
+
+        async def query_points(self, collection_name, query, limit, with_payload=True, with_vectors=False):
+            await asyncio.sleep(delay)
+            point = SimpleNamespace(
+                payload={"page_content": "Reset with E42", "metadata": {"page": 3, "source": "manual.pdf"}},
+                score=0.9,
+                vector=[0.1, 0.2, 0.3],
+            )
+            return SimpleNamespace(points=[point])
+
+    class FakeEmbeddings:
+        async def aembed_query(self, text):
+            await asyncio.sleep(delay)
+            return [0.1, 0.2, 0.3]
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            await asyncio.sleep(delay)
+            message = SimpleNamespace(content="Press reset.")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setitem(app.dependency_overrides, get_qdrant_client, lambda: FakeQdrantClient())
+    monkeypatch.setattr(chat_router.chat_service, "_qdrant_client", FakeQdrantClient())
+    monkeypatch.setattr(chat_router.answer_cache, "enabled", False)
+    monkeypatch.setattr(chat_router.chat_service, "embedding_model", FakeEmbeddings())
+    monkeypatch.setattr(
+        chat_router.chat_service,
+        "openai_client",
+        SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions())),
+    )
+
+    payload = {"query": "How do I reset?", "collection_name": "manual", "retrieval_mode": "dense"}
+
+    async def run(n):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[async_client.post("/chat", json=payload) for _ in range(n)])
+            elapsed = time.perf_counter() - start
+        assert all(r.status_code == 200 for r in responses)
+        return elapsed
+
+    single = asyncio.run(run(1))
+    concurrent = asyncio.run(run(10))
+
+    # Serialized handlers would take ~10x as long
+    assert concurrent < single * 2
+
+def test_chat_requires_exactly_one_collection_selector():
+    """Test that a chat request names its collections in exactly one way"""
+    response = client.post("/chat", json={
+        "query": "test query",
+        "collection_name": "manual",
+        "collection_names": ["manual", "guide"]
+    })
+    assert response.status_code == 422
+
+    response = client.post("/chat", json={"query": "test query"})
+    assert response.status_code == 422
+
+def test_retrieve_across_collections_merges_and_skips_slow_ones(make_pdf, run_indexed):
+    """Test that a multi-collection search merges results, labels sources and drops a collection that times out"""
+    import asyncio
+    from conftest import TopicEmbeddings
+    from app.services.chat_service import ChatService
+
+    valves = make_pdf(["Replace the valve seal every year."], name="valves.pdf")
+    pumps = make_pdf(["Clean the pump filter monthly."], name="pumps.pdf")
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(valves, "valves.pdf", "valves")
+        await indexing.process_pdf(pumps, "pumps.pdf", "pumps")
+        await indexing.process_pdf(pumps, "pumps.pdf", "slow")
+
+        chat = ChatService(qdrant_client=qdrant)
+        chat.embedding_model = TopicEmbeddings()
+        formatted, context = await chat.retrieve(
+            "valve", ["pumps", "valves"], max_results=2, retrieval_mode="dense", diversity=0.0
+        )
+
+        search = chat.search
+
+        async def slow_search(query, collection_name, *args, **kwargs):
+            if collection_name == "slow":
+                await asyncio.sleep(1)
+            return await search(query, collection_name, *args, **kwargs)
+
+        chat.search = slow_search
+        merged = await chat.search_many("valve", ["slow", "pumps"], 4, retrieval_mode="dense", timeout_seconds=0.2)
+        return formatted, context, merged
+
+    formatted, context, merged = run_indexed(scenario)
+    assert [result["collection_name"] for result in formatted] == ["valves", "pumps"]
+    assert context.text.startswith("[valves.pdf, page 0]\nReplace the valve seal")
+    assert [name for name, _ in merged] == ["pumps"]
+
+def test_sample_questions_are_generated_from_the_opening_pages(make_pdf, monkeypatch, run_indexed):
+    """Test that sample questions are generated from the first pages' chunks, whatever their point IDs"""
+    from types import SimpleNamespace
+    from app.services import chat_service
+    from app.services.chat_service import ChatService
+
+    pages = [f"Chapter {number} covers part {number} of the pump." for number in range(8)]
+    pdf = make_pdf(pages)
+    prompts = []
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            prompts.append(kwargs["messages"][-1]["content"])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Q1\nQ2\n"))])
+
+    monkeypatch.setattr(chat_service, "SAMPLE_SOURCE_CHUNKS", 2)
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(pdf, "manual.pdf", "manual")
+        chat = ChatService(qdrant_client=qdrant)
+        chat.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+        return await chat.generate_sample_questions("manual", count=2)
+
+    assert run_indexed(scenario) == ["Q1", "Q2"]
+    assert prompts == [f"{pages[0]}\n\n{pages[1]}"]
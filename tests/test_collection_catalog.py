@@ -0,0 +1,34 @@
+from app.utils.collection_catalog import collection_catalog
+
+
+def test_catalog_serves_reads_from_memory_until_invalidated(make_pdf, run_indexed):
+    """Test that existence checks and listings skip Qdrant until indexing or deletion changes the collections"""
+    pdf = make_pdf(["Replace the valve seal every year.", "Clean the pump filter monthly."])
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(pdf, "service.pdf", "service")
+        await indexing.process_pdf(pdf, "parts.pdf", "parts")
+
+        requests = []
+        get_collection = qdrant.get_collection
+
+        async def counting_get_collection(name, *args, **kwargs):
+            requests.append(name)
+            return await get_collection(name, *args, **kwargs)
+
+        qdrant.get_collection = counting_get_collection
+        catalog = collection_catalog(qdrant)
+        listed = sorted(await indexing.list_collections(), key=lambda col: col["name"])
+        refreshed = sorted(requests)
+        found = [await catalog.exists("service"), await catalog.exists("parts"), await indexing.list_collections()]
+        served_from_memory = len(requests) == len(refreshed)
+
+        await indexing.delete_collection("parts")
+        after_delete = [col["name"] for col in await indexing.list_collections()]
+        return listed, refreshed, found[:2], served_from_memory, after_delete, await catalog.exists("parts")
+
+    listed, refreshed, found, served_from_memory, after_delete, parts_exists = run_indexed(scenario)
+    assert listed == [{"name": "parts", "vectors_count": 2}, {"name": "service", "vectors_count": 2}]
+    assert refreshed == ["parts", "service"]
+    assert found == [True, True] and served_from_memory
+    assert after_delete == ["service"] and not parts_exists
@@ -0,0 +1,37 @@
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.utils.context_packing import count_tokens, merge_overlapping, pack_context
+
+PAGE = " ".join(f"Step {i}: check the valve seal and the pump filter for wear." for i in range(40))
+
+
+def test_overlapping_chunks_of_a_page_merge_back_into_one_span():
+    """Test that chunks split with overlap are merged, duplicates dropped and pages ordered"""
+    chunks = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=200).split_text(PAGE)
+    assert len(chunks) > 3
+    # Retrieved out of order, with one chunk returned twice and a chunk from an earlier page
+    results = [{"page_content": chunk, "page_number": 5, "score": 0.9} for chunk in (chunks[2], chunks[1], chunks[3])]
+    results.append({"page_content": chunks[1], "page_number": 5, "score": 0.5})
+    results.append({"page_content": "The warranty covers two years.", "page_number": 1, "score": 0.4})
+
+    packed = pack_context(results, "gpt-4.1", budget=10000)
+    assert packed.duplicates == 1 and packed.spans == 2 and packed.omitted == 0
+    assert packed.text.startswith("[page 1]\nThe warranty")
+    assert "[page 5]\n" + merge_overlapping(merge_overlapping(chunks[2], chunks[1]), chunks[3]) in packed.text
+    assert packed.tokens_saved > 0 and packed.tokens < packed.raw_tokens
+
+
+def test_budget_keeps_most_relevant_spans_and_cuts_the_last():
+    """Test that spans are taken by relevance until the budget is full, the last one cut to fit"""
+    results = [
+        {"page_content": f"Document {page}. {PAGE}", "page_number": page, "document": f"doc{page}.pdf",
+         "score": 1.0 - page / 10}
+        for page in range(3)
+    ]
+    budget = count_tokens(results[0]["page_content"], "gpt-4.1") + 200
+
+    packed = pack_context(results, "gpt-4.1", label_documents=True, budget=budget)
+    assert packed.tokens <= budget
+    assert packed.omitted == 2
+    assert packed.text.startswith("[doc0.pdf, page 0]\n")
+    assert "[doc1.pdf, page 1]\n" in packed.text and packed.text.endswith(" …")
+    assert "doc2.pdf" not in packed.text
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.services.dbservices import Base, DBService, Document, JOB_CANCELLED, JOB_COMPLETED, JOB_RUNNING, _sync_schema
+
+
+def test_sync_schema_adds_missing_columns_and_indexes(tmp_path):
+    """Test that tables created by an older release gain new nullable columns and indexes"""
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE documents (id VARCHAR(36) PRIMARY KEY, collection_name VARCHAR(255) NOT NULL, "
+                "filename VARCHAR(255) NOT NULL, document_count INTEGER NOT NULL, chunk_count INTEGER NOT NULL, "
+                "file_size BIGINT, upload_date DATETIME NOT NULL, storage_path VARCHAR(500))"
+            ))
+            await conn.execute(text(
+                "INSERT INTO documents VALUES ('1', 'manuals', 'a.pdf', 1, 3, 4, '2024-01-01 00:00:00', NULL)"
+            ))
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_sync_schema)
+
+            def describe(sync_conn):
+                inspector = inspect(sync_conn)
+                return (
+                    {column["name"] for column in inspector.get_columns("documents")},
+                    {index["name"] for index in inspector.get_indexes("documents")},
+                )
+            columns, indexes = await conn.run_sync(describe)
+            rows = (await conn.execute(text("SELECT id, content_hash FROM documents"))).all()
+        await engine.dispose()
+        return columns, indexes, rows
+
+    columns, indexes, rows = asyncio.run(run())
+    assert "content_hash" in columns
+    assert "ix_documents_content_hash_collection" in indexes
+    assert "ix_documents_upload_date_id" in indexes
+    assert rows == [("1", None)]
+
+
+def test_keyset_pages_filters_and_cached_count(tmp_path):
+    """Test that cursor pages cover every document once, filters apply and counts are reused until a write"""
+    async def run():
+        db = DBService()
+        db.engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'files.db'}")
+        db.async_session = sessionmaker(db.engine, expire_on_commit=False, class_=AsyncSession)
+        async with db.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        start = datetime(2024, 1, 1)
+        # Pairs share an upload date, so pages must break ties on id
+        await db.insert_documents([
+            dict(collection_name="manuals" if i % 2 else "parts", filename=f"{'pump_' if i < 4 else 'pumpx'}{i}.pdf",
+                 upload_date=start + timedelta(minutes=i // 2))
+            for i in range(7)
+        ])
+
+        pages, cursor = [], None
+        while True:
+            docs, cursor = await db.list_documents(limit=3, cursor=cursor)
+            pages.append([doc.filename for doc in docs])
+            if cursor is None:
+                break
+        manuals, _ = await db.list_documents(limit=10, collection_name="manuals")
+        # '_' matches itself only, not any character
+        prefixed, _ = await db.list_documents(limit=10, filename_prefix="pump_")
+        counts = [await db.count_documents(), await db.count_documents(filename_prefix="pump_")]
+
+        async with db.async_session() as session:
+            session.add(Document(collection_name="parts", filename="late.pdf"))
+            await session.commit()
+        stale = await db.count_documents()
+        await db.delete_document(manuals[0].id)
+        fresh = await db.count_documents()
+        await db.engine.dispose()
+        return pages, manuals, prefixed, counts, stale, fresh
+
+    pages, manuals, prefixed, counts, stale, fresh = asyncio.run(run())
+    listed = [filename for page in pages for filename in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sorted(listed) == sorted(f"{'pump_' if i < 4 else 'pumpx'}{i}.pdf" for i in range(7))
+    assert listed[0] == "pumpx6.pdf"
+    assert [doc.filename for doc in manuals] == ["pumpx5.pdf", "pump_3.pdf", "pump_1.pdf"]
+    assert sorted(doc.filename for doc in prefixed) == ["pump_0.pdf", "pump_1.pdf", "pump_2.pdf", "pump_3.pdf"]
+    assert counts == [7, 4]
+    # A write outside DBService is not seen until the count expires; DBService writes reset it
+    assert stale == 7 and fresh == 7
+
+
+def test_complete_job_does_not_overwrite_a_cancellation(tmp_path):
+    """Test that a job cancelled while it was being saved stays cancelled and gets no document record"""
+    async def run():
+        db = DBService()
+        db.engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+        db.async_session = sessionmaker(db.engine, expire_on_commit=False, class_=AsyncSession)
+        async with db.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        fields = dict(collection_name="manuals", filename="pump.pdf", storage_path="pump.pdf")
+        document = dict(collection_name="manuals", filename="pump.pdf", document_count=1, chunk_count=2)
+        cancelled = await db.create_job(status=JOB_RUNNING, **fields)
+        await db.update_job(cancelled, status=JOB_CANCELLED)
+        running = await db.create_job(status=JOB_RUNNING, **fields)
+        results = [await db.complete_job(cancelled, **document), await db.complete_job(running, **document)]
+        jobs = [(await db.get_job(job_id)).status for job_id in (cancelled, running)]
+        count = await db.count_documents()
+        await db.engine.dispose()
+        return results, jobs, count
+
+    results, jobs, count = asyncio.run(run())
+    assert results[0] is None and results[1] is not None
+    assert jobs == [JOB_CANCELLED, JOB_COMPLETED]
+    assert count == 1
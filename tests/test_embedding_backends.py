@@ -0,0 +1,128 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from conftest import KeywordEmbeddings
+from app.services.chat_service import ChatService
+from app.utils import embedding_backends
+from app.utils.embedding_backends import OnnxEmbeddings, load_embeddings, parse_backend, recorded_backend, supports_truncation
+
+
+class UnusedEmbeddings:
+    """Default backend that must not be called for collections recorded with another one"""
+
+    async def aembed_documents(self, texts):
+        raise AssertionError("embedded with the default backend")
+
+    async def aembed_query(self, text):
+        raise AssertionError("embedded with the default backend")
+
+
+class FakeTokenizer:
+    """Stand-in for tokenizers.Tokenizer: one token per word, its id the word's length, padded with 0"""
+
+    @classmethod
+    def from_file(cls, path):
+        return cls()
+
+    def enable_truncation(self, max_length):
+        self.max_length = max_length
+
+    def enable_padding(self):
+        pass
+
+    def encode_batch(self, texts):
+        ids = [[len(word) for word in text.split()][:self.max_length] for text in texts]
+        width = max(len(row) for row in ids)
+        return [
+            SimpleNamespace(ids=row + [0] * (width - len(row)), attention_mask=[1] * len(row) + [0] * (width - len(row)),
+                            type_ids=[0] * width)
+            for row in ids
+        ]
+
+
+class FakeSession:
+    """Stand-in for onnxruntime.InferenceSession: the state of token id t is [t, 1]; padding gets [100, 100]"""
+
+    feeds = []
+
+    def __init__(self, path, sess_options=None, providers=None):
+        pass
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, output_names, feeds):
+        FakeSession.feeds.append(feeds)
+        ids = feeds["input_ids"].astype(np.float32)
+        states = np.stack([ids, np.ones_like(ids)], axis=-1)
+        return [np.where(feeds["attention_mask"][..., None] == 1, states, 100.0)]
+
+
+def test_onnx_embeddings_pool_normalise_and_keep_input_order(monkeypatch, tmp_path):
+    """Test that length-sorted batches are mean-pooled over real tokens, L2-normalised and returned in input order"""
+    monkeypatch.setitem(sys.modules, "tokenizers", SimpleNamespace(Tokenizer=FakeTokenizer))
+    monkeypatch.setitem(sys.modules, "onnxruntime", SimpleNamespace(
+        SessionOptions=SimpleNamespace, InferenceSession=FakeSession
+    ))
+    FakeSession.feeds = []
+    embeddings = OnnxEmbeddings("fake-model", batch_size=2, threads=2, max_length=8, models_dir=tmp_path)
+    texts = ["abcd abcd abcd", "ab", "abc abc abc abc abc", "a bbb"]
+
+    def expected(text):
+        pooled = np.array([np.mean([len(word) for word in text.split()]), 1.0])
+        return pooled / np.linalg.norm(pooled)
+
+    vectors = asyncio.run(embeddings.aembed_documents(texts))
+    assert embeddings.model == "onnx:fake-model"
+    for text, vector in zip(texts, vectors):
+        assert np.allclose(vector, expected(text))
+    assert np.allclose(embeddings.embed_documents(texts), vectors)
+    assert np.allclose(asyncio.run(embeddings.aembed_query("a bbb")), expected("a bbb"))
+    # Batches pair the two shortest and the two longest texts, padded to 2 and 5 tokens;
+    # only the inputs the model declares are fed
+    assert sorted(feed["input_ids"].shape for feed in FakeSession.feeds[:2]) == [(2, 2), (2, 5)]
+    assert all(set(feed) == {"input_ids", "attention_mask"} for feed in FakeSession.feeds)
+
+
+def test_backend_specs():
+    """Test that specs name a registered backend kind and a model"""
+    assert parse_backend("onnx:bge-small-en-v1.5") == ("onnx", "bge-small-en-v1.5")
+    for spec in ("bge-small-en-v1.5", "onnx:", "cohere:embed-v3"):
+        with pytest.raises(ValueError):
+            parse_backend(spec)
+
+
+def test_only_text_embedding_3_supports_truncation():
+    """Test that only text-embedding-3 vectors may be shortened (ada-002 and local models keep their size)"""
+    assert supports_truncation("openai:text-embedding-3-large")
+    assert supports_truncation("openai:text-embedding-3-small")
+    assert not supports_truncation("openai:text-embedding-ada-002")
+    assert not supports_truncation("onnx:bge-small-en-v1.5")
+
+
+def test_collection_is_indexed_and_queried_with_its_recorded_backend(make_pdf, monkeypatch, run_indexed):
+    """Test that a collection keeps the backend it was created with, for indexing and for queries"""
+    monkeypatch.setitem(embedding_backends._FACTORIES, "keyword", lambda model, **options: KeywordEmbeddings(model))
+    assert isinstance(load_embeddings("keyword:v1"), KeywordEmbeddings)
+    service_pdf = make_pdf(["Replace the valve seal every year.", "Clean the pump filter monthly."])
+    parts_pdf = make_pdf(["Valve kits are listed on the last page."], name="parts.pdf")
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(service_pdf, "service.pdf", "service", embedding_backend="keyword:v1")
+        # Later documents follow the recorded backend; asking for another one is refused
+        await indexing.process_pdf(parts_pdf, "parts.pdf", "service")
+        with pytest.raises(ValueError):
+            await indexing.process_pdf(parts_pdf, "parts.pdf", "service", embedding_backend="openai:text-embedding-3-small")
+
+        chat = ChatService(qdrant_client=qdrant)
+        chat.embedding_model = UnusedEmbeddings()
+        # A query vector from the default backend is not comparable, so it is replaced
+        points = await chat.search("valve seal", "service", limit=1, query_vector=[0.0, 1.0, 0.2], retrieval_mode="dense")
+        return await recorded_backend(qdrant, "service"), (await qdrant.count("service")).count, points
+
+    backend, count, points = run_indexed(scenario, UnusedEmbeddings())
+    assert backend == "keyword:v1"
+    assert count == 3
+    assert "valve" in points[0].payload["page_content"].lower()
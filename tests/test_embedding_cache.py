@@ -0,0 +1,139 @@
+import asyncio
+import time
+from app.utils import embedding_cache
+from app.utils.embedding_cache import CachedEmbeddings, SQLiteEmbeddingStore
+
+
+class CountingEmbeddings:
+    """Fake embedding model that counts calls"""
+    model = "fake-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [float(len(text)), 1.0]
+
+
+def test_repeated_queries_skip_embedding_call():
+    """Test that normalized repeats are served from memory"""
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner)
+
+    first = asyncio.run(cache.aembed_query("How do I reset?"))
+    second = asyncio.run(cache.aembed_query("  how do I   RESET? "))
+
+    assert first == second
+    assert inner.calls == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_lru_and_ttl_eviction():
+    """Test that the memory tier is bounded and entries expire"""
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, max_size=2, ttl_seconds=0.05)
+
+    cache.embed_query("a")
+    cache.embed_query("b")
+    cache.embed_query("c")  # evicts "a"
+    assert cache.stats()["size"] == 2
+
+    cache.embed_query("a")
+    assert inner.calls == 4
+
+    time.sleep(0.06)
+    cache.embed_query("a")
+    assert inner.calls == 5
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Test that a new cache instance reuses vectors from the SQLite tier"""
+    path = tmp_path / "query_embeddings.sqlite3"
+
+    inner = CountingEmbeddings()
+    asyncio.run(CachedEmbeddings(inner, disk_store=SQLiteEmbeddingStore(path)).aembed_query("error E42"))
+
+    restarted = CachedEmbeddings(inner, disk_store=SQLiteEmbeddingStore(path))
+    vector = asyncio.run(restarted.aembed_query("error E42"))
+
+    assert vector == [9.0, 1.0]
+    assert inner.calls == 1
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_concurrent_identical_queries_share_one_call():
+    """Test that in-flight lookups for the same text are coalesced"""
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner)
+
+    async def run():
+        return await asyncio.gather(*[cache.aembed_query("popular question") for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert all(r == results[0] for r in results)
+    assert inner.calls == 1
+
+
+class CountingDocumentEmbeddings:
+    """Fake embedding model that records which texts were embedded"""
+    model = "fake-model"
+
+    def __init__(self):
+        self.embedded = []
+
+    async def aembed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+def test_reindexing_unchanged_chunks_costs_zero_embedding_calls(tmp_path):
+    """Test that the chunk store only embeds unseen chunk texts"""
+    store = SQLiteEmbeddingStore(tmp_path / "chunks.sqlite3")
+    inner = CountingDocumentEmbeddings()
+    cache = CachedEmbeddings(inner, document_store=store)
+
+    chunks = ["page one", "page two", "page one"]
+    first = asyncio.run(cache.aembed_documents(chunks))
+    assert inner.embedded == ["page one", "page two"]
+
+    inner.embedded.clear()
+    second = asyncio.run(cache.aembed_documents(chunks))
+    assert second == first
+    assert inner.embedded == []
+
+    # A revision only embeds the changed chunk, and chunk text is not normalized
+    asyncio.run(cache.aembed_documents(["page one", "Page two"]))
+    assert inner.embedded == ["Page two"]
+
+
+def test_disk_store_prunes_old_and_excess_entries(tmp_path, monkeypatch):
+    """Test that the store drops expired entries on open and keeps the newest max_entries as it grows"""
+    clock = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: clock[0])
+    path = tmp_path / "queries.sqlite3"
+
+    store = SQLiteEmbeddingStore(path)
+    for name in ("old", "recent"):
+        store.put_many({name: [1.0, 0.0]})
+        clock[0] += 100
+    store.close()
+
+    # "old" is 200 s old and "recent" 100 s old when the store reopens with a 150 s limit
+    store = SQLiteEmbeddingStore(path, max_entries=3, max_age_seconds=150, prune_every=2)
+    assert sorted(store.get_many(["old", "recent"])) == ["recent"]
+
+    for name in ("a", "b", "c"):
+        clock[0] += 1
+        store.put_many({name: [0.0, 1.0]})
+    # Pruned after the second write, so the limit may be exceeded by up to prune_every entries
+    assert sorted(store.get_many(["recent", "a", "b", "c"])) == ["a", "b", "c", "recent"]
+    assert store.prune() == 1
+    assert sorted(store.get_many(["recent", "a", "b", "c"])) == ["a", "b", "c"]
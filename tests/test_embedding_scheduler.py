@@ -0,0 +1,123 @@
+import asyncio
+from app.services.embedding_scheduler import EmbeddingScheduler, TokenBucket
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FlakyEmbeddings:
+    """Fake model that returns 429 for the first `failures` requests"""
+    model = "fake-model"
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.requests = []
+
+    async def aembed_documents(self, texts):
+        self.requests.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise RateLimitError("Rate limit reached")
+        return [[float(len(text))] for text in texts]
+
+
+def test_batches_are_packed_by_token_count():
+    """Test that batches respect the token budget and the input count limit"""
+    scheduler = EmbeddingScheduler(FlakyEmbeddings(), max_batch_tokens=10, max_batch_size=3)
+    scheduler.count_tokens = lambda text: len(text)
+
+    batches = scheduler.pack_batches(["aaaa", "bbbb", "cc", "d", "e", "f", "gggggggggggg"])
+    assert [indices for indices, _ in batches] == [[0, 1, 2], [3, 4, 5], [6]]
+    assert [tokens for _, tokens in batches] == [10, 3, 12]
+
+
+def test_rate_limited_batches_are_retried_and_order_preserved():
+    """Test that 429s are retried with backoff and vectors come back in input order"""
+    inner = FlakyEmbeddings(failures=2)
+    scheduler = EmbeddingScheduler(inner, max_batch_tokens=5, max_concurrency=2, base_delay=0.01)
+    scheduler.count_tokens = lambda text: len(text)
+
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    vectors = asyncio.run(scheduler.aembed_documents(texts))
+
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    stats = scheduler.stats()
+    assert stats["rate_limited_retries"] == 2
+    assert stats["queued_batches"] == 0
+    assert stats["in_flight_batches"] == 0
+
+
+def test_token_bucket_throttles_to_rate():
+    """Test that the bucket delays consumers once its capacity is spent"""
+    bucket = TokenBucket(rate_per_minute=6000, capacity=100)  # 100 tokens/s
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await bucket.acquire(100)
+        await bucket.acquire(20)
+        return loop.time() - start
+
+    assert asyncio.run(run()) >= 0.18
+
+
+def test_cancelled_wait_returns_its_tokens():
+    """Test that a cancelled waiter gives back the tokens it reserved, so it does not delay the next one"""
+    bucket = TokenBucket(rate_per_minute=6000, capacity=100)  # 100 tokens/s
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await bucket.acquire(100)
+        waiting = asyncio.create_task(bucket.acquire(50))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await bucket.acquire(20)
+        return loop.time() - start
+
+    assert 0.18 <= asyncio.run(run()) < 0.4
+
+
+def test_scheduler_is_reusable_across_event_loops():
+    """Test that a scheduler built outside any loop runs contended batches in successive loops"""
+    class SlowEmbeddings(FlakyEmbeddings):
+        async def aembed_documents(self, texts):
+            # Yields, so the other batches wait on the concurrency limit
+            await asyncio.sleep(0.01)
+            return await super().aembed_documents(texts)
+
+    scheduler = EmbeddingScheduler(SlowEmbeddings(), max_batch_tokens=2, max_concurrency=1)
+    scheduler.count_tokens = lambda text: len(text)
+
+    texts = ["aa", "bb", "cc"]
+    assert asyncio.run(scheduler.aembed_documents(texts)) == [[2.0], [2.0], [2.0]]
+    assert asyncio.run(scheduler.aembed_documents(texts)) == [[2.0], [2.0], [2.0]]
+
+
+def test_models_scheduled_together_share_the_limits():
+    """Test that another model's batches run under the same concurrency limit and counters"""
+    running = {"now": 0, "peak": 0}
+
+    class SlowEmbeddings(FlakyEmbeddings):
+        async def aembed_documents(self, texts):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            return await super().aembed_documents(texts)
+
+    first, second = SlowEmbeddings(), SlowEmbeddings()
+    second.model = "other-model"
+    scheduler = EmbeddingScheduler(first, max_batch_tokens=2, max_concurrency=1)
+    scheduler.count_tokens = lambda text: len(text)
+    other = scheduler.scheduled(second)
+
+    async def run():
+        return await asyncio.gather(scheduler.aembed_documents(["aa", "bb"]), other.aembed_documents(["cc", "dd"]))
+
+    assert asyncio.run(run()) == [[[2.0], [2.0]], [[2.0], [2.0]]]
+    assert scheduler.scheduled(first) is scheduler and other.model == "other-model"
+    assert [len(first.requests), len(second.requests)] == [2, 2]
+    assert running["peak"] == 1 and scheduler.stats()["completed_batches"] == 4
@@ -0,0 +1,40 @@
+from conftest import CodeBlindEmbeddings
+from app.services.chat_service import ChatService
+from app.utils.sparse_encoder import SparseEncoder, tokenize
+
+
+def test_tokenize_keeps_codes_whole_and_split():
+    """Test that part numbers and error codes are indexed whole and by their parts"""
+    tokens = tokenize("Error E-1042 on pump PN_7731-B, see the manual")
+    assert "e-1042" in tokens and "1042" in tokens
+    assert "pn_7731-b" in tokens and "7731" in tokens
+    assert "the" not in tokens
+
+    encoder = SparseEncoder()
+    query = encoder.encode_query("E-1042")
+    assert len(query.indices) == 3 and set(query.values) == {1.0}
+
+
+def test_sparse_and_hybrid_modes_find_exact_codes(make_pdf, run_indexed):
+    """Test that sparse retrieval ranks the exact error code first and hybrid recovers what dense misses"""
+    pages = [f"Error E-{code} means the pump pressure sensor reported a fault. Reset the controller." for code in range(1040, 1048)]
+    pdf = make_pdf(pages)
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(pdf, "pumps.pdf", "pumps")
+
+        chat = ChatService(qdrant_client=qdrant)
+        chat.embedding_model = CodeBlindEmbeddings()
+        results = {}
+        for mode in ("dense", "sparse", "hybrid"):
+            formatted, _ = await chat.retrieve("What does E-1045 mean?", "pumps", max_results=3, retrieval_mode=mode)
+            results[mode] = formatted
+        return results
+
+    results = run_indexed(scenario, CodeBlindEmbeddings())
+    def codes(mode):
+        return [result["page_content"].split()[1] for result in results[mode]]
+
+    assert codes("sparse")[0] == "E-1045"
+    assert "E-1045" not in codes("dense")
+    assert "E-1045" in codes("hybrid")
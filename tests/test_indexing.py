@@ -26,3 +26,172 @@ def test_upload_validation():
         files={"file": ("test.pdf", b"", "application/pdf")}
     )
     assert response.status_code == 400
+
+def test_receive_uploads_streams_each_file_once_and_enforces_limits(tmp_path):
+    """Test that multipart files are streamed into storage with a sha256, rejecting oversized parts mid-stream"""
+    import asyncio
+    import hashlib
+    import httpx
+    from starlette.requests import Request
+    from app.utils.file_storage import receive_uploads, UploadTooLargeError
+
+    data = b"%PDF-1.4 " + b"x" * (3 * 1024 * 1024)
+    too_big = b"%PDF-1.4 " + b"y" * (5 * 1024 * 1024)
+    upload = httpx.Request("POST", "http://test/upload", files=[
+        ("files", ("manual.pdf", data, "application/pdf")),
+        ("files", ("notes.txt", b"notes", "text/plain")),
+        ("files", ("too_big.pdf", too_big, "application/pdf")),
+    ])
+    body = upload.read()
+    headers = [(name.lower().encode(), value.encode()) for name, value in upload.headers.items()]
+
+    def request(received):
+        async def receive():
+            # Delivered in 64 KB pieces, like a server reading the socket
+            offset = len(received) * 65536
+            received.append(offset)
+            chunk = body[offset:offset + 65536]
+            return {"type": "http.request", "body": chunk, "more_body": offset + 65536 < len(body)}
+        return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+    uploads = asyncio.run(receive_uploads(request([]), "files", 4 * 1024 * 1024, len(body), storage_dir=tmp_path))
+    assert [(item.filename, item.error is None) for item in uploads] == [
+        ("manual.pdf", True), ("notes.txt", False), ("too_big.pdf", False)
+    ]
+    assert uploads[0].size == len(data)
+    assert uploads[0].content_hash == hashlib.sha256(data).hexdigest()
+    assert uploads[0].path.read_bytes() == data
+    assert "4.0 MB" in uploads[2].error
+    assert sorted(path.name for path in tmp_path.iterdir()) == [uploads[0].path.name]
+
+    # A Content-Length over the request limit is refused before the body is read
+    received = []
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(receive_uploads(request(received), "files", len(body), len(body) - 1, storage_dir=tmp_path))
+    assert received == []
+
+def test_process_many_shares_embedding_batches_and_isolates_failures(make_pdf, tmp_path, run_indexed):
+    """Test that bulk ingestion embeds chunks across files together and reports failures per file"""
+    from conftest import LengthEmbeddings
+    from app.services.indexing_service import BULK_INDEXED, BULK_FAILED
+
+    pdfs = [make_pdf([f"Manual {i} covers installation steps. " * 30], name=f"manual_{i}.pdf") for i in range(3)]
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+
+    async def scenario(qdrant, service):
+        results = await service.process_many(
+            [(path, path.name) for path in pdfs + [broken]], collection_name="bulk", chunk_size=200, chunk_overlap=0
+        )
+        return service.embedding_model.calls, results, (await qdrant.count("bulk")).count
+
+    calls, results, points = run_indexed(scenario, LengthEmbeddings())
+
+    assert [result.status for result in results] == [BULK_INDEXED] * 3 + [BULK_FAILED]
+    assert results[3].error
+    assert calls == [sum(result.chunk_count for result in results)]
+    assert points == sum(result.chunk_count for result in results)
+
+def test_bulk_ingestion_skips_duplicate_content(tmp_path):
+    """Test that files already indexed, or repeating an indexed file of the run, are reported as duplicates"""
+    import asyncio
+    from types import SimpleNamespace
+    from app.services.bulk_ingestion import ingest_stored_files
+    from app.services.indexing_service import (
+        IndexingService, BulkFileResult, BULK_INDEXED, BULK_DUPLICATE, BULK_FAILED
+    )
+
+    class FakeDB:
+        def __init__(self):
+            self.inserted = []
+
+        async def get_documents_by_hashes(self, content_hashes):
+            return [SimpleNamespace(id="doc-existing", collection_name="manuals", content_hash="hash-b")]
+
+        async def insert_documents(self, rows):
+            self.inserted.extend(rows)
+            return [f"doc-{i}" for i in range(len(rows))]
+
+    class FakeIndexing:
+        resolve_collection_name = IndexingService.resolve_collection_name
+        sanitize_collection_name = IndexingService.sanitize_collection_name
+
+        async def process_many(self, files, collection_name, chunk_size, chunk_overlap, embedding_backend=None,
+                               document_keys=None):
+            self.files = files
+            return [
+                BulkFileResult(filename=name, file_path=path, collection_name=collection_name,
+                               status=BULK_FAILED, error="No text could be extracted")
+                if name == "c.pdf" else
+                BulkFileResult(filename=name, file_path=path, collection_name=collection_name,
+                               status=BULK_INDEXED, document_count=1, chunk_count=3, document_key=f"key-{name}")
+                for path, name in files
+            ]
+
+    paths = []
+    for name in ("a.pdf", "a_copy.pdf", "b.pdf", "c.pdf", "c_copy.pdf"):
+        paths.append(tmp_path / name)
+        paths[-1].write_bytes(b"%PDF")
+    files = [
+        (paths[0], "a.pdf", 4, "hash-a"), (paths[1], "a_copy.pdf", 4, "hash-a"), (paths[2], "b.pdf", 4, "hash-b"),
+        (paths[3], "c.pdf", 4, "hash-c"), (paths[4], "c_copy.pdf", 4, "hash-c"),
+    ]
+
+    db, indexing = FakeDB(), FakeIndexing()
+    results, summary = asyncio.run(ingest_stored_files(indexing, db, files, collection_name="manuals"))
+
+    assert [result.status for result in results] == [
+        BULK_INDEXED, BULK_DUPLICATE, BULK_DUPLICATE, BULK_FAILED, BULK_FAILED
+    ]
+    assert [result.document_id for result in results] == ["doc-0", "doc-0", "doc-existing", None, None]
+    # A repeat of a failed file fails with its error instead of pointing at a document that does not exist
+    assert results[4].error == "Same content as c.pdf, which failed: No text could be extracted"
+    assert indexing.files == [(paths[0], "a.pdf"), (paths[3], "c.pdf")]
+    assert [row["content_hash"] for row in db.inserted] == ["hash-a"]
+    assert summary["duplicate_files"] == 2 and summary["failed_files"] == 2
+    assert paths[0].exists() and not any(path.exists() for path in paths[1:])
+
+def test_reindexing_a_revision_only_embeds_changed_chunks(make_pdf, run_indexed):
+    """Test that a new revision reuses unchanged points, moves shifted pages and drops stale chunks"""
+    from conftest import LengthEmbeddings
+
+    intro, setup, wiring, safety = (
+        f"{topic} section of the installation manual. " * 5
+        for topic in ("Introduction", "Setup", "Wiring", "Safety")
+    )
+    revised_setup = setup.replace("Setup", "Revised setup")
+
+    async def scenario(qdrant, service):
+        first = make_pdf([intro, setup, wiring], name="v1.pdf")
+        await service.process_pdf(first, "manual.pdf", "manuals", document_key="manual")
+        service.embedding_model.embedded.clear()
+
+        second = make_pdf([safety, intro, revised_setup, wiring], name="v2.pdf")
+        await service.process_pdf(second, "manual.pdf", "manuals", document_key="manual")
+
+        points, _ = await qdrant.scroll("manuals", limit=100)
+        return service.embedding_model.embedded, points
+
+    embedded, points = run_indexed(scenario, LengthEmbeddings())
+
+    assert sorted(text.split(" section")[0] for text in embedded) == ["Revised setup", "Safety"]
+    pages = {point.payload["page_content"].split(" section")[0]: point.payload["metadata"] for point in points}
+    assert {name: metadata["page"] for name, metadata in pages.items()} == {
+        "Safety": 0, "Introduction": 1, "Revised setup": 2, "Wiring": 3,
+    }
+    assert all(metadata["source"].endswith("v2.pdf") and metadata["total_pages"] == 4 for metadata in pages.values())
+
+def test_documents_sharing_a_filename_are_indexed_separately(make_pdf, run_indexed):
+    """Test that a different PDF uploaded under an existing filename does not replace the earlier one"""
+    from conftest import LengthEmbeddings
+
+    async def scenario(qdrant, service):
+        await service.process_pdf(make_pdf(["Pump manual. " * 5], name="pump.pdf"), "manual.pdf", "manuals")
+        await service.process_pdf(make_pdf(["Valve manual. " * 5], name="valve.pdf"), "manual.pdf", "manuals")
+        points, _ = await qdrant.scroll("manuals", limit=100)
+        return points
+
+    points = run_indexed(scenario, LengthEmbeddings())
+    assert sorted(point.payload["page_content"].split(".")[0] for point in points) == ["Pump manual", "Valve manual"]
+    assert len({point.payload["metadata"]["document_key"] for point in points}) == 2
+    assert all(point.payload["metadata"]["filename"] == "manual.pdf" for point in points)
@@ -0,0 +1,324 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from app.services.dbservices import JOB_ACTIVE_STATES, JOB_KIND_BULK
+from app.services.indexing_service import IndexingService, BulkFileResult, BULK_FAILED, BULK_INDEXED
+from app.services.job_service import IndexingJobManager
+
+
+class FakeDBService:
+    """In-memory stand-in for the indexing_jobs/documents tables"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.documents = {}
+        self.stages = []
+
+    async def create_job(self, **fields):
+        job_id = f"job-{len(self.jobs) + 1}"
+        self.jobs[job_id] = dict(
+            id=job_id, status="queued", stage="queued", attempts=0,
+            chunk_size=1000, chunk_overlap=400, file_size=None, content_hash=None, embedding_backend=None,
+            document_key=None, replaces=None, kind=None, bulk_request=None, bulk_results=None,
+        )
+        self.jobs[job_id].update(fields)
+        return job_id
+
+    async def get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        return SimpleNamespace(**job) if job else None
+
+    async def update_job(self, job_id, **fields):
+        if "stage" in fields:
+            self.stages.append(fields["stage"])
+        self.jobs[job_id].update(fields)
+
+    async def get_active_jobs(self):
+        return [SimpleNamespace(**job) for job in self.jobs.values() if job["status"] in JOB_ACTIVE_STATES]
+
+    async def get_document_by_id(self, document_id):
+        document = self.documents.get(document_id)
+        return SimpleNamespace(id=document_id, **document) if document else None
+
+    async def get_documents_by_hashes(self, content_hashes):
+        return []
+
+    async def insert_documents(self, rows):
+        ids = [f"doc-{len(self.documents) + i}" for i in range(len(rows))]
+        self.documents.update(zip(ids, rows))
+        return ids
+
+    async def complete_job(self, job_id, replaces=None, **document_fields):
+        if self.jobs[job_id]["status"] != "running":
+            return None
+        document_id = f"doc-{job_id}"
+        self.documents.pop(replaces, None)
+        self.documents[document_id] = document_fields
+        self.jobs[job_id].update(status="completed", stage="done", document_id=document_id)
+        return document_id
+
+
+class FakeIndexingService:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.processed = []
+        self.document_keys = []
+        self.discarded = []
+
+    async def process_pdf(self, file_path, filename, collection_name, chunk_size, chunk_overlap,
+                          progress=None, embedding_backend=None, document_key=None):
+        self.processed.append(filename)
+        self.document_keys.append(document_key)
+        await progress("parsing")
+        await asyncio.sleep(self.delay)
+        await progress("embedding", total_chunks=2, chunks_embedded=2)
+        await progress("upserting", chunks_upserted=2)
+        return collection_name, 1, 2
+
+    async def discard_document(self, collection_name, document_key):
+        self.discarded.append(document_key)
+
+    resolve_collection_name = IndexingService.resolve_collection_name
+    sanitize_collection_name = IndexingService.sanitize_collection_name
+
+    async def process_many(self, files, collection_name, chunk_size, chunk_overlap, embedding_backend=None,
+                           document_keys=None):
+        self.processed.extend(filename for _, filename in files)
+        self.document_keys.extend(document_keys)
+        await asyncio.sleep(self.delay)
+        return [
+            BulkFileResult(filename=filename, file_path=path, collection_name=collection_name, document_key=key,
+                           status=BULK_INDEXED, document_count=1, chunk_count=2)
+            for (path, filename), key in zip(files, document_keys)
+        ]
+
+
+async def wait_for_status(db, job_id, statuses, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if db.jobs[job_id]["status"] in statuses:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} stuck in {db.jobs[job_id]['status']}")
+
+
+def test_job_runs_in_background_and_reports_progress(tmp_path):
+    """Test that a submitted job is processed by a worker and recorded as a document"""
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    async def run():
+        db = FakeDBService()
+        manager = IndexingJobManager(db, FakeIndexingService(), max_workers=1)
+        await manager.start()
+        job_id = await manager.submit(collection_name="manual", filename="manual.pdf", storage_path=str(pdf))
+        await wait_for_status(db, job_id, {"completed"})
+        await manager.stop()
+        return db, job_id
+
+    db, job_id = asyncio.run(run())
+    job = db.jobs[job_id]
+    assert job["chunks_upserted"] == 2
+    assert job["document_id"] in db.documents
+    assert db.stages[:4] == ["parsing", "embedding", "upserting", "saving"]
+
+
+def test_running_job_can_be_cancelled(tmp_path):
+    """Test that cancelling a running job stops it and removes the stored file"""
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    async def run():
+        db = FakeDBService()
+        manager = IndexingJobManager(db, FakeIndexingService(delay=5), max_workers=1)
+        await manager.start()
+        job_id = await manager.submit(collection_name="manual", filename="manual.pdf", storage_path=str(pdf))
+        await wait_for_status(db, job_id, {"running"})
+        assert await manager.cancel(job_id)
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        return db, job_id
+
+    db, job_id = asyncio.run(run())
+    assert db.jobs[job_id]["status"] == "cancelled"
+    assert not db.documents
+    assert not pdf.exists()
+
+
+def test_interrupted_jobs_resume_on_start(tmp_path):
+    """Test that jobs left running by a crash are re-run on start"""
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    async def run():
+        db = FakeDBService()
+        job_id = await db.create_job(collection_name="manual", filename="manual.pdf", storage_path=str(pdf))
+        db.jobs[job_id]["status"] = "running"  # process died mid-job
+
+        indexing_service = FakeIndexingService()
+        manager = IndexingJobManager(db, indexing_service, max_workers=1)
+        await manager.start()
+        await wait_for_status(db, job_id, {"completed"})
+        await manager.stop()
+        return db, job_id, indexing_service
+
+    db, job_id, indexing_service = asyncio.run(run())
+    assert db.jobs[job_id]["attempts"] == 1
+    assert indexing_service.processed == ["manual.pdf"]
+
+
+def test_revision_job_replaces_only_the_named_document(tmp_path):
+    """Test that a revision re-indexes under the revised document's key and removes its old record and file"""
+    old_pdf, other_pdf, new_pdf = tmp_path / "old.pdf", tmp_path / "other.pdf", tmp_path / "new.pdf"
+    for pdf in (old_pdf, other_pdf, new_pdf):
+        pdf.write_bytes(b"%PDF-1.4")
+
+    async def run():
+        db = FakeDBService()
+        # Two different documents that happen to share a filename
+        db.documents["doc-old"] = dict(collection_name="manual", filename="manual.pdf",
+                                       storage_path=str(old_pdf), document_key="key-old")
+        db.documents["doc-other"] = dict(collection_name="manual", filename="manual.pdf",
+                                         storage_path=str(other_pdf), document_key="key-other")
+        indexing_service = FakeIndexingService()
+        manager = IndexingJobManager(db, indexing_service, max_workers=1)
+        await manager.start()
+        job_id = await manager.submit(collection_name="manual", filename="manual.pdf", storage_path=str(new_pdf),
+                                      document_key="key-old", replaces="doc-old")
+        await wait_for_status(db, job_id, {"completed"})
+        await manager.stop()
+        return db, job_id, indexing_service
+
+    db, job_id, indexing_service = asyncio.run(run())
+    assert indexing_service.document_keys == ["key-old"]
+    assert sorted(db.documents) == ["doc-job-1", "doc-other"]
+    assert db.documents["doc-job-1"]["document_key"] == "key-old"
+    assert not old_pdf.exists() and other_pdf.exists() and new_pdf.exists()
+
+
+def test_bulk_job_indexes_every_file_and_reports_per_file_results(tmp_path):
+    """Test that a bulk upload job indexes its files in one run and stores the per-file report on the job"""
+    pdfs = [tmp_path / "a.pdf", tmp_path / "b.pdf"]
+    for pdf in pdfs:
+        pdf.write_bytes(b"%PDF-1.4")
+    bulk_request = {
+        "files": [
+            {"storage_path": str(pdf), "filename": pdf.name, "file_size": 8, "content_hash": pdf.name,
+             "document_key": f"key-{pdf.name}"}
+            for pdf in pdfs
+        ],
+        "rejected": [{"filename": "notes.txt", "collection_name": "manuals", "error": "Only PDF files are allowed."}],
+        "reindex": False,
+    }
+
+    async def run():
+        db = FakeDBService()
+        indexing_service = FakeIndexingService()
+        manager = IndexingJobManager(db, indexing_service, max_workers=1)
+        await manager.start()
+        job_id = await manager.submit(kind=JOB_KIND_BULK, collection_name="manuals", filename="3 files",
+                                      storage_path="", bulk_request=json.dumps(bulk_request))
+        await wait_for_status(db, job_id, {"completed"})
+        await manager.stop()
+        return db, job_id, indexing_service
+
+    db, job_id, indexing_service = asyncio.run(run())
+    report = json.loads(db.jobs[job_id]["bulk_results"])
+    assert indexing_service.document_keys == ["key-a.pdf", "key-b.pdf"]
+    assert [(result["filename"], result["status"]) for result in report["results"]] == [
+        ("a.pdf", BULK_INDEXED), ("b.pdf", BULK_INDEXED), ("notes.txt", BULK_FAILED)
+    ]
+    assert report["total_files"] == 3 and report["failed_files"] == 1 and report["total_chunks"] == 4
+    assert db.jobs[job_id]["chunks_upserted"] == 4
+    assert sorted(document["document_key"] for document in db.documents.values()) == ["key-a.pdf", "key-b.pdf"]
+
+
+def test_job_cancelled_while_saving_stays_cancelled(tmp_path):
+    """Test that a cancellation landing after indexing is not overwritten by completion"""
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    class CancellingDBService(FakeDBService):
+        async def update_job(self, job_id, **fields):
+            await super().update_job(job_id, **fields)
+            if fields.get("stage") == "saving":
+                # DELETE /indexing/jobs/{id} between process_pdf and complete_job
+                self.jobs[job_id]["status"] = "cancelled"
+
+    async def run():
+        db = CancellingDBService()
+        indexing_service = FakeIndexingService()
+        manager = IndexingJobManager(db, indexing_service, max_workers=1)
+        await manager.start()
+        job_id = await manager.submit(collection_name="manual", filename="manual.pdf", storage_path=str(pdf),
+                                      document_key="key-new")
+        await wait_for_status(db, job_id, {"cancelled"})
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        return db, job_id, indexing_service
+
+    db, job_id, indexing_service = asyncio.run(run())
+    assert db.jobs[job_id]["status"] == "cancelled" and not db.documents
+    assert indexing_service.discarded == ["key-new"]
+    assert not pdf.exists()
+
+
+def test_cancelled_job_removes_the_points_it_upserted(make_pdf, monkeypatch, run_indexed):
+    """Test that cancelling a first upload while it upserts leaves no points for its key, nor a collection it created"""
+    from qdrant_client import models
+    from conftest import TopicEmbeddings
+    from app.services import indexing_service as indexing_module
+    from app.services.indexing_service import document_condition
+
+    monkeypatch.setattr(indexing_module, "EMBED_BATCH_SIZE", 1)
+    other = make_pdf(["The valve kit replaces the seal."], name="other.pdf")
+    pages = [f"Pump section {i}: clean the filter and check the valve. " * 3 for i in range(3)]
+
+    class StallingEmbeddings(TopicEmbeddings):
+        """Embeds the first batch of a job, then waits until the job is cancelled"""
+        calls = 0
+
+        async def aembed_documents(self, texts):
+            StallingEmbeddings.calls += 1
+            if StallingEmbeddings.calls > 2:
+                await asyncio.Event().wait()
+            return await super().aembed_documents(texts)
+
+    async def cancel_while_upserting(db, manager, job_id):
+        for _ in range(200):
+            if "upserting" in db.stages:
+                break
+            await asyncio.sleep(0.01)
+        assert await manager.cancel(job_id)
+        await wait_for_status(db, job_id, {"cancelled"})
+        await asyncio.sleep(0.05)
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(other, "other.pdf", "manuals")
+        db = FakeDBService()
+        manager = IndexingJobManager(db, indexing, max_workers=1)
+        await manager.start()
+        counts, upserted = {}, []
+        for collection_name in ("manuals", "fresh"):
+            StallingEmbeddings.calls = 1
+            db.stages.clear()
+            job_id = await manager.submit(
+                collection_name=collection_name, filename="pump.pdf", storage_path=str(make_pdf(pages)),
+                document_key=f"key-{collection_name}",
+            )
+            await cancel_while_upserting(db, manager, job_id)
+            upserted.append("upserting" in db.stages)
+            if await qdrant.collection_exists(collection_name):
+                key_filter = models.Filter(must=[document_condition(f"key-{collection_name}")])
+                counts[collection_name] = [
+                    (await qdrant.count(collection_name, count_filter=key_filter, exact=True)).count,
+                    (await qdrant.count(collection_name, exact=True)).count,
+                ]
+            else:
+                counts[collection_name] = None
+        await manager.stop()
+        return db, counts, upserted
+
+    db, counts, upserted = run_indexed(scenario, StallingEmbeddings())
+    assert upserted == [True, True] and not db.documents
+    # The other document of an existing collection keeps its point; a collection the job created is gone
+    assert counts == {"manuals": [0, 1], "fresh": None}
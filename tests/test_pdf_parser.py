@@ -0,0 +1,26 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from langchain_community.document_loaders import PyPDFLoader
+from app.utils.pdf_parser import load_pdf, shard_pages
+
+
+def test_shard_pages_covers_every_page_once():
+    """Test that page ranges are contiguous and respect the minimum shard size"""
+    assert shard_pages(300, 4, 16) == [(0, 75), (75, 150), (150, 225), (225, 300)]
+    assert shard_pages(20, 4, 16) == [(0, 16), (16, 20)]
+    assert shard_pages(5, 4, 16) == [(0, 5)]
+    assert shard_pages(0, 4, 16) == []
+
+
+def test_parallel_parse_matches_pypdfloader(make_pdf):
+    """Test that sharded parsing keeps page order and the metadata ChatService reads"""
+    path = make_pdf([f"Page {i} describes error code E{i:03d} and its fix" for i in range(10)])
+
+    expected = PyPDFLoader(str(path)).load()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        docs = asyncio.run(load_pdf(path, executor=executor, workers=3, min_pages_per_shard=2))
+
+    assert [doc.page_content for doc in docs] == [doc.page_content for doc in expected]
+    for doc, reference in zip(docs, expected):
+        for key in ("page", "source", "page_label", "total_pages"):
+            assert doc.metadata[key] == reference.metadata[key]
@@ -0,0 +1,48 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import numpy as np
+from app.services.chat_service import ChatService
+from app.utils.reranking import Reranker, LexicalReranker, mmr_select
+
+
+def test_mmr_skips_near_duplicate_chunks():
+    """Test that MMR replaces an overlapping near-copy with the next distinct passage"""
+    vectors = np.array([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.6, 0.8, 0.0], [0.0, 0.0, 1.0]])
+    relevance = [0.9, 0.89, 0.8, 0.3]
+
+    assert mmr_select(relevance, vectors, k=2, diversity=0.0) == [0, 1]
+    assert mmr_select(relevance, vectors, k=2, diversity=0.5) == [0, 2]
+
+
+def test_slow_reranker_falls_back_to_vector_order(monkeypatch):
+    """Test that a reranker exceeding its latency budget is ignored"""
+    import app.services.chat_service as chat_service_module
+
+    class SlowReranker(Reranker):
+        name = "slow"
+
+        def score(self, query, passages):
+            time.sleep(0.5)
+            return list(reversed(range(len(passages))))
+
+    points = [
+        SimpleNamespace(id=i, score=1.0 - i / 10, payload={"page_content": text}, vector=None)
+        for i, text in enumerate(["reset the pump", "pump wiring", "replace the seal"])
+    ]
+    service = ChatService(qdrant_client=object())
+    monkeypatch.setattr(chat_service_module, "RERANK_BUDGET_MS", 50)
+
+    async def timed_select():
+        start = time.perf_counter()
+        selected = await service.select_results("seal", points, max_results=2, diversity=0.0)
+        return selected, time.perf_counter() - start
+
+    service.reranker = SlowReranker()
+    selected, elapsed = asyncio.run(timed_select())
+    assert elapsed < 0.4
+    assert [point.id for point in selected] == [0, 1]
+
+    service.reranker = LexicalReranker()
+    selected = asyncio.run(service.select_results("replace seal", points, max_results=2, diversity=0.0))
+    assert selected[0].id == 2
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routers import filescrud_router
+from app.services import sample_questions
+from app.services.sample_questions import SampleQuestionService
+
+
+class FakeDBService:
+    """In-memory documents table with stored sample questions"""
+
+    def __init__(self, *documents):
+        self.documents = {document["id"]: dict(document) for document in documents}
+        self.reads = 0
+
+    async def get_documents_by_collection(self, collection_name):
+        self.reads += 1
+        return [
+            SimpleNamespace(**document) for document in reversed(list(self.documents.values()))
+            if document["collection_name"] == collection_name
+        ]
+
+    async def set_sample_questions(self, document_id, questions):
+        self.documents[document_id]["sample_questions"] = json.dumps(questions)
+
+    async def get_document_by_id(self, document_id):
+        document = self.documents.get(document_id)
+        return SimpleNamespace(**document) if document else None
+
+    async def delete_document(self, document_id):
+        return self.documents.pop(document_id, None) is not None
+
+
+class FakeChatService:
+    def __init__(self, failing=False):
+        self.generated = []
+        self.failing = failing
+
+    async def generate_sample_questions(self, collection_name, document_key=None, count=3):
+        self.generated.append(document_key)
+        if self.failing:
+            raise RuntimeError("OpenAI unavailable")
+        return [f"{document_key} question {i} ({len(self.generated)})" for i in range(count)]
+
+
+def test_questions_are_generated_once_and_served_from_memory():
+    """Test that questions are generated after indexing, then read without generating or hitting the DB"""
+    db = FakeDBService(
+        {"id": "doc-1", "collection_name": "manuals", "filename": "old.pdf", "document_key": None,
+         "sample_questions": None},
+        {"id": "doc-2", "collection_name": "manuals", "filename": "pump.pdf", "document_key": None,
+         "sample_questions": None},
+    )
+    chat = FakeChatService()
+
+    async def run():
+        service = SampleQuestionService(db, chat, count=2)
+        # Indexing the new document schedules its generation in the background
+        await service.schedule("doc-2", "manuals", "pump.pdf")
+        first = await service.get("manuals", limit=5)
+        # old.pdf predates stored questions: generated in the background on that first read
+        await asyncio.sleep(0)
+        await asyncio.gather(*service._tasks.values())
+        reads = db.reads
+        second = await service.get("manuals", limit=5)
+        third = await service.get("manuals", limit=5)
+        cached_reads = db.reads - reads
+        refreshed = await service.refresh("manuals", limit=1)
+        return first, second, third, cached_reads, refreshed
+
+    first, second, third, cached_reads, refreshed = asyncio.run(run())
+    assert first == ["pump.pdf question 0 (1)", "pump.pdf question 1 (1)"]
+    assert second == third == first + ["old.pdf question 0 (2)", "old.pdf question 1 (2)"]
+    assert cached_reads == 1
+    assert sorted(chat.generated) == ["old.pdf", "old.pdf", "pump.pdf", "pump.pdf"]
+    assert refreshed[0].startswith("pump.pdf question 0")
+
+
+def test_failed_generation_is_retried_after_a_backoff(monkeypatch):
+    """Test that reads after a failed generation do not call OpenAI again until the backoff has passed"""
+    clock = [100.0]
+    monkeypatch.setattr(sample_questions.time, "monotonic", lambda: clock[0])
+    db = FakeDBService(
+        {"id": "doc-1", "collection_name": "manuals", "filename": "pump.pdf", "document_key": None,
+         "sample_questions": None},
+    )
+    chat = FakeChatService(failing=True)
+
+    async def run():
+        service = SampleQuestionService(db, chat, count=2, retry_backoff=60, retry_max=90)
+        reads = [await service.get("manuals"), await service.get("manuals")]
+        clock[0] += 61
+        reads.append(await service.get("manuals"))
+        # The second failure doubles the wait, capped at retry_max
+        clock[0] += 61
+        reads.append(await service.get("manuals"))
+        chat.failing = False
+        clock[0] += 30
+        reads.append(await service.get("manuals"))
+        return reads
+
+    reads = asyncio.run(run())
+    assert reads[:4] == [[], [], [], []]
+    assert reads[4] == ["pump.pdf question 0 (3)", "pump.pdf question 1 (3)"]
+    assert chat.generated == ["pump.pdf"] * 3
+
+
+def test_deleting_a_document_drops_only_its_collections_questions(monkeypatch):
+    """Test that DELETE /files/{id} invalidates the questions of the deleted document's collection"""
+    db = FakeDBService(
+        {"id": "doc-1", "collection_name": "manuals", "filename": "pump.pdf", "document_key": None,
+         "sample_questions": json.dumps(["How do I prime the pump?"])},
+        {"id": "doc-2", "collection_name": "parts", "filename": "kits.pdf", "document_key": None,
+         "sample_questions": json.dumps(["Which kit fits the valve?"])},
+    )
+    service = SampleQuestionService(db, FakeChatService())
+    asyncio.run(service.get("manuals"))
+    asyncio.run(service.get("parts"))
+    monkeypatch.setattr(filescrud_router, "current_sample_questions", lambda: service)
+    app = FastAPI()
+    app.include_router(filescrud_router.router)
+    app.dependency_overrides[filescrud_router.get_db_service] = lambda: db
+
+    with TestClient(app) as client:
+        assert client.delete("/files/doc-1").status_code == 200
+        assert client.delete("/files/doc-1").status_code == 404
+    assert sorted(service._questions) == ["parts"]
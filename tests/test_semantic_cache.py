@@ -0,0 +1,46 @@
+from app.utils.semantic_cache import SemanticAnswerCache, collections_key
+
+
+def test_similar_query_is_served_from_cache():
+    """Test that a near-identical query vector hits the cache"""
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("manual", [1.0, 0.0, 0.0], "gpt-4.1", 4, "Press reset.", [{"page_content": "Reset"}])
+
+    hit = cache.lookup("manual", [0.99, 0.05, 0.0], "gpt-4.1", 4)
+    assert hit is not None
+    assert hit.answer == "Press reset."
+
+    # Dissimilar query, other model or other result count must miss
+    assert cache.lookup("manual", [0.0, 1.0, 0.0], "gpt-4.1", 4) is None
+    assert cache.lookup("manual", [1.0, 0.0, 0.0], "gpt-4o", 4) is None
+    assert cache.lookup("manual", [1.0, 0.0, 0.0], "gpt-4.1", 8) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidate_drops_collection_entries():
+    """Test that re-indexing or deleting a collection clears its answers"""
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("manual", [1.0, 0.0], "gpt-4.1", 4, "Press reset.", [])
+    cache.store("other", [1.0, 0.0], "gpt-4.1", 4, "Other answer.", [])
+
+    cache.invalidate("manual")
+
+    assert cache.lookup("manual", [1.0, 0.0], "gpt-4.1", 4) is None
+    assert cache.lookup("other", [1.0, 0.0], "gpt-4.1", 4).answer == "Other answer."
+
+
+def test_answer_generated_across_an_invalidation_is_not_stored():
+    """Test that an answer computed from a collection re-indexed meanwhile is refused"""
+    cache = SemanticAnswerCache(threshold=0.95)
+    key = collections_key(["manual", "other"])
+    generation = cache.generation(key)
+    assert cache.lookup(key, [1.0, 0.0], "gpt-4.1", 4) is None
+
+    # Re-indexing one of the collections while the answer is being generated
+    cache.invalidate("other")
+    cache.store(key, [1.0, 0.0], "gpt-4.1", 4, "Stale answer.", [], generation=generation)
+    assert cache.lookup(key, [1.0, 0.0], "gpt-4.1", 4) is None
+
+    generation = cache.generation(key)
+    cache.store(key, [1.0, 0.0], "gpt-4.1", 4, "Fresh answer.", [], generation=generation)
+    assert cache.lookup(key, [1.0, 0.0], "gpt-4.1", 4).answer == "Fresh answer."
@@ -0,0 +1,83 @@
+from conftest import TopicEmbeddings
+from app.services.chat_service import ChatService
+from app.services.collection_migration import migrate_to_shared
+from app.utils import collection_routing
+from app.utils.collection_routing import collection_exists
+
+
+def test_shared_mode_keeps_logical_collections_apart(make_pdf, monkeypatch, run_indexed):
+    """Test that tenants of a shared collection are searched, listed and deleted by their logical names"""
+    monkeypatch.setattr(collection_routing, "COLLECTION_MODE", "shared")
+    valves = make_pdf(["Replace the valve seal every year."])
+    pumps = make_pdf(["The valve manual covers pumps too: clean the pump filter monthly."])
+
+    async def scenario(qdrant, indexing):
+        # Same filename in both collections: point IDs must not collide
+        await indexing.process_pdf(valves, "manual.pdf", "valves")
+        await indexing.process_pdf(pumps, "manual.pdf", "pumps")
+
+        chat = ChatService(qdrant_client=qdrant)
+        chat.embedding_model = TopicEmbeddings()
+        found = {}
+        for mode in ("dense", "hybrid"):
+            formatted, _ = await chat.retrieve(
+                "valve seal", "pumps", max_results=5, retrieval_mode=mode, diversity=0.0
+            )
+            found[mode] = [result["page_content"] for result in formatted]
+
+        physical = [col.name for col in (await qdrant.get_collections()).collections]
+        listed = {col["name"]: col["vectors_count"] for col in await indexing.list_collections()}
+        await indexing.delete_collection("pumps")
+        return found, physical, listed, await collection_exists(qdrant, "pumps"), await collection_exists(qdrant, "valves")
+
+    found, physical, listed, pumps_exists, valves_exists = run_indexed(scenario)
+    assert physical == ["shared_documents"]
+    assert listed == {"valves": 1, "pumps": 1}
+    for mode in ("dense", "hybrid"):
+        assert len(found[mode]) == 1 and "pump filter" in found[mode][0]
+    assert not pumps_exists and valves_exists
+
+
+def test_migrate_to_shared_keeps_sources_until_cut_over_and_reindexing_matches(make_pdf, monkeypatch, run_indexed):
+    """Test that migrated collections stay served from their source until cut-over, with IDs re-indexing matches"""
+    pdf = make_pdf(["Replace the valve seal every year.", "Clean the pump filter monthly."])
+
+    class CountingEmbeddings(TopicEmbeddings):
+        calls = 0
+
+        async def aembed_documents(self, texts):
+            CountingEmbeddings.calls += len(texts)
+            return await super().aembed_documents(texts)
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(pdf, "service.pdf", "service", document_key="service")
+        await indexing.process_pdf(pdf, "legacy.pdf", "legacy", document_key="legacy")
+        embedded_before = CountingEmbeddings.calls
+
+        # Copy only: the per-document collections stay and keep serving their names in shared mode
+        copied = await migrate_to_shared(indexing, ["service"])
+        monkeypatch.setattr(collection_routing, "COLLECTION_MODE", "shared")
+        chat = ChatService(qdrant_client=qdrant)
+        chat.embedding_model = TopicEmbeddings()
+        before_cut_over = {}
+        for name in ("service", "legacy"):
+            formatted, _ = await chat.retrieve("valve seal", name, max_results=5, diversity=0.0)
+            before_cut_over[name] = formatted, await collection_exists(qdrant, name)
+        physical_before = sorted(col.name for col in (await qdrant.get_collections()).collections)
+
+        moved = await migrate_to_shared(indexing, ["service"], delete_source=True)
+        await indexing.process_pdf(pdf, "service.pdf", "service", document_key="service")
+
+        physical = sorted(col.name for col in (await qdrant.get_collections()).collections)
+        listed = sorted((col["name"], col["vectors_count"]) for col in await indexing.list_collections())
+        return copied, moved, before_cut_over, physical_before, embedded_before, CountingEmbeddings.calls, physical, listed
+
+    (copied, moved, before_cut_over, physical_before,
+     embedded_before, embedded_after, physical, listed) = run_indexed(scenario, CountingEmbeddings())
+    assert copied == moved == [{"collection_name": "service", "shared_collection": "shared_documents", "points": 2}]
+    assert physical_before == ["legacy", "service", "shared_documents"]
+    for name, (formatted, exists) in before_cut_over.items():
+        assert exists and len(formatted) == 2 and all(result["collection_name"] == name for result in formatted)
+    assert embedded_after == embedded_before
+    assert physical == ["legacy", "shared_documents"]
+    assert listed == [("legacy", 2), ("service", 2)]
@@ -0,0 +1,157 @@
+import numpy as np
+from qdrant_client import models
+from conftest import PageEmbeddings
+from app.services.chat_service import ChatService
+from app.services.collection_migration import copy_points, create_with_layout, migrate_collection
+from app.utils.collection_routing import collection_aliases
+from app.utils.vector_config import CollectionLayout, collection_profile, truncate_embedding
+
+
+def test_truncate_embedding_renormalises_prefix():
+    """Test that a reduced embedding is the unit-length prefix of the original"""
+    vector = [3.0, 4.0, 12.0]
+    reduced = truncate_embedding(vector, 2)
+    assert np.allclose(reduced, [0.6, 0.8])
+    assert truncate_embedding(vector, 3) == vector
+
+
+def test_migrate_collection_reduces_dimensions_and_keeps_search_working(make_pdf, run_indexed):
+    """Test that migration shrinks the stored vectors and full-size queries still find the right page"""
+    pdf = make_pdf(["Replace the valve seal every year.", "Clean the pump filter monthly."])
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(pdf, "service.pdf", "service")
+        chat = ChatService(qdrant_client=qdrant)
+        chat.embedding_model = PageEmbeddings()
+        # Reads the 4-dimensional layout before the migrations; the same service follows them
+        await chat.retrieve("valve maintenance", "service", max_results=1, retrieval_mode="dense")
+
+        await migrate_collection(qdrant, "service", dimensions=3)
+        result = await migrate_collection(qdrant, "service", dimensions=2, quantization="scalar")
+        layout = CollectionLayout.from_info(await qdrant.get_collection("service"))
+        physical = [col.name for col in (await qdrant.get_collections()).collections]
+        aliases = await collection_aliases(qdrant)
+        listed = await indexing.list_collections()
+        formatted, _ = await chat.retrieve("valve maintenance", "service", max_results=1, retrieval_mode="dense")
+        return result, layout, physical, aliases, listed, formatted
+
+    result, layout, physical, aliases, listed, formatted = run_indexed(scenario, PageEmbeddings())
+    assert result["before"].vector_size == 3 and result["points"] == 2
+    assert (layout.vector_size, layout.has_sparse, layout.quantization) == (2, True, "scalar")
+    # Each rebuild is a new version behind the collection's alias; replaced versions are gone
+    assert physical == ["service__v2"] and aliases == {"service": "service__v2"}
+    assert listed == [{"name": "service", "vectors_count": 2}]
+    assert "valve" in formatted[0]["page_content"]
+
+
+def test_migrate_collection_refuses_to_truncate_other_backends(make_pdf, run_indexed):
+    """Test that reducing the dimensions of a collection embedded with a local model is refused"""
+    pdf = make_pdf(["Replace the valve seal every year.", "Clean the pump filter monthly."])
+
+    async def scenario(qdrant, indexing):
+        indexing.embedding_backend = "onnx:bge-small-en-v1.5"
+        await indexing.process_pdf(pdf, "service.pdf", "service")
+        try:
+            await migrate_collection(qdrant, "service", dimensions=2)
+        except ValueError as exc:
+            error = str(exc)
+        layout = CollectionLayout.from_info(await qdrant.get_collection("service"))
+        return error, layout
+
+    error, layout = run_indexed(scenario, PageEmbeddings())
+    assert "cannot be truncated" in error
+    assert layout.vector_size == 4
+
+
+def test_interrupted_migration_is_restored_from_the_rebuilt_collection(make_pdf, run_indexed):
+    """Test that a migration stopped between deleting the original and creating the alias is completed"""
+    pdf = make_pdf(["Replace the valve seal every year.", "Clean the pump filter monthly."])
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(pdf, "service.pdf", "service")
+        layout = CollectionLayout.from_info(await qdrant.get_collection("service"))
+        # Stopped mid-switch: the complete build holds the pending alias and the original is deleted;
+        # an unfinished build of another version is left over too
+        await create_with_layout(qdrant, "service__v1", layout, {})
+        await copy_points(qdrant, "service", "service__v1", layout.vector_size)
+        await qdrant.update_collection_aliases(change_aliases_operations=[models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name="service__v1", alias_name="service__next")
+        )])
+        await qdrant.delete_collection("service")
+        await create_with_layout(qdrant, "service__v2", layout, {})
+        listed = await indexing.list_collections()
+
+        result = await migrate_collection(qdrant, "service", quantization="scalar")
+        physical = [col.name for col in (await qdrant.get_collections()).collections]
+        aliases = await collection_aliases(qdrant)
+        await indexing.delete_collection("service")
+        return listed, result, physical, aliases, [col.name for col in (await qdrant.get_collections()).collections]
+
+    listed, result, physical, aliases, after_delete = run_indexed(scenario, PageEmbeddings())
+    assert listed == []
+    assert result["points"] == 2 and result["after"].quantization == "scalar"
+    assert physical == ["service__v1"] and aliases == {"service": "service__v1"}
+    assert after_delete == []
+
+
+class SharedLayoutClient:
+    """Qdrant client reporting a shared collection's per-tenant HNSW and tenant index (ignored by local Qdrant)"""
+
+    def __init__(self, client):
+        self.client = client
+        self.hnsw_configs = []
+        self.indexes = {}
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def get_collection(self, collection_name):
+        info = await self.client.get_collection(collection_name)
+        info.config.hnsw_config.m = 0
+        info.config.hnsw_config.payload_m = 24
+        info.payload_schema = {"metadata.tenant": models.PayloadIndexInfo(
+            data_type=models.PayloadSchemaType.KEYWORD, points=2,
+            params=models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+        )}
+        return info
+
+    async def create_collection(self, **kwargs):
+        self.hnsw_configs.append(kwargs.get("hnsw_config"))
+        return await self.client.create_collection(**kwargs)
+
+    async def update_collection(self, **kwargs):
+        self.hnsw_configs.append(kwargs.get("hnsw_config"))
+        return await self.client.update_collection(**kwargs)
+
+    async def create_payload_index(self, collection_name, field_name, field_schema):
+        self.indexes[field_name] = field_schema
+
+
+def test_migrate_collection_keeps_shared_collections_per_tenant(make_pdf, run_indexed):
+    """Test that rebuilding or re-profiling a shared collection keeps per-tenant HNSW and the tenant index"""
+    pdf = make_pdf(["Replace the valve seal every year.", "Clean the pump filter monthly."])
+
+    async def scenario(qdrant, indexing):
+        await indexing.process_pdf(pdf, "service.pdf", "service")
+        client = SharedLayoutClient(qdrant)
+        await migrate_collection(client, "service", dimensions=2)
+        await migrate_collection(client, "service", profile="small-fast")
+        return client
+
+    client = run_indexed(scenario, PageEmbeddings())
+    rebuilt, profiled = client.hnsw_configs
+    assert (rebuilt.m, rebuilt.payload_m) == (0, 24)
+    assert (profiled.m, profiled.payload_m) == (0, 32)
+    assert client.indexes["metadata.tenant"].is_tenant
+
+
+def test_profiles_and_search_params():
+    """Test that profiles set HNSW and storage options and hnsw_ef combines with quantization rescoring"""
+    assert collection_profile("default").hnsw_config() is None
+    on_disk = collection_profile("large-on-disk")
+    assert on_disk.on_disk_payload and on_disk.hnsw_config().on_disk
+    assert collection_profile("small-fast").hnsw_config().m == 32
+
+    assert CollectionLayout(vector_size=4, has_sparse=True).search_params() is None
+    params = CollectionLayout(vector_size=4, has_sparse=True, quantization="binary").search_params(hnsw_ef=256)
+    assert params.hnsw_ef == 256 and params.quantization.rescore